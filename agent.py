@@ -64,7 +64,7 @@ class DynamicAgent:
         return decision.strip().lower()
 
     async def respond(self, task: str) -> str:
-        relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task)
+        relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task, limit=5, properties=["name", "content"])
         prompt = f"""
         Task: {task}
         Relevant Knowledge: {json.dumps(relevant_knowledge)}
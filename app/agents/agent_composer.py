@@ -3,7 +3,6 @@ from typing import List, Dict, Any
 from app.agents.factory import AgentFactory
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.agents.base import Agent
-import json
 logger = logging.getLogger(__name__)
 
 class AgentComposer:
@@ -23,8 +22,7 @@ class AgentComposer:
         
         Provide your response as a JSON array of strings.
         """
-        response = await self.agent_factory.llm.chat_with_ollama("You are an expert in task analysis and skill identification.", prompt)
-        return json.loads(response)
+        return await self.agent_factory.llm.chat_json("You are an expert in task analysis and skill identification.", prompt)
 
     async def select_agent_components(self, required_skills: List[str]) -> List[Dict[str, Any]]:
         components = []
@@ -63,7 +63,7 @@ class Agent(ABC):
         return await self.skill_manager.execute_skill(skill_name, context)
 
     async def generate_response(self, prompt: str) -> str:
-        response = await self.llm.chat_with_ollama(prompt)
+        response = await self.llm.chat_with_ollama("You are a helpful AI assistant.", prompt)
         self.conversation_history.append({"role": "agent", "content": response})
         return response
 
@@ -2,11 +2,44 @@ from typing import List, Dict, Any
 from app.agents.meta_agent import MetaAgent
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.chat_with_ollama import ChatGPT
+from app.llm.structured_output import StructuredOutputError
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+STRATEGY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "approach": {"type": "string"},
+        "task_distribution": {},
+        "coordination_method": {"type": "string"},
+        "human_involvement": {}
+    },
+    "required": ["approach", "task_distribution", "coordination_method", "human_involvement"]
+}
+
+SUBTASKS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "content": {"type": "string"},
+            "dependencies": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["content", "dependencies"]
+    }
+}
+
+SYNTHESIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "final_result": {},
+        "confidence": {"type": "number"}
+    },
+    "required": ["final_result", "confidence"]
+}
+
 class CollaborationSystem:
     def __init__(self, meta_agent: MetaAgent, knowledge_graph: KnowledgeGraph, llm: ChatGPT):
         self.meta_agent = meta_agent
@@ -53,16 +86,11 @@ class CollaborationSystem:
         
         Provide your strategy as a JSON object with 'approach', 'task_distribution', 'coordination_method', and 'human_involvement' keys.
         """
-        strategy_response = await self.llm.chat_with_ollama("You are an AI specializing in collaborative problem-solving strategies.", prompt)
         try:
-            # Extract JSON part from the response
-            json_start = strategy_response.find('{')
-            json_end = strategy_response.rfind('}') + 1
-            json_str = strategy_response[json_start:json_end]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON response: {strategy_response}")
-            raise e
+            return await self.llm.generate_structured("You are an AI specializing in collaborative problem-solving strategies.", prompt, STRATEGY_SCHEMA)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to get a valid strategy response: {e}")
+            raise
 
     async def _break_down_task(self, task: Dict[str, Any], strategy: Dict[str, Any]) -> List[Dict[str, Any]]:
         prompt = f"""
@@ -73,16 +101,11 @@ class CollaborationSystem:
         
         Provide your breakdown as a JSON array of subtask objects, each with 'content' and 'dependencies' keys.
         """
-        breakdown_response = await self.llm.chat_with_ollama("You are an AI specializing in task decomposition for collaborative work.", prompt)
         try:
-            # Extract JSON part from the response
-            json_start = breakdown_response.find('[')
-            json_end = breakdown_response.rfind(']') + 1
-            json_str = breakdown_response[json_start:json_end]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON response: {breakdown_response}")
-            raise e
+            return await self.llm.generate_structured("You are an AI specializing in task decomposition for collaborative work.", prompt, SUBTASKS_SCHEMA)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to get a valid breakdown response: {e}")
+            raise
 
     async def _adapt_collaboration_strategy(self, strategy: Dict[str, Any], subtask: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
         prompt = f"""
@@ -100,16 +123,11 @@ class CollaborationSystem:
         
         Provide your adapted strategy as a JSON object with 'approach', 'task_distribution', 'coordination_method', and 'human_involvement' keys.
         """
-        adaptation_response = await self.llm.chat_with_ollama("You are an AI specializing in adaptive collaboration strategies.", prompt)
         try:
-            # Extract JSON part from the response
-            json_start = adaptation_response.find('{')
-            json_end = adaptation_response.rfind('}') + 1
-            json_str = adaptation_response[json_start:json_end]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON response: {adaptation_response}")
-            raise e
+            return await self.llm.generate_structured("You are an AI specializing in adaptive collaboration strategies.", prompt, STRATEGY_SCHEMA)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to get a valid adaptation response: {e}")
+            raise
 
     async def _synthesize_results(self, results: List[Dict[str, Any]], original_task: Dict[str, Any]) -> Dict[str, Any]:
         prompt = f"""
@@ -120,16 +138,11 @@ class CollaborationSystem:
         
         Provide your synthesis as a JSON object with 'final_result' and 'confidence' keys.
         """
-        synthesis_response = await self.llm.chat_with_ollama("You are an AI specializing in synthesizing collaborative work results.", prompt)
         try:
-            # Extract JSON part from the response
-            json_start = synthesis_response.find('{')
-            json_end = synthesis_response.rfind('}') + 1
-            json_str = synthesis_response[json_start:json_end]
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON response: {synthesis_response}")
-            raise e
+            return await self.llm.generate_structured("You are an AI specializing in synthesizing collaborative work results.", prompt, SYNTHESIS_SCHEMA)
+        except StructuredOutputError as e:
+            logger.error(f"Failed to get a valid synthesis response: {e}")
+            raise
 
     async def _store_collaboration_knowledge(self, task: Dict[str, Any], strategy: Dict[str, Any], results: List[Dict[str, Any]], final_result: Dict[str, Any]):
         collaboration_knowledge = {
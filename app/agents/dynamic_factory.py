@@ -18,7 +18,7 @@ class DynamicAgentFactory:
 
     async def _determine_agent_type(self, task: Dict[str, Any]) -> str:
         prompt = f"Analyze the following task and determine the most suitable agent type:\n{task}\nRespond with a single word describing the agent type."
-        agent_type = await self.llm.chat_with_ollama(prompt)
+        agent_type = await self.llm.chat_with_ollama("You are an agent type classifier.", prompt)
         return agent_type.strip().lower()
 
 class DynamicAgent(Agent):
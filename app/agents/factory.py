@@ -1,23 +1,55 @@
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, TYPE_CHECKING
 from app.agents.base import Agent
 from app.agents.skill_manager import SkillManager
 from app.chat_with_ollama import ChatGPT
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.memory.memory_system import MemorySystem
 from app.quantum.quantum_task_optimizer import QuantumInspiredTaskOptimizer
-from app.reinforcement_learning.advanced_rl import AdvancedRL
 from app.entropy_management.advanced_entropy_manager import AdvancedEntropyManager
 from app.agents.task_planner import TaskPlanner
+from app.tasks.batch_memo import batch_memoized, normalize_content
 import logging
 import asyncio
 import json
 import numpy as np
 
+if TYPE_CHECKING:
+    # Only needed for annotations; importing it at runtime would pull in torch
+    from app.reinforcement_learning.advanced_rl import AdvancedRL
+
 logger = logging.getLogger(__name__)
 
+STEP_PLAN_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "tool": {"type": "string", "enum": ["code_execution", "respond"]},
+            "description": {"type": "string"},
+            "language": {"type": "string"},
+            "code": {"type": "string"},
+            "prompt": {"type": "string"}
+        },
+        "required": ["tool", "description"]
+    }
+}
+
+INSIGHTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "insight": {"type": "string"},
+            "relevance": {"type": "string", "enum": ["High", "Medium", "Low"]},
+            "action_item": {"type": "string"}
+        },
+        "required": ["insight", "relevance", "action_item"]
+    }
+}
+
 class DynamicAgent(Agent):
-    def __init__(self, agent_id: str, name: str, skill_manager: SkillManager, llm: ChatGPT, knowledge_graph: KnowledgeGraph, memory_system: MemorySystem, quantum_optimizer: QuantumInspiredTaskOptimizer, advanced_rl: AdvancedRL, entropy_manager: AdvancedEntropyManager, task_planner: TaskPlanner):
+    def __init__(self, agent_id: str, name: str, skill_manager: SkillManager, llm: ChatGPT, knowledge_graph: KnowledgeGraph, memory_system: MemorySystem, quantum_optimizer: QuantumInspiredTaskOptimizer, advanced_rl: "AdvancedRL", entropy_manager: AdvancedEntropyManager, task_planner: TaskPlanner):
         super().__init__(agent_id, name, skill_manager, llm)
         self.knowledge_graph = knowledge_graph
         self.memory_system = memory_system
@@ -26,13 +58,16 @@ class DynamicAgent(Agent):
         self.entropy_manager = entropy_manager
         self.task_planner = task_planner
         self.execution_context = {}
+        self._context_session = None
 
     async def process_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         try:
             logger.info(f"Processing task: {task['content']}")
             
             # Retrieve relevant knowledge and context
-            relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task['content'])
+            # Shared with overlapping tasks when this runs as part of a batch
+            relevant_knowledge = await batch_memoized("knowledge", normalize_content(task['content']),
+                                                      lambda: self.knowledge_graph.get_relevant_knowledge(task['content'], limit=10))
             context = await self._build_context(task, relevant_knowledge)
             
             # Generate quantum-inspired embedding for the task
@@ -57,7 +92,8 @@ class DynamicAgent(Agent):
             reward = self._calculate_reward(result)
             next_state = self._get_state(task, task_embedding, context, result)
             done = True  # Assuming the task is done after execution
-            self.advanced_rl.update(state, action, reward, next_state, done)  # Removed await
+            # Samples the replay buffer, which may live in a shared SQLite file, and trains; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.advanced_rl.update, state, action, reward, next_state, done)
             
             await self._learn_from_execution(task, result, context)
             
@@ -80,18 +116,30 @@ class DynamicAgent(Agent):
         return context
 
     async def _generate_optimized_plan(self, task: Dict[str, Any], action: str, context: Dict[str, Any]) -> List[Dict[str, Any]]:
-        initial_plan = await self.task_planner.create_plan(task, context)
+        initial_plan = await batch_memoized("plan", normalize_content(task['content']),
+                                            lambda: self.task_planner.create_plan(task, context))
         if action == 'quantum_planning':
             return await self.quantum_optimizer.quantum_inspired_task_planning(initial_plan)
         else:
             return await self._optimize_task(initial_plan, context)
 
+    def _get_context_session(self, context: Dict[str, Any]):
+        # The task context lives in the system prompt, serialized deterministically, so every call made
+        # for this task shares a byte-identical prefix that Ollama can reuse instead of re-prefilling it
+        system_prompt = f"""You are an AI agent executing tasks within an AGI system.
+
+        Task context:
+        {json.dumps(context, indent=2, sort_keys=True, default=str)}
+        """
+        if self._context_session is None or self._context_session.system_prompt != system_prompt:
+            self._context_session = self.llm.chat_session(system_prompt)
+        return self._context_session
+
     async def _optimize_task(self, plan: List[Dict[str, Any]], context: Dict[str, Any]) -> List[Dict[str, Any]]:
         prompt = f"""
-        Optimize the following task plan, ensuring each step uses either the 'respond' or 'code_execution' tool:
+        As an expert task optimizer for AGI systems, optimize the following task plan, ensuring each step uses either the 'respond' or 'code_execution' tool:
 
         Plan: {json.dumps(plan, indent=2)}
-        Context: {json.dumps(context, indent=2)}
 
         Provide an optimized plan as a JSON array of steps, where each step has the following structure:
         {{
@@ -104,8 +152,7 @@ class DynamicAgent(Agent):
 
         Ensure that the plan is efficient and makes optimal use of the available tools.
         """
-        response = await self.llm.chat_with_ollama_with_fallback("You are an expert task optimizer for AGI systems.", prompt)
-        return self._parse_json_response(response)
+        return await self._get_context_session(context).send_structured(prompt, STEP_PLAN_SCHEMA, call_site="DynamicAgent._optimize_task")
 
     async def _execute_plan(self, plan: List[Dict[str, Any]], context: Dict[str, Any]) -> Dict[str, Any]:
         results = []
@@ -159,15 +206,12 @@ class DynamicAgent(Agent):
         Additional context or prompt:
         {step.get('prompt', '')}
 
-        Consider the following context:
-        {json.dumps(context, indent=2)}
-
         Execution context:
         {json.dumps(self.execution_context, indent=2)}
 
         Provide a clear, concise, and context-aware response.
         """
-        response = await self.llm.chat_with_ollama_with_fallback("You are an AI assistant responding to user queries in the context of an AGI system.", prompt)
+        response = await self._get_context_session(context).send(prompt, call_site="DynamicAgent._generate_response")
         return {"response": response}
 
     async def _learn_from_execution(self, task: Dict[str, Any], result: Dict[str, Any], context: Dict[str, Any]):
@@ -179,7 +223,6 @@ class DynamicAgent(Agent):
             insights_prompt = f"""
             Analyze the following task execution and extract key insights:
             Task: {task['content']}
-            Context: {json.dumps(context, indent=2)}
             Result: {json.dumps(result, indent=2)}
 
             Provide your insights as a JSON array of objects, where each object has the following structure:
@@ -189,17 +232,18 @@ class DynamicAgent(Agent):
                 "action_item": "Suggested action based on this insight"
             }}
             """
-            insights_response = await self.llm.chat_with_ollama_with_fallback("You are an AI specializing in extracting insights from task executions.", insights_prompt)
-            insights = self._parse_json_response(insights_response)
+            # Asked without remembering the turn so it does not grow the shared prefix
+            insights = await self._get_context_session(context).send_structured(insights_prompt, INSIGHTS_SCHEMA, remember=False,
+                                                                                call_site="DynamicAgent._learn_from_execution")
             
+            await self.knowledge_graph.add_or_update_nodes("Insight", [{
+                "content": insight['insight'],
+                "relevance": insight['relevance'],
+                "action_item": insight['action_item'],
+                "task": task['content']
+            } for insight in insights])
+
             for insight in insights:
-                await self.knowledge_graph.add_or_update_node("Insight", {
-                    "content": insight['insight'],
-                    "relevance": insight['relevance'],
-                    "action_item": insight['action_item'],
-                    "task": task['content']
-                })
-                
                 # Implement action items for high-relevance insights
                 if insight['relevance'] == 'High':
                     await self._implement_action_item(insight['action_item'])
@@ -239,15 +283,8 @@ class DynamicAgent(Agent):
         # Placeholder implementation
         return 1.0
 
-    def _parse_json_response(self, response: str) -> List[Dict[str, Any]]:
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            logger.error("Failed to parse JSON response from LLM.")
-            return []
-
 class AgentFactory:
-    def __init__(self, skill_manager: SkillManager, llm: ChatGPT, knowledge_graph: KnowledgeGraph, memory_system: MemorySystem, quantum_optimizer: QuantumInspiredTaskOptimizer, advanced_rl: AdvancedRL, entropy_manager: AdvancedEntropyManager, task_planner: TaskPlanner):
+    def __init__(self, skill_manager: SkillManager, llm: ChatGPT, knowledge_graph: KnowledgeGraph, memory_system: MemorySystem, quantum_optimizer: QuantumInspiredTaskOptimizer, advanced_rl: "AdvancedRL", entropy_manager: AdvancedEntropyManager, task_planner: TaskPlanner):
         self.skill_manager = skill_manager
         self.llm = llm
         self.knowledge_graph = knowledge_graph
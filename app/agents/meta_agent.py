@@ -2,10 +2,11 @@ from app.agents.base import Agent
 from app.virtual_env.virtual_environment import VirtualEnvironment
 from app.workspace.workspace_manager import WorkspaceManager
 from app.agents.factory import AgentFactory
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, List, Tuple, TYPE_CHECKING
 import logging
 import uuid
 import asyncio
+import json
 from app.monitoring.progress_monitor import ProgressMonitor, FeedbackSystem, AdaptiveTaskAdjuster
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.metacognition.meta_cognitive_agent import MetaCognitiveAgent
@@ -15,10 +16,15 @@ from app.tasks.task_cache import NLPCache
 from app.learning.continuous_learner import ContinuousLearner
 from app.tasks.task_prioritizer import TaskPrioritizer  # Import TaskPrioritizer
 from app.memory.memory_system import MemorySystem  # Import MemorySystem
-from app.reinforcement_learning.advanced_rl import AdvancedRL  # Import AdvancedRL
 from app.entropy_management.advanced_entropy_manager import AdvancedEntropyManager  # Import AdvancedEntropyManager
 from app.chat_with_ollama import ChatGPT  # Import ChatGPT
 from app.execution.code_execution_manager import CodeExecutionManager
+from app.llm.single_flight import SingleFlight
+from app.tasks.batch_memo import BatchMemo, use_batch_memo
+
+if TYPE_CHECKING:
+    # Only needed for annotations; importing it at runtime would pull in torch
+    from app.reinforcement_learning.advanced_rl import AdvancedRL
 
 logger = logging.getLogger(__name__)
 
@@ -60,11 +66,15 @@ class AgentChain:
             logger.info(f"Agent {agent.name} processed task: {result}")
         return result
 
+def _content_key(content: Any) -> str:
+    """Cache and deduplication key for task content, which API clients may send as any JSON value."""
+    return content if isinstance(content, str) else json.dumps(content, sort_keys=True, default=str)
+
 class MetaAgent:
     def __init__(self, agent_factory: AgentFactory, virtual_env: VirtualEnvironment, 
                  workspace_manager: WorkspaceManager, knowledge_graph: KnowledgeGraph, 
                  memory_system: MemorySystem, quantum_optimizer: QuantumInspiredTaskOptimizer, 
-                 advanced_rl: AdvancedRL, entropy_manager: AdvancedEntropyManager, llm: ChatGPT):
+                 advanced_rl: "AdvancedRL", entropy_manager: AdvancedEntropyManager, llm: ChatGPT):
         self.agent_factory = agent_factory
         self.virtual_env = virtual_env
         self.workspace_manager = workspace_manager
@@ -78,6 +88,8 @@ class MetaAgent:
         self.continuous_learner = ContinuousLearner(knowledge_graph, llm)  # Initialize ContinuousLearner
         self.task_prioritizer = TaskPrioritizer()  # Initialize TaskPrioritizer
         self.code_execution_manager = CodeExecutionManager(llm)
+        # Concurrent requests for the same task content share one execution
+        self._in_flight = SingleFlight()
 
     async def process_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
         # Ensure 'content' key is present
@@ -85,10 +97,65 @@ class MetaAgent:
             task['content'] = 'default_content'  # Set a default content if not present
 
         # Check cache first
-        cached_result = self.nlp_cache.get(task['content'])
+        content_key = _content_key(task['content'])
+        # The cache may live in a shared SQLite file, so it is read and written off the event loop
+        loop = asyncio.get_running_loop()
+        cached_result = await loop.run_in_executor(None, self.nlp_cache.get, content_key)
         if cached_result:
             return cached_result
 
+        return await self._in_flight.do(content_key, lambda: self._process_uncached(task))
+
+    async def process_batch(self, tasks: List[Dict[str, Any]], concurrency: int = 8) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Process tasks concurrently, yielding (index, result) pairs as each task finishes.
+
+        At most `concurrency` distinct tasks run at once, higher priority first. Tasks with the same
+        content run once and every copy gets the result. Tasks whose content differs only in case or
+        whitespace run separately but share their knowledge lookup and initial plan (see BatchMemo).
+        A failed task yields {"error": ...} instead of stopping the batch. Closing the iterator
+        cancels the tasks still running.
+        """
+        by_content: Dict[str, List[int]] = {}
+        for index, task in enumerate(tasks):
+            by_content.setdefault(_content_key(task.get('content', 'default_content')), []).append(index)
+        unique = [indices[0] for indices in by_content.values()]
+        unique.sort(key=lambda index: self.task_prioritizer.prioritize(dict(tasks[index]))['priority'], reverse=True)
+        logger.info(f"Processing batch of {len(tasks)} tasks ({len(unique)} distinct) with concurrency {concurrency}")
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for index in unique:
+            pending.put_nowait(index)
+        finished: asyncio.Queue = asyncio.Queue()
+        memo = BatchMemo()
+
+        async def worker():
+            # Set inside the worker so the memo is scoped to this batch's tasks
+            use_batch_memo(memo)
+            while not pending.empty():
+                index = pending.get_nowait()
+                try:
+                    result = await self.process_task(tasks[index])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Batch task {index} failed: {str(e)}")
+                    result = {"error": str(e)}
+                await finished.put((index, result))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(unique)))]
+        try:
+            for _ in range(len(unique)):
+                index, result = await finished.get()
+                for duplicate in by_content[_content_key(tasks[index].get('content', 'default_content'))]:
+                    yield duplicate, result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            memo.close()
+            logger.info(f"Batch lookups: {memo.get_stats()}")
+
+    async def _process_uncached(self, task: Dict[str, Any]) -> Dict[str, Any]:
         # Prioritize task
         prioritized_task = self.task_prioritizer.prioritize(task)
 
@@ -113,7 +180,7 @@ class MetaAgent:
         await self.continuous_learner.learn(task, result)
 
         # Cache the result
-        self.nlp_cache.put(task['content'], result)
+        await asyncio.get_running_loop().run_in_executor(None, self.nlp_cache.put, _content_key(task['content']), result)
 
         return result
 
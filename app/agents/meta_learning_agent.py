@@ -3,12 +3,12 @@ from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.chat_with_ollama import ChatGPT
 from app.learning.continuous_learner import ContinuousLearner
 from app.quantum.quantum_task_optimizer import QuantumInspiredTaskOptimizer
+from app.llm.structured_output import StructuredOutputError
 from typing import List, Dict, Any
 import json
 import uuid
 from tenacity import retry, stop_after_attempt, wait_exponential
 import time
-import asyncio
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -18,6 +18,74 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
+STRING_LIST = {"type": "array", "items": {"type": "string"}}
+PROBABILITY = {"type": "number", "minimum": 0, "maximum": 1}
+
+TASK_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {"type": "string"},
+        "strategy": STRING_LIST,
+        "estimated_complexity": PROBABILITY,
+        "required_skills": STRING_LIST,
+        "potential_challenges": STRING_LIST,
+        "adaptation_suggestions": STRING_LIST
+    },
+    "required": ["analysis", "strategy", "estimated_complexity", "required_skills", "potential_challenges", "adaptation_suggestions"]
+}
+
+ADAPTATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "adapted_strategy": STRING_LIST,
+        "reasoning": {"type": "string"},
+        "estimated_improvement": PROBABILITY,
+        "risk_assessment": {"type": "string"}
+    },
+    "required": ["adapted_strategy", "reasoning", "estimated_improvement", "risk_assessment"]
+}
+
+NOVEL_APPROACH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "novel_approach": STRING_LIST,
+        "reasoning": {"type": "string"},
+        "potential_risks": STRING_LIST,
+        "estimated_success_probability": PROBABILITY,
+        "required_resources": STRING_LIST,
+        "fallback_strategy": STRING_LIST,
+        "potential_breakthroughs": STRING_LIST
+    },
+    "required": ["novel_approach", "reasoning", "potential_risks", "estimated_success_probability",
+                 "required_resources", "fallback_strategy", "potential_breakthroughs"]
+}
+
+LEVEL = {"type": "string", "enum": ["low", "medium", "high"]}
+
+ARCHITECTURE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "changes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "component": {"type": "string"},
+                    "action": {"type": "string", "enum": ["add", "remove", "modify", "replace"]},
+                    "details": {"type": "string"},
+                    "expected_impact": {"type": "string"},
+                    "risk_level": LEVEL,
+                    "implementation_complexity": LEVEL
+                },
+                "required": ["component", "action", "details", "expected_impact", "risk_level", "implementation_complexity"]
+            }
+        },
+        "reasoning": {"type": "string"},
+        "estimated_overall_improvement": PROBABILITY
+    },
+    "required": ["changes", "reasoning", "estimated_overall_improvement"]
+}
+
 class MetaLearningAgent:
     def __init__(self, knowledge_graph: KnowledgeGraph, llm: ChatGPT, continuous_learner: ContinuousLearner, quantum_optimizer: QuantumInspiredTaskOptimizer):
         self.knowledge_graph = knowledge_graph
@@ -28,12 +96,8 @@ class MetaLearningAgent:
         self.adaptation_threshold = 0.7
 
     async def analyze_task(self, task: str) -> Dict[str, Any]:
-        task_embedding = await self.quantum_optimizer.quantum_inspired_embedding({"content": task})
-        relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task)
-        relevant_embeddings = [await self.quantum_optimizer.quantum_inspired_embedding(k) for k in relevant_knowledge]
-        
-        similarities = [await self.quantum_optimizer.evaluate_task_similarity(task_embedding, k_embedding) for k_embedding in relevant_embeddings]
-        top_knowledge = [k for _, k in sorted(zip(similarities, relevant_knowledge), reverse=True)[:3]]
+        # Full-text matches come back best first, so the top three are the most relevant
+        top_knowledge = await self.knowledge_graph.get_relevant_knowledge(task, limit=3)
         
         prompt = f"""
         Analyze the following task using quantum-inspired relevance:
@@ -53,14 +117,13 @@ class MetaLearningAgent:
             "adaptation_suggestions": ["suggestion1", "suggestion2", ...]
         }}
         """
-        response = await self.llm.chat_with_ollama("You are a quantum-inspired meta-learning AI tasked with analyzing and strategizing task execution.", prompt)
         try:
-            analysis = json.loads(response)
+            analysis = await self.llm.generate_structured("You are a quantum-inspired meta-learning AI tasked with analyzing and strategizing task execution.", prompt, TASK_ANALYSIS_SCHEMA)
             await self._store_task_analysis(task, analysis)
             return analysis
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse JSON response. Returning default analysis.")
-            logger.error(f"JSON parsing error: {response}", exc_info=True)
+        except StructuredOutputError as e:
+            logger.warning("Failed to get a valid task analysis. Returning default analysis.")
+            logger.error(f"Structured output error: {e}", exc_info=True)
             return {"analysis": "Failed to parse response", "strategy": ["Proceed with caution"], "estimated_complexity": 0.5, "required_skills": [], "potential_challenges": [], "adaptation_suggestions": []}
 
     async def suggest_improvements(self, feedback: str) -> List[str]:
@@ -158,7 +221,7 @@ class MetaLearningAgent:
         return steps
 
     async def adapt_to_new_task(self, task: str, previous_tasks: List[str]):
-        relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task)
+        relevant_knowledge = await self.knowledge_graph.get_relevant_knowledge(task, limit=5, properties=["name", "content"])
         prompt = f"""
         Given the following previous tasks:
         {previous_tasks}
@@ -176,15 +239,14 @@ class MetaLearningAgent:
             "risk_assessment": "Your assessment of potential risks in this adaptation"
         }}
         """
-        adaptation = await self.llm.chat_with_ollama("You are a meta-learning AI tasked with adapting strategies to new tasks.", prompt)
         try:
-            adapted_strategy = json.loads(adaptation)
+            adapted_strategy = await self.llm.generate_structured("You are a meta-learning AI tasked with adapting strategies to new tasks.", prompt, ADAPTATION_SCHEMA)
             if adapted_strategy['estimated_improvement'] > self.adaptation_threshold:
                 await self._apply_adaptation(adapted_strategy)
             return adapted_strategy
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse JSON response. Returning default adaptation.")
-            logger.error(f"JSON parsing error: {adaptation}", exc_info=True)
+        except StructuredOutputError as e:
+            logger.warning("Failed to get a valid adaptation. Returning default adaptation.")
+            logger.error(f"Structured output error: {e}", exc_info=True)
             return {"adapted_strategy": ["Proceed with caution"], "reasoning": "Failed to parse response", "estimated_improvement": 0, "risk_assessment": "Unknown risks due to parsing failure"}
 
     async def generate_novel_approach(self, task: str):
@@ -204,16 +266,15 @@ class MetaLearningAgent:
             "potential_breakthroughs": ["Breakthrough 1", "Breakthrough 2", ...]
         }}
         """
-        novel_approach = await self.llm.chat_with_ollama("You are a highly creative AI tasked with generating novel problem-solving approaches.", prompt)
         try:
-            return json.loads(novel_approach)
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse JSON response. Returning default novel approach.")
-            logger.error(f"JSON parsing error: {novel_approach}", exc_info=True)
+            return await self.llm.generate_structured("You are a highly creative AI tasked with generating novel problem-solving approaches.", prompt, NOVEL_APPROACH_SCHEMA)
+        except StructuredOutputError as e:
+            logger.warning("Failed to get a valid novel approach. Returning default novel approach.")
+            logger.error(f"Structured output error: {e}", exc_info=True)
             return {"novel_approach": ["Proceed with caution"], "reasoning": "Failed to parse response", "potential_risks": ["Unknown risks"], "estimated_success_probability": 0.5, "required_resources": [], "fallback_strategy": [], "potential_breakthroughs": []}
 
     async def _store_task_analysis(self, task: str, analysis: Dict[str, Any]):
-        await self.knowledge_graph.add_or_update_node("TaskAnalysis", {
+        await self.knowledge_graph.write_behind_node("TaskAnalysis", {
             "id": str(uuid.uuid4()),
             "task": task,
             "analysis": json.dumps(analysis),
@@ -227,17 +288,6 @@ class MetaLearningAgent:
         # Implement adaptation logic here
         pass
 
-    async def continuous_improvement_loop(self):
-        while True:
-            try:
-                system_performance = await self.knowledge_graph.get_system_performance()
-                improvement_suggestions = await self.suggest_improvements(json.dumps(system_performance))
-                await self.implement_improvements(improvement_suggestions)
-                await asyncio.sleep(3600)  # Run every hour
-            except Exception as e:
-                logger.error(f"Error in continuous improvement loop: {str(e)}", exc_info=True)
-                await asyncio.sleep(300)  # Wait for 5 minutes before retrying
-
     async def adapt_system_architecture(self, performance_metrics: Dict[str, float]):
         prompt = f"""
         Given the following system performance metrics:
@@ -267,14 +317,13 @@ class MetaLearningAgent:
             "estimated_overall_improvement": <float between 0 and 1>
         }}
         """
-        response = await self.llm.chat_with_ollama("You are an AI system architect specializing in self-improving systems.", prompt)
         try:
-            adaptation_plan = json.loads(response)
+            adaptation_plan = await self.llm.generate_structured("You are an AI system architect specializing in self-improving systems.", prompt, ARCHITECTURE_SCHEMA)
             await self._implement_architectural_changes(adaptation_plan)
             return adaptation_plan
-        except json.JSONDecodeError:
-            logger.error("Failed to parse architectural adaptation plan")
-            logger.error(f"JSON parsing error: {response}", exc_info=True)
+        except StructuredOutputError as e:
+            logger.error("Failed to get a valid architectural adaptation plan")
+            logger.error(f"Structured output error: {e}", exc_info=True)
             return None
 
     async def _implement_architectural_changes(self, adaptation_plan: Dict[str, Any]):
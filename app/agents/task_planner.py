@@ -6,7 +6,6 @@ from typing import Dict, Any, List
 import json
 import uuid
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
 
 logger = logging.getLogger(__name__)
 
@@ -70,13 +69,17 @@ class TaskPlanner(Agent):
         Ensure that each subtask is a single, atomic operation.
         """
         logger.debug(f"Generated prompt for breaking down task: {prompt}")
-        response = await self.llm.chat_with_ollama("You are an expert task planner. Return only the JSON object.", prompt)
+        try:
+            response = await self.llm.chat_json("You are an expert task planner. Return only the JSON object.", prompt)
+        except ValueError as e:
+            logger.error(f"Failed to get a JSON breakdown for task: {e}")
+            return []
         logger.debug(f"Response from LLM: {response}")
         return self._parse_json_response(response)
 
     def _parse_json_response(self, response: str) -> List[Dict[str, Any]]:
         try:
-            if isinstance(response, dict):
+            if isinstance(response, (dict, list)):
                 return response
             parsed_response = json.loads(response)
             logger.debug(f"Parsed JSON response: {parsed_response}")
@@ -85,7 +88,6 @@ class TaskPlanner(Agent):
             logger.error(f"Failed to parse JSON response: {response}, error: {e}")
             return []
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def create_plan(self, task: Dict[str, Any], context: Dict[str, Any]) -> List[Dict[str, Any]]:
         prompt = f"""
         Create a detailed plan for the following task:
@@ -105,7 +107,6 @@ class TaskPlanner(Agent):
         logger.debug(f"Response from LLM: {response}")
         return self._parse_json_response(response)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def optimize_plan(self, plan: List[Dict[str, Any]], context: Dict[str, Any]) -> List[Dict[str, Any]]:
         prompt = f"""
         Optimize the following task plan:
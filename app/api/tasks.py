@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+import json
+import os
+
+router = APIRouter()
+
+MAX_BATCH_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+class TaskBatch(BaseModel):
+    tasks: List[Dict[str, Any]]
+    concurrency: Optional[int] = None
+
+@router.post("/process_task")
+async def process_task(task: Dict[str, Any], request: Request):
+    return await request.app.state.meta_agent.process_task(task)
+
+@router.post("/process_batch")
+async def process_batch(batch: TaskBatch, request: Request):
+    """Run a batch of tasks concurrently, streaming one NDJSON line per task as it finishes."""
+    concurrency = min(batch.concurrency or MAX_BATCH_CONCURRENCY, MAX_BATCH_CONCURRENCY)
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+    meta_agent = request.app.state.meta_agent
+
+    async def results():
+        async for index, result in meta_agent.process_batch(batch.tasks, concurrency=concurrency):
+            yield json.dumps({"index": index, "result": result}, default=str) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,47 +1,630 @@
 import aiohttp
 import json
-import re
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional
 import asyncio
-from tenacity import retry, stop_after_attempt, wait_exponential
-import jsonschema
-from jsonschema import validate
-import requests
+import contextlib
+import contextvars
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 import time
+import os
+import sys
+import weakref
 from app.utils.logger import logger  # Use the new structured logger
+from app.llm.single_flight import SingleFlight
+from app.llm.response_cache import LLMResponseCache
+from app.llm.scheduler import LLMScheduler, Priority, LoadShedError
+from app.llm.routing import ModelRouter, ModelRoute
+from app.llm.chat_session import ChatSession
+from app.llm.structured_output import StructuredOutputError, StructuredOutputStats, validation_errors, to_response_type
+from app.llm.json_stream import JSONStreamScanner, extract_json
+from app.llm.circuit_breaker import CircuitOpenError, DeadlineExceededError, LLMRequestError, LLMUnavailableError
+from app.llm.backend_pool import Backend, BackendPool
+from app.llm.hedging import Hedger
+from app.llm.telemetry import LLMTelemetry, current_call
+from app.replay.cassette import Cassette
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "description": {"type": "string"},
+                    "tool": {"type": "string"},
+                    "dependencies": {
+                        "type": "array",
+                        "items": {"type": "string"}
+                    }
+                },
+                "required": ["description", "tool", "dependencies"]
+            }
+        }
+    },
+    "required": ["plan"]
+}
+
+# Modules skipped when attributing an LLM call to the code that made it
+_CALL_SITE_SKIP_PREFIXES = (__name__, "app.llm.", "tenacity", "asyncio", "contextlib")
+
+def _resolve_call_chain(limit: int = 4) -> List[str]:
+    """Return up to `limit` callers outside the LLM client stack as `Class.method` (or `function`), innermost first."""
+    chain = []
+    frame = sys._getframe(1)
+    while frame is not None and len(chain) < limit:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_CALL_SITE_SKIP_PREFIXES):
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                chain.append(f"{type(owner).__name__}.{frame.f_code.co_name}")
+            else:
+                chain.append(frame.f_code.co_name)
+        frame = frame.f_back
+    return chain or ["unknown"]
+
+# Default priority lanes by call site; "Class." entries match every method of the class
+_CALL_SITE_PRIORITIES = {
+    "ContinuousLearner.": Priority.BACKGROUND,
+    "DynamicAgent._learn_from_execution": Priority.BACKGROUND,
+    "MetaLearningAgent.suggest_improvements": Priority.BACKGROUND,
+    "MetaLearningAgent.implement_improvements": Priority.BACKGROUND,
+    "MetaLearningAgent.adapt_system_architecture": Priority.BACKGROUND,
+    "AdvancedEntropyManager.compress_knowledge": Priority.BACKGROUND,
+    "TaskPlanner.": Priority.PLANNING,
+    "DynamicAgent._optimize_task": Priority.PLANNING,
+    "MetaLearningAgent.analyze_task": Priority.PLANNING,
+    "MetaLearningAgent.adapt_to_new_task": Priority.PLANNING,
+    "CollaborationSystem._determine_collaboration_strategy": Priority.PLANNING,
+    "CollaborationSystem._break_down_task": Priority.PLANNING,
+    "CollaborationSystem._adapt_collaboration_strategy": Priority.PLANNING,
+}
+
+# Priority lane forced for every LLM call made within the current context (see ChatGPT.priority)
+_priority_override: contextvars.ContextVar[Optional[Priority]] = contextvars.ContextVar("llm_priority", default=None)
+
+# Receives streamed chunks for every LLM call made within the current context (see ChatGPT.stream_to)
+_stream_listener: contextvars.ContextVar[Optional[Callable[[str], Awaitable[None]]]] = contextvars.ContextVar("llm_stream_listener", default=None)
+
+# Absolute (time.monotonic) deadline set by ChatGPT.deadline() for the calls made in the current context
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
 
 class ChatGPT:
-    def __init__(self, base_url: str="http://localhost:11434"):
-        self.base_url = base_url
+    def __init__(self, base_url: str=None, pool_size: int=None, per_host_limit: int=None,
+                 keepalive_timeout: float=None, request_timeout: float=None,
+                 response_cache: LLMResponseCache=None, cache_disabled_call_sites: set=None,
+                 scheduler: LLMScheduler=None, router: ModelRouter=None, hedge_url: str=None,
+                 backend_pool: BackendPool=None, cassette: Cassette=None):
+        # Blocking facade for chat_with_ollama_nojson, created on first use
+        self._sync_client = None
+        # Connection pool tuning; every value can be overridden from the environment
+        self.pool_size = pool_size or int(os.getenv("OLLAMA_POOL_SIZE", "32"))
+        self.per_host_limit = per_host_limit or int(os.getenv("OLLAMA_PER_HOST_LIMIT", "16"))
+        self.keepalive_timeout = keepalive_timeout or float(os.getenv("OLLAMA_KEEPALIVE_TIMEOUT", "60"))
+        self.request_timeout = request_timeout or float(os.getenv("OLLAMA_REQUEST_TIMEOUT", "300"))
+        # One shared ClientSession per event loop; aiohttp sessions are bound to the loop they were created on
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+        # Byte-identical in-flight requests share a single upstream call
+        self._single_flight = SingleFlight()
+        # Opt-in persistent response cache, enabled by passing a cache or setting LLM_CACHE_PATH
+        if response_cache is None and os.getenv("LLM_CACHE_PATH"):
+            ttl = os.getenv("LLM_CACHE_TTL_SECONDS")
+            response_cache = LLMResponseCache(
+                os.getenv("LLM_CACHE_PATH"),
+                ttl_seconds=float(ttl) if ttl else None,
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+            )
+        self.response_cache = response_cache
+        disabled = os.getenv("LLM_CACHE_DISABLED_CALL_SITES", "")
+        self.cache_disabled_call_sites = set(cache_disabled_call_sites or [s.strip() for s in disabled.split(",") if s.strip()])
+        # Admission control shared by every call made through this client
+        self.scheduler = scheduler or LLMScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            shed_queue_depth=int(os.getenv("LLM_SHED_QUEUE_DEPTH", "32"))
+        )
+        # Per-call-site model and option selection (the `llm` section of config.yaml)
+        self.router = router or ModelRouter.from_config_file()
+        # How long Ollama keeps the model (and its KV cache) loaded between requests
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Ollama >= 0.5 constrains decoding to a JSON schema passed as `format`; older servers only accept "json"
+        self.schema_format = os.getenv("OLLAMA_SCHEMA_FORMAT", "1").lower() in ("1", "true", "yes")
+        self.structured_stats = StructuredOutputStats()
+        # Per-call latency, token and cache metrics, aggregated by call site
+        self.telemetry = LLMTelemetry()
+        # Retries are capped by attempts and by the per-call deadline, whichever comes first
+        self.max_attempts = int(os.getenv("OLLAMA_MAX_ATTEMPTS", "3"))
+        self.call_deadline = float(os.getenv("LLM_CALL_DEADLINE", "120"))
+        # Inference servers to spread requests over: an explicit base_url pins a single server, otherwise
+        # the pool comes from `llm.backends` in config.yaml, OLLAMA_BACKENDS or OLLAMA_BASE_URL
+        hedge_url = hedge_url or os.getenv("OLLAMA_HEDGE_URL") or None
+        breaker_settings = {
+            "failure_threshold": int(os.getenv("OLLAMA_BREAKER_FAILURES", "5")),
+            "reset_timeout": float(os.getenv("OLLAMA_BREAKER_RESET_SECONDS", "30"))
+        }
+        if backend_pool is None and base_url:
+            backend_pool = BackendPool.from_config([{"url": url} for url in filter(None, (base_url, hedge_url))], **breaker_settings)
+        self.pool = backend_pool or BackendPool.from_environment(
+            os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"), extra_urls=[hedge_url] if hedge_url else [], **breaker_settings
+        )
+        self.base_url = self.pool.backends[0].url
+        # Hedged requests duplicate slow calls onto a second backend; on by default when a hedge server is configured
+        hedging = os.getenv("OLLAMA_HEDGE", "1" if hedge_url else "0").lower() in ("1", "true", "yes")
+        self.hedger = Hedger(percentile=float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "95"))) if hedging and len(self.pool) > 1 else None
+        self.health_check_interval = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "30"))
+        # Record/replay of every backend request (CASSETTE_PATH / CASSETTE_MODE); None talks to the backends
+        self.cassette = cassette or Cassette.from_env()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.per_host_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+            self._sessions[loop] = session
+            logger.info(f"Opened pooled Ollama session (limit={self.pool_size}, per_host={self.per_host_limit})", {"component": "ChatGPT", "method": "_get_session"})
+        return session
+
+    async def close(self):
+        """Close the pooled session owned by the running event loop and forget sessions of dead loops."""
+        loop = asyncio.get_running_loop()
+        for session_loop, session in list(self._sessions.items()):
+            if session_loop is loop:
+                if not session.closed:
+                    await session.close()
+                del self._sessions[session_loop]
+            elif session_loop.is_closed():
+                del self._sessions[session_loop]
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self._sync_client is not None:
+            await asyncio.to_thread(self._sync_client.close)
+            self._sync_client = None
+        logger.info("Closed pooled Ollama session", {"component": "ChatGPT", "method": "close"})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "scheduler": self.scheduler.get_stats(),
+            "single_flight": self._single_flight.get_stats(),
+            "cache": self.response_cache.get_stats() if self.response_cache is not None else None,
+            "structured_output": self.structured_stats.get_stats(),
+            "backends": self.pool.get_stats(),
+            "hedging": self.hedger.get_stats() if self.hedger is not None else None,
+            "telemetry": self.telemetry.get_stats()
+        }
+
+    def _build_generate_payload(self, system_prompt: str, user_prompt: str, stream: bool, route: ModelRoute=None,
+                                format: Any=None) -> Dict[str, Any]:
+        route = route or self.router.default_route
+        payload = {
+            "model": route.model,
+            "prompt": f"{system_prompt}\n\nUser: {user_prompt}\nAssistant:",
+            "stream": stream
+        }
+        if format is not None:
+            payload["format"] = format
+        if route.options:
+            payload["options"] = route.options
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _build_chat_payload(self, messages: List[Dict[str, str]], stream: bool, route: ModelRoute=None,
+                            format: Any=None) -> Dict[str, Any]:
+        route = route or self.router.default_route
+        payload = {
+            "model": route.model,
+            "messages": messages,
+            "stream": stream
+        }
+        if format is not None:
+            payload["format"] = format
+        if route.options:
+            payload["options"] = route.options
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    @contextlib.contextmanager
+    def stream_to(self, listener: Callable[[str], Awaitable[None]]):
+        """Forward the chunks of every LLM call made inside this block (including nested tasks) to `listener`."""
+        token = _stream_listener.set(listener)
+        try:
+            yield
+        finally:
+            _stream_listener.reset(token)
+
+    @contextlib.contextmanager
+    def priority(self, priority: Priority):
+        """Run every LLM call made inside this block (including nested tasks) in the given priority lane."""
+        token = _priority_override.set(priority)
+        try:
+            yield
+        finally:
+            _priority_override.reset(token)
+
+    @contextlib.contextmanager
+    def deadline(self, seconds: float):
+        """Bound every LLM call made inside this block, retries included, to finish within `seconds`.
+
+        Nested blocks can only tighten the deadline, never extend it.
+        """
+        deadline = time.monotonic() + seconds
+        outer = _deadline.get()
+        token = _deadline.set(min(deadline, outer) if outer is not None else deadline)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    def _time_left(self) -> float:
+        deadline = _deadline.get()
+        per_call = self.call_deadline
+        if deadline is None:
+            return per_call
+        return min(per_call, deadline - time.monotonic())
+
+    def _resolve_priority(self, call_site: str, priority: Optional[Priority]) -> Priority:
+        if priority is not None:
+            return priority
+        override = _priority_override.get()
+        if override is not None:
+            return override
+        for pattern, lane in _CALL_SITE_PRIORITIES.items():
+            if call_site == pattern or (pattern.endswith(".") and call_site.startswith(pattern)):
+                return lane
+        return Priority.INTERACTIVE
+
+    def _cache_enabled_for(self, call_site: str, use_cache: Optional[bool]) -> bool:
+        if self.response_cache is None:
+            return False
+        if use_cache is not None:
+            return use_cache
+        return call_site not in self.cache_disabled_call_sites
+
+    async def chat_with_ollama(self, system_prompt: str, user_prompt: str, use_cache: bool=None, call_site: str=None,
+                               priority: Priority=None, format: Any=None) -> str:
+        logger.debug(f"Sending request to Ollama with system prompt: {system_prompt} and user_prompt: {user_prompt}", {"component": "ChatGPT", "method": "chat_with_ollama"})
+        call_chain = [call_site] if call_site else _resolve_call_chain()
+        call_site = call_chain[0]
+        priority = self._resolve_priority(call_site, priority)
+        route = self.router.resolve(call_chain, user_prompt)
+        with self.telemetry.track(call_site, route.model, len(system_prompt) + len(user_prompt)) as call:
+            listener = _stream_listener.get()
+            if listener is not None:
+                chunks = []
+                async for chunk in self.stream_chat_with_ollama(system_prompt, user_prompt, priority=priority, route=route, format=format):
+                    chunks.append(chunk)
+                    await listener(chunk)
+                return "".join(chunks)
+
+            payload = self._build_generate_payload(system_prompt, user_prompt, stream=False, route=route, format=format)
+            # The output format changes the completion, so it is part of the cache and coalescing keys
+            options = dict(route.options, format=format) if format is not None else route.options
+            cache_key = None
+            if self._cache_enabled_for(call_site, use_cache):
+                loop = asyncio.get_running_loop()
+                cache_key = LLMResponseCache.make_key(payload["model"], system_prompt, user_prompt, options)
+                cached = await loop.run_in_executor(None, self.response_cache.get, cache_key, call_site)
+                call.cache = "miss" if cached is None else "hit"
+                if cached is not None:
+                    logger.debug(f"LLM cache hit for {call_site}", {"component": "ChatGPT", "method": "chat_with_ollama"})
+                    return cached
+
+            key = (payload["model"], json.dumps(options, sort_keys=True), system_prompt, user_prompt)
+            if self._single_flight.is_in_flight(key):
+                # Followers share the leader's request; the leader's record carries its queue wait and tokens
+                call.cache = "coalesced"
+            response = await self._single_flight.do(key, lambda: self._post("/api/generate", payload, priority))
+            if cache_key is not None:
+                await loop.run_in_executor(None, self.response_cache.put, cache_key, response)
+            return response
+
+    async def chat_json(self, system_prompt: str, user_prompt: str, use_cache: bool=None, call_site: str=None,
+                        priority: Priority=None, format: Any=None) -> Any:
+        """Generate a completion expected to contain JSON and return the first complete JSON value in it.
+
+        The completion is streamed through a JSONStreamScanner and generation is cancelled as soon as
+        the top-level object or array closes, so trailing prose is never generated. Raises ValueError
+        if the completion ends without a complete JSON value.
+        """
+        logger.debug(f"Sending JSON request to Ollama with system prompt: {system_prompt} and user_prompt: {user_prompt}", {"component": "ChatGPT", "method": "chat_json"})
+        call_chain = [call_site] if call_site else _resolve_call_chain()
+        call_site = call_chain[0]
+        priority = self._resolve_priority(call_site, priority)
+        route = self.router.resolve(call_chain, user_prompt)
+        payload = self._build_generate_payload(system_prompt, user_prompt, stream=True, route=route, format=format)
+        # Early-stopped completions differ from full ones, so they get their own cache and coalescing keys
+        options = dict(route.options, format=format, stop_after="json")
+        with self.telemetry.track(call_site, payload["model"], len(system_prompt) + len(user_prompt)) as call:
+            cache_key = None
+            if self._cache_enabled_for(call_site, use_cache):
+                loop = asyncio.get_running_loop()
+                cache_key = LLMResponseCache.make_key(payload["model"], system_prompt, user_prompt, options)
+                cached = await loop.run_in_executor(None, self.response_cache.get, cache_key, call_site)
+                call.cache = "miss" if cached is None else "hit"
+                if cached is not None:
+                    logger.debug(f"LLM cache hit for {call_site}", {"component": "ChatGPT", "method": "chat_json"})
+                    return json.loads(cached)
+
+            key = (payload["model"], json.dumps(options, sort_keys=True), system_prompt, user_prompt)
+            if self._single_flight.is_in_flight(key):
+                # Followers share the leader's request; the leader's record carries its queue wait and tokens
+                call.cache = "coalesced"
+            text = await self._single_flight.do(key, lambda: self._stream_until_json("/api/generate", payload, priority, _stream_listener.get()))
+            if cache_key is not None:
+                await loop.run_in_executor(None, self.response_cache.put, cache_key, text)
+            return json.loads(text)
+
+    async def _stream_until_json(self, path: str, payload: Dict[str, Any], priority: Priority, listener=None) -> str:
+        scanner = JSONStreamScanner()
+        stream = self._stream(path, payload, priority)
+        try:
+            async for chunk in stream:
+                if listener is not None:
+                    await listener(chunk)
+                if scanner.feed(chunk):
+                    logger.debug("Complete JSON value received, cancelling the rest of the generation", {"component": "ChatGPT", "method": "_stream_until_json"})
+                    return scanner.text
+        finally:
+            # Closing the stream closes the HTTP response, which stops generation upstream
+            await stream.aclose()
+        raise ValueError("No JSON object found in the response")
+
+    def chat_session(self, system_prompt: str, call_site: str=None, max_turns: int=20) -> ChatSession:
+        """Start a multi-turn /api/chat conversation whose system prompt and earlier turns form a reusable prefix."""
+        return ChatSession(self, system_prompt, call_site=call_site, max_turns=max_turns)
+
+    async def chat_messages(self, messages: List[Dict[str, str]], call_site: str=None, priority: Priority=None,
+                            session_key: str=None, format: Any=None) -> str:
+        """Send a full message history to /api/chat and return the assistant reply.
+
+        Calls sharing a `session_key` stick to one backend so its cached conversation prefix is reused.
+        `format` ("json" or a JSON schema) constrains the reply, as for chat_with_ollama.
+        """
+        call_chain = [call_site] if call_site else _resolve_call_chain()
+        priority = self._resolve_priority(call_chain[0], priority)
+        route = self.router.resolve(call_chain, messages[-1]["content"] if messages else "")
+        with self.telemetry.track(call_chain[0], route.model, sum(len(message["content"]) for message in messages)):
+            listener = _stream_listener.get()
+            if listener is not None:
+                chunks = []
+                payload = self._build_chat_payload(messages, stream=True, route=route, format=format)
+                async for chunk in self._stream("/api/chat", payload, priority, session_key=session_key):
+                    chunks.append(chunk)
+                    await listener(chunk)
+                return "".join(chunks)
+            payload = self._build_chat_payload(messages, stream=False, route=route, format=format)
+            return await self._post("/api/chat", payload, priority, session_key=session_key)
 
-    @retry(stop=stop_after_attempt(6), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def chat_with_ollama(self, system_prompt: str, user_prompt: str) -> str:
-        logger.info(f"Sending request to Ollama with system prompt: {system_prompt} and user_prompt: {user_prompt}", {"component": "ChatGPT", "method": "chat_with_ollama"})
-        async with aiohttp.ClientSession() as session:
+    async def check_backends(self):
+        """Run one round of health checks, refreshing which backends are up and which models they serve."""
+        await self.pool.check_health(await self._get_session())
+
+    async def run_health_checks(self, interval: float=None):
+        """Check backend health every `interval` seconds until cancelled; run it as a background task."""
+        interval = interval or self.health_check_interval
+        while True:
             try:
-                async with session.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": "hermes3",
-                        "prompt": f"{system_prompt}\n\nUser: {user_prompt}\nAssistant:",
-                        "stream": False
-                    }
-                ) as response:
-                    if response.status == 200:
+                await self.check_backends()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error checking LLM backends: {str(e)}", {"component": "ChatGPT", "method": "run_health_checks"})
+            await asyncio.sleep(interval)
+
+    async def warm_up(self, timeout: float=60.0):
+        """Check the backends and have each Ollama backend load the default model, so the first real call skips the load.
+
+        Failures are logged, not raised; a cold backend only makes the first call slower.
+        """
+        if self.cassette is not None and self.cassette.replaying:
+            return
+        try:
+            await self.check_backends()
+            model = self.router.default_route.model
+            session = await self._get_session()
+            # A generate request without a prompt only loads the model (Ollama-specific)
+            backends = [b for b in self.pool.backends if b.kind == "ollama" and b.is_available() and b.serves(model)]
+
+            async def load(backend: Backend):
+                async with session.post(f"{backend.url}/api/generate", json={"model": model, "keep_alive": self.keep_alive},
+                                        headers=backend.headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    await response.read()
+
+            await asyncio.gather(*(load(backend) for backend in backends))
+            logger.info(f"Warmed up {model} on {len(backends)} backend(s)", {"component": "ChatGPT", "method": "warm_up"})
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {str(e)}", {"component": "ChatGPT", "method": "warm_up"})
+
+    async def _post(self, path: str, payload: Dict[str, Any], priority: Priority=Priority.INTERACTIVE, session_key: str=None) -> str:
+        if self.cassette is None:
+            return await self._post_live(path, payload, priority, session_key)
+        return await self.cassette.around("llm", {"path": path, "payload": payload},
+                                          lambda: self._post_live(path, payload, priority, session_key))
+
+    async def _post_live(self, path: str, payload: Dict[str, Any], priority: Priority=Priority.INTERACTIVE, session_key: str=None) -> str:
+        """POST to Ollama with bounded retries, failing with DeadlineExceededError once the call's deadline passes."""
+        timeout = self._time_left()
+        if timeout > 0:
+            # A task rather than wait_for, so request timeouts raised inside are not mistaken for the deadline
+            task = asyncio.ensure_future(self._post_with_retries(path, payload, priority, session_key))
+            try:
+                done, _ = await asyncio.wait({task}, timeout=timeout)
+            finally:
+                if not task.done():
+                    task.cancel()
+            if done:
+                return task.result()
+        logger.error(f"LLM call to {path} exceeded its deadline", {"component": "ChatGPT", "method": "_post_live"})
+        raise DeadlineExceededError(f"LLM call to {path} exceeded its deadline")
+
+    async def _post_with_retries(self, path: str, payload: Dict[str, Any], priority: Priority, session_key: str=None) -> str:
+        # Shed requests and open circuits fail fast; retrying them would only add load to a struggling backend.
+        # Rejected (4xx) requests fail fast too, since the same request would be rejected again
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
+            retry=retry_if_not_exception_type((LoadShedError, LLMUnavailableError, LLMRequestError)),
+            reraise=True
+        )
+        call = current_call()
+        async for attempt in retrying:
+            with attempt:
+                if call is not None:
+                    call.attempts = attempt.retry_state.attempt_number
+                return await self._post_hedged(path, payload, priority, session_key)
+
+    async def _post_hedged(self, path: str, payload: Dict[str, Any], priority: Priority, session_key: str=None) -> str:
+        # Each attempt picks a backend afresh, so a retry after a failure can land on a different server
+        primary = self.pool.select(payload["model"], session_key=session_key)
+        if self.hedger is None:
+            try:
+                return await self._post_once(primary, path, payload, priority)
+            except CircuitOpenError:
+                # Its half-open probe slots were taken while this request waited for a scheduler slot
+                return await self._post_once(self.pool.select(payload["model"], exclude=[primary]), path, payload, priority)
+        return await self.hedger.run(
+            lambda: self._post_once(primary, path, payload, priority),
+            lambda: self._post_once(self.pool.select(payload["model"], exclude=[primary]), path, payload, priority)
+        )
+
+    async def _post_once(self, backend: Backend, path: str, payload: Dict[str, Any], priority: Priority) -> str:
+        breaker = backend.breaker
+        url, body = backend.prepare(path, payload)
+        session = await self._get_session()
+        call = current_call()
+        async with self.scheduler.slot(priority) as waited:
+            if call is not None:
+                call.queue_wait += waited
+            breaker.before_call()
+            outcome_recorded = False
+            started = time.monotonic()
+            try:
+                with self.pool.track(backend):
+                    async with session.post(url, json=body, headers=backend.headers) as response:
+                        if response.status != 200:
+                            error_msg = f"Error from Ollama API: {response.status} - {await response.text()}"
+                            logger.error(error_msg, {"component": "ChatGPT", "method": "_post_once"})
+                            outcome_recorded = True
+                            # Client errors mean the request was bad, not that the backend is unhealthy
+                            if response.status >= 500:
+                                breaker.record_failure()
+                                raise Exception(error_msg)
+                            breaker.record_success()
+                            raise LLMRequestError(error_msg, response.status)
                         data = await response.json()
-                        if 'response' in data:
-                            logger.debug(f"Received response from Ollama: {data['response']}", {"component": "ChatGPT", "method": "chat_with_ollama"})
-                            return data['response']
-                        else:
-                            logger.error(f"Unexpected response structure: {data}", {"component": "ChatGPT", "method": "chat_with_ollama"})
-                            raise ValueError("Unexpected response structure from Ollama API")
-                    else:
-                        error_msg = f"Error from Ollama API: {response.status} - {await response.text()}"
-                        logger.error(error_msg, {"component": "ChatGPT", "method": "chat_with_ollama"})
-                        raise Exception(error_msg)
-            except aiohttp.ClientError as e:
-                logger.error(f"Network error in Ollama API call: {str(e)}", {"component": "ChatGPT", "method": "chat_with_ollama"})
+                        breaker.record_success()
+                        outcome_recorded = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not outcome_recorded:
+                    breaker.record_failure()
+                    outcome_recorded = True
+                logger.error(f"Network error in Ollama API call: {str(e)}", {"component": "ChatGPT", "method": "_post_once"})
+                raise
+            finally:
+                # Cancelled, or failed in a way that says nothing about the backend: free the probe slot
+                if not outcome_recorded:
+                    breaker.release_probe()
+        if self.hedger is not None:
+            self.hedger.latencies.record(time.monotonic() - started)
+        text = backend.extract_text(data)
+        if text is None:
+            logger.error(f"Unexpected response structure: {data}", {"component": "ChatGPT", "method": "_post_once"})
+            raise ValueError("Unexpected response structure from Ollama API")
+        usage = backend.usage(data)
+        if call is not None and usage is not None:
+            prompt_tokens, completion_tokens, prefill = usage
+            # Without a stream, the first token is placed at request start plus the server's prefill time
+            call.usage(prompt_tokens, completion_tokens, started - call.started + prefill if prefill is not None else None)
+        logger.debug(f"Received response from Ollama: {text}", {"component": "ChatGPT", "method": "_post_once"})
+        return text
+
+    async def stream_chat_with_ollama(self, system_prompt: str, user_prompt: str, priority: Priority=None,
+                                      route: ModelRoute=None, format: Any=None) -> AsyncIterator[str]:
+        """Yield completion chunks as Ollama produces them instead of waiting for the full response.
+
+        Closing the iterator early (e.g. `break` or cancellation) closes the HTTP response, which stops generation upstream.
+        """
+        logger.debug(f"Streaming request to Ollama with system prompt: {system_prompt} and user_prompt: {user_prompt}", {"component": "ChatGPT", "method": "stream_chat_with_ollama"})
+        if priority is None or route is None:
+            call_chain = _resolve_call_chain()
+            priority = priority if priority is not None else self._resolve_priority(call_chain[0], None)
+            route = route or self.router.resolve(call_chain, user_prompt)
+        payload = self._build_generate_payload(system_prompt, user_prompt, stream=True, route=route, format=format)
+        async for chunk in self._stream("/api/generate", payload, priority):
+            yield chunk
+
+    async def _stream(self, path: str, payload: Dict[str, Any], priority: Priority, session_key: str=None) -> AsyncIterator[str]:
+        if self.cassette is None:
+            stream = self._stream_live(path, payload, priority, session_key)
+        else:
+            stream = self.cassette.around_stream("llm", {"path": path, "payload": payload},
+                                                 lambda: self._stream_live(path, payload, priority, session_key))
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _stream_live(self, path: str, payload: Dict[str, Any], priority: Priority, session_key: str=None) -> AsyncIterator[str]:
+        backend = self.pool.select(payload["model"], session_key=session_key)
+        breaker = backend.breaker
+        url, body = backend.prepare(path, payload)
+        session = await self._get_session()
+        call = current_call()
+        async with self.scheduler.slot(priority) as waited:
+            if call is not None:
+                call.queue_wait += waited
+                call.attempts += 1
+            breaker.before_call()
+            outcome_recorded = False
+            try:
+                with self.pool.track(backend):
+                    async with session.post(url, json=body, headers=backend.headers) as response:
+                        if response.status != 200:
+                            error_msg = f"Error from Ollama API: {response.status} - {await response.text()}"
+                            logger.error(error_msg, {"component": "ChatGPT", "method": "_stream_live"})
+                            outcome_recorded = True
+                            if response.status >= 500:
+                                breaker.record_failure()
+                                raise Exception(error_msg)
+                            breaker.record_success()
+                            raise LLMRequestError(error_msg, response.status)
+                        # Headers arrived, so the backend is up even if the consumer stops reading early
+                        breaker.record_success()
+                        outcome_recorded = True
+                        # Ollama streams NDJSON ending in "done": true; OpenAI-style servers stream SSE ending in [DONE]
+                        async for line in response.content:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            chunk, done, usage = backend.parse_stream_line(line)
+                            if call is not None:
+                                if usage is not None:
+                                    call.usage(usage[0], usage[1])
+                                if chunk:
+                                    call.first_token()
+                            if chunk:
+                                yield chunk
+                            if done:
+                                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not outcome_recorded:
+                    breaker.record_failure()
+                    outcome_recorded = True
+                logger.error(f"Network error in Ollama streaming call: {str(e)}", {"component": "ChatGPT", "method": "_stream_live"})
                 raise
+            finally:
+                if not outcome_recorded:
+                    breaker.release_probe()
 
     async def generate(self, prompt: str) -> str:
         logger.info(f"Generating response for prompt: {prompt}", {"component": "ChatGPT", "method": "generate"})
@@ -49,71 +632,69 @@ class ChatGPT:
 
     async def robust_chat_with_ollama(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
         logger.info(f"Starting robust chat with Ollama for system prompt: {system_prompt} and user_prompt: {user_prompt}", {"component": "ChatGPT", "method": "robust_chat_with_ollama"})
-        response = await self.chat_with_ollama(system_prompt, user_prompt)
-        return await self._ensure_json_response(system_prompt, user_prompt, response)
+        return await self.generate_structured(system_prompt, user_prompt, PLAN_SCHEMA, max_repairs=3)
+
+    async def generate_structured(self, system_prompt: str, user_prompt: str, schema: Dict[str, Any], response_type: type=None,
+                                  call_site: str=None, priority: Priority=None, max_repairs: int=1) -> Any:
+        """Generate JSON constrained to `schema`, validate it and return it (converted to `response_type` if given).
+
+        The schema is passed to Ollama as `format` so decoding cannot leave it; repair prompts are only
+        sent if the output still fails validation, and StructuredOutputError is raised once `max_repairs`
+        are used up.
+        """
+        call_site = call_site or _resolve_call_chain()[0]
+        format = schema if self.schema_format else "json"
+        response = await self.chat_with_ollama(system_prompt, user_prompt, call_site=call_site, priority=priority, format=format)
+        data = await self._repair_until_valid(system_prompt, user_prompt, response, schema, max_repairs, call_site, priority, format)
+        return to_response_type(data, response_type)
+
+    async def _parse_structured(self, response: str, schema: Dict[str, Any]):
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            try:
+                data = await self._extract_json(response)
+            except (json.JSONDecodeError, ValueError) as e:
+                return None, [f"Response is not valid JSON: {e}"]
+        return data, validation_errors(schema, data)
+
+    async def _repair_until_valid(self, system_prompt: str, user_prompt: str, response: str, schema: Dict[str, Any],
+                                  max_repairs: int, call_site: str, priority: Priority=None, format: Any=None) -> Any:
+        repairs = 0
+        while True:
+            data, errors = await self._parse_structured(response, schema)
+            if not errors:
+                self.structured_stats.record(call_site, repairs, success=True)
+                self.telemetry.record_repairs(call_site, repairs)
+                logger.debug(f"Validated JSON response: {data}", {"component": "ChatGPT", "method": "_repair_until_valid"})
+                return data
+            logger.error(f"Failed to parse or validate JSON response from Ollama: {errors}", {"component": "ChatGPT", "method": "_repair_until_valid"})
+            logger.error(f"Response content: {response}", {"component": "ChatGPT", "method": "_repair_until_valid"})
+            if repairs >= max_repairs:
+                self.structured_stats.record(call_site, repairs, success=False)
+                self.telemetry.record_repairs(call_site, repairs)
+                raise StructuredOutputError(f"Failed to get a valid JSON response after {repairs} repair attempts: {errors}")
+            repairs += 1
+            feedback_prompt = f"""
+            The previous response was not in valid JSON format or did not match the required schema. Please correct it.
+            Original prompt: {user_prompt}
+            Previous response: {response}
+            Problems: {"; ".join(errors)}
+            Provide a valid JSON response matching this JSON schema:
+            {json.dumps(schema, indent=2)}
+            """
+            response = await self.chat_with_ollama(system_prompt, feedback_prompt, call_site=call_site, priority=priority, format=format)
 
     async def _extract_json(self, response: str) -> Dict[str, Any]:
         try:
-            # Find JSON-like content using regex
-            json_match = re.search(r'\{.*\}|\[.*\]', response, re.DOTALL)
-            if not json_match:
-                raise ValueError("No JSON object found in the response")
-            
-            json_response = json.loads(json_match.group(0))
-            return json_response
-        except (json.JSONDecodeError, ValueError) as e:
+            return extract_json(response)
+        except ValueError as e:
             logger.error(f"Failed to extract JSON from response: {e}", {"component": "ChatGPT", "method": "_extract_json"})
             raise
 
     async def _ensure_json_response(self, system_prompt: str, user_prompt: str, response: str) -> Dict[str, Any]:
-        schema = {
-            "type": "object",
-            "properties": {
-                "plan": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "description": {"type": "string"},
-                            "tool": {"type": "string"},
-                            "dependencies": {
-                                "type": "array",
-                                "items": {"type": "string"}
-                            }
-                        },
-                        "required": ["description", "tool", "dependencies"]
-                    }
-                }
-            },
-            "required": ["plan"]
-        }
-
-        for attempt in range(3):
-            try:
-                json_response = await self._extract_json(response)
-                validate(instance=json_response, schema=schema)
-                logger.debug(f"Validated JSON response: {json_response}", {"component": "ChatGPT", "method": "_ensure_json_response"})
-                return json_response
-            except (json.JSONDecodeError, jsonschema.exceptions.ValidationError, ValueError) as e:
-                logger.error(f"Failed to parse or validate JSON response from Ollama: {e}", {"component": "ChatGPT", "method": "_ensure_json_response"})
-                logger.error(f"Response content: {response}", {"component": "ChatGPT", "method": "_ensure_json_response"})
-                feedback_prompt = f"""
-                The previous response was not in valid JSON format or did not match the required schema. Please correct it.
-                Original prompt: {user_prompt}
-                Previous response: {response}
-                Provide a valid JSON response with the following structure:
-                {{
-                    "plan": [
-                        {{
-                            "description": "Step description",
-                            "tool": "Tool to use",
-                            "dependencies": ["List of dependencies"]
-                        }}
-                    ]
-                }}
-                """
-                response = await self.chat_with_ollama(system_prompt, feedback_prompt)
-        raise ValueError("Failed to get a valid JSON response after 3 attempts")
+        return await self._repair_until_valid(system_prompt, user_prompt, response, PLAN_SCHEMA, max_repairs=3,
+                                              call_site=_resolve_call_chain()[0])
 
     async def chat_with_ollama_with_fallback(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
         try:
@@ -125,26 +706,38 @@ class ChatGPT:
             logger.error(f"Error in chat_with_ollama_with_fallback: {str(e)}", {"component": "ChatGPT", "method": "chat_with_ollama_with_fallback"})
             return {"error": "Fallback response due to error"}
 
-    def chat_with_ollama_nojson(self, system_prompt: str, prompt: str, retries: int=5, delay: int=5):
-        url = "http://localhost:11434/api/generate"
-        payload = {
-            "model": "llama3.1",
-            "prompt": f"{system_prompt}\n{prompt}",
-            "stream": False,
-        }
-        headers = {"Content-Type": "application/json"}
-        for i in range(retries):
-            try:
-                response = requests.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                response = response.json()
-                return response['response']
-            except requests.exceptions.RequestException as e:
-                if i < retries - 1:  # i is zero indexed
-                    time.sleep(delay)  # wait before trying again
-                else:
-                    logger.error(f"Failed after {retries} attempts: {str(e)}", {"component": "ChatGPT", "method": "chat_with_ollama_nojson"})
-                    raise e  # re-raise the last exception if all retries fail
+    def _sibling_client(self) -> "ChatGPT":
+        """A client for another event loop that shares this one's backends, limits, cache, routes, cassette and metrics.
+
+        Only the loop-bound parts (pooled sessions, single-flight) are its own.
+        """
+        client = ChatGPT(pool_size=self.pool_size, per_host_limit=self.per_host_limit, keepalive_timeout=self.keepalive_timeout,
+                         request_timeout=self.request_timeout, response_cache=self.response_cache,
+                         cache_disabled_call_sites=self.cache_disabled_call_sites, scheduler=self.scheduler, router=self.router,
+                         backend_pool=self.pool, cassette=self.cassette)
+        client.hedger = self.hedger
+        client.telemetry = self.telemetry
+        client.structured_stats = self.structured_stats
+        return client
+
+    async def chat_text(self, system_prompt: str, prompt: str) -> str:
+        """Plain-text completion without a JSON output format.
+
+        Routed as `ChatGPT.chat_with_ollama_nojson`, so the `plain_text` route in config.yaml keeps
+        the llama3.1 model the blocking version used.
+        """
+        return await self.chat_with_ollama(system_prompt, prompt, call_site="ChatGPT.chat_with_ollama_nojson")
+
+    def chat_with_ollama_nojson(self, system_prompt: str, prompt: str, retries: int=5, delay: int=5) -> str:
+        """Blocking plain-text completion for legacy synchronous callers; async code should await chat_text.
+
+        Runs on a SyncChatGPT's private loop, so it never blocks an event loop on its own thread.
+        `retries` and `delay` are unused: the async client retries with backoff.
+        """
+        if self._sync_client is None:
+            from app.llm.sync_client import SyncChatGPT
+            self._sync_client = SyncChatGPT(self._sibling_client)
+        return self._sync_client.chat_with_ollama(system_prompt, prompt, call_site="ChatGPT.chat_with_ollama_nojson")
 
     async def generate_code(self, prompt: str) -> str:
         logger.info(f"Generating code for prompt: {prompt}", {"component": "ChatGPT", "method": "generate_code"})
@@ -49,8 +49,7 @@ class AdvancedEntropyManager:
         Each object should have 'content' and 'importance' keys.
         """
         try:
-            response = await self.llm.chat_with_ollama("You are an AI specializing in knowledge compression and information theory.", prompt)
-            compressed_knowledge = json.loads(response)
+            compressed_knowledge = await self.llm.chat_json("You are an AI specializing in knowledge compression and information theory.", prompt)
             
             if not isinstance(compressed_knowledge, list):
                 raise ValueError("Response is not a list")
@@ -9,7 +9,8 @@ from app.human_feedback.feedback_interface import HumanFeedbackInterface
 from typing import List, Dict, Any
 import numpy as np
 import asyncio
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
+from app.llm.circuit_breaker import LLMUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +25,8 @@ class AdaptiveTaskExecutor:
         self.human_feedback_interface = human_feedback_interface
         self.state_dim = 100  # Set this to match the input_dim of AdvancedRL
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           retry=retry_if_not_exception_type(LLMUnavailableError))
     async def execute_task(self, task: str):
         plan = await self._generate_plan(task)
         result = {"result": []}
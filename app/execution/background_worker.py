@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class BackgroundWorker:
+    """Runs fire-and-forget jobs (bookkeeping after a response is sent) on a fixed set of worker tasks.
+
+    Jobs wait in a bounded queue; `submit` blocks while the queue is full, so producers slow down
+    instead of piling up unbounded work. A failing job is logged and counted, never propagated.
+    """
+
+    def __init__(self, concurrency: int = 2, max_queue: int = 100, name: str = "background"):
+        self.concurrency = concurrency
+        self.name = name
+        self._queue: "asyncio.Queue[Optional[Tuple[str, Callable[[], Awaitable[Any]], float]]]" = asyncio.Queue(maxsize=max_queue)
+        self._workers: List[asyncio.Task] = []
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "blocked_submits": 0}
+        self._durations: Dict[str, float] = {}
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._run(), name=f"{self.name}-{i}") for i in range(self.concurrency)]
+
+    async def submit(self, name: str, job: Callable[[], Awaitable[Any]]):
+        """Queue `job` (a coroutine factory), waiting for room if the queue is full."""
+        if self._queue.full():
+            self.stats["blocked_submits"] += 1
+            logger.warning(f"{self.name} queue is full ({self._queue.qsize()} jobs); waiting to submit {name}")
+        await self._queue.put((name, job, time.monotonic()))
+        self.stats["submitted"] += 1
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                name, job, queued_at = item
+                started = time.monotonic()
+                try:
+                    await job()
+                    self.stats["completed"] += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Background job {name} failed: {str(e)}")
+                finally:
+                    finished = time.monotonic()
+                    self._durations[name] = finished - started
+                    logger.info(f"Background job {name} waited {started - queued_at:.3f}s and ran {finished - started:.3f}s")
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 30.0):
+        """Let queued jobs finish (for up to `timeout` seconds), then stop the workers."""
+        if not self._workers:
+            return
+        for _ in self._workers:
+            await self._queue.put(None)
+        done, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        if pending:
+            logger.warning(f"{self.name} stopped with {self._queue.qsize()} jobs still queued")
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, queued=self._queue.qsize(), workers=len(self._workers),
+                    last_durations=dict(self._durations))
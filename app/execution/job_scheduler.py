@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.shared_state.store import StateStore
+
+logger = logging.getLogger(__name__)
+
+class ScheduledJob:
+    """A named periodic job and the metrics of its runs."""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, jitter: float = 0.0,
+                 timeout: float = None, initial_delay: float = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self._trigger = asyncio.Event()
+        self.stats = {
+            "runs": 0, "failures": 0, "timeouts": 0, "skipped": 0,
+            "last_started": None, "last_finished": None, "last_duration": None, "last_error": None,
+            "next_run": None
+        }
+
+    def next_delay(self) -> float:
+        """The interval, spread by up to +/- `jitter` of itself so jobs started together drift apart."""
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+class JobScheduler:
+    """In-process scheduler for periodic background jobs.
+
+    Jobs are registered once by name (registering a name again is a no-op), never overlap with
+    themselves, and are cancelled if a run exceeds its `timeout` budget. A failing run is logged
+    and counted, and the job keeps its schedule. Given a shared `state_store`, each run first takes
+    a lease on the job, so with several worker processes a job runs about once per interval across
+    all of them rather than once per worker.
+    """
+
+    def __init__(self, state_store: StateStore = None):
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._started = False
+        self.state_store = state_store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[Any]], interval: float, jitter: float = 0.1,
+                timeout: float = None, initial_delay: float = None) -> bool:
+        """Register a periodic job; returns False if a job with that name already exists.
+
+        `initial_delay` defaults to one (jittered) interval, so nothing runs during startup.
+        """
+        if name in self.jobs:
+            logger.debug(f"Job {name} is already scheduled")
+            return False
+        job = ScheduledJob(name, func, interval, jitter=jitter, timeout=timeout, initial_delay=initial_delay)
+        self.jobs[name] = job
+        if self._started:
+            job.task = asyncio.create_task(self._loop(job), name=f"job-{name}")
+        return True
+
+    def start(self):
+        self._started = True
+        for job in self.jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(self._loop(job), name=f"job-{job.name}")
+
+    async def stop(self):
+        self._started = False
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+    def trigger(self, name: str) -> bool:
+        """Run a job as soon as possible; returns False (and counts a skip) if it is already running."""
+        job = self.jobs[name]
+        if job.running:
+            job.stats["skipped"] += 1
+            return False
+        job._trigger.set()
+        return True
+
+    async def _loop(self, job: ScheduledJob):
+        delay = job.initial_delay if job.initial_delay is not None else job.next_delay()
+        while True:
+            job.stats["next_run"] = time.time() + delay
+            try:
+                await asyncio.wait_for(job._trigger.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            job._trigger.clear()
+            if self._claim(job):
+                await self._run(job)
+            delay = job.next_delay()
+
+    def _claim(self, job: ScheduledJob) -> bool:
+        if self.state_store is None:
+            return True
+        # The lease outlives the run and lapses before the shortest next interval
+        ttl = max(job.interval * (1 - job.jitter), job.timeout or 0)
+        if self.state_store.acquire_lease(f"job:{job.name}", self.owner, ttl):
+            return True
+        job.stats["skipped"] += 1
+        logger.debug(f"Job {job.name} ran recently in another worker; skipping")
+        return False
+
+    async def _run(self, job: ScheduledJob):
+        job.running = True
+        job.stats["next_run"] = None
+        job.stats["last_started"] = time.time()
+        started = time.monotonic()
+        # A task rather than wait_for, so timeouts raised inside the job are not mistaken for the budget
+        task = asyncio.ensure_future(job.func())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=job.timeout)
+            if not done:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                job.stats["timeouts"] += 1
+                job.stats["last_error"] = f"exceeded its {job.timeout}s budget"
+                logger.error(f"Job {job.name} exceeded its {job.timeout}s budget and was cancelled")
+            elif task.exception() is not None:
+                job.stats["failures"] += 1
+                job.stats["last_error"] = str(task.exception())
+                logger.error(f"Job {job.name} failed: {task.exception()}")
+            else:
+                job.stats["last_error"] = None
+        finally:
+            if not task.done():
+                task.cancel()
+            job.running = False
+            job.stats["runs"] += 1
+            job.stats["last_finished"] = time.time()
+            job.stats["last_duration"] = round(time.monotonic() - started, 3)
+        logger.info(f"Job {job.name} finished in {job.stats['last_duration']}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: dict(job.stats, running=job.running, interval=job.interval) for name, job in self.jobs.items()}
@@ -1,28 +1,102 @@
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 from typing import Dict, Any, List
 from app.utils.logger import StructuredLogger
 import os
 from dotenv import load_dotenv
 import asyncio
 import numpy as np
-from scipy.spatial.distance import cosine
 import time
 import hashlib
 import json
+import re
+import socket
 import uuid
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from app.replay.cassette import Cassette
+from app.shared_state.store import StateStore, SharedDict, get_state_store
+from app.knowledge.write_behind import WriteBehindBuffer
+from app.knowledge.vector_index import VectorIndex
 
 load_dotenv()
 
 logger = StructuredLogger("KnowledgeGraph")
 
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Every node written by this class also carries this label, so lookups by id can use one index
+ENTITY_LABEL = "Entity"
+
+# Indexes and constraints for the lookups this class makes; all statements are idempotent
+SCHEMA_STATEMENTS = [
+    f"CREATE CONSTRAINT entity_id IF NOT EXISTS FOR (n:{ENTITY_LABEL}) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT concept_name IF NOT EXISTS FOR (n:Concept) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT tool_name IF NOT EXISTS FOR (n:Tool) REQUIRE n.name IS UNIQUE",
+    "CREATE INDEX tool_usage_tool_name_timestamp IF NOT EXISTS FOR (n:ToolUsage) ON (n.tool_name, n.timestamp)",
+    "CREATE INDEX performance_timestamp IF NOT EXISTS FOR (n:Performance) ON (n.timestamp)",
+]
+
+# Full-text index over the text of every node, used by get_relevant_knowledge
+FULLTEXT_INDEX = "entity_text"
+FULLTEXT_STATEMENT = f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS FOR (n:{ENTITY_LABEL}) ON EACH [n.name, n.content]"
+
+# Longest search: very long task descriptions are cut to their first distinct words
+_MAX_SEARCH_TERMS = 32
+
+def _search_terms(text: str) -> List[str]:
+    # Plain lowercase word tokens, so they are safe to join into a Lucene query without escaping
+    terms = []
+    for word in re.findall(r"\w+", (text or "").lower()):
+        if len(word) > 1 and word not in terms:
+            terms.append(word)
+    return terms[:_MAX_SEARCH_TERMS]
+
+# Nodes written before the entity label existed are labelled in batches of this size, once per
+# database: a marker node records that the backfill ran, so later startups skip the full scan
+_BACKFILL_BATCH = 10000
+_BACKFILL_MARKER = "entity_label_backfill"
+
 class KnowledgeGraph:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))  # Correctly initialize the driver
-        self.is_async = asyncio.iscoroutinefunction(self.driver.session)
-        self.embeddings = {}
+    def __init__(self, uri, user, password, cassette: Cassette = None, state_store: StateStore = None):
+        # Record/replay of every query (CASSETTE_PATH / CASSETTE_MODE); replay needs no database at all
+        self.cassette = cassette or Cassette.from_env()
+        if self.cassette is not None and self.cassette.replaying:
+            self.driver = None
+            self.is_async = False
+        else:
+            self.driver = GraphDatabase.driver(uri, auth=(user, password))  # Correctly initialize the driver
+            self.is_async = asyncio.iscoroutinefunction(self.driver.session)
+        # Node properties and embeddings are visible to every worker process when the state store is shared
+        self.state_store = state_store or get_state_store()
+        self.embeddings = SharedDict(self.state_store, "kg_embeddings")
+        self.embedding_labels = SharedDict(self.state_store, "kg_embedding_labels")
         self.temporal_data = {}
-        self.nodes = {}
+        self.nodes = SharedDict(self.state_store, "kg_nodes")
+        # In-process nearest-neighbour index over the embeddings, persisted to KG_VECTOR_INDEX_PATH if set.
+        # The shared embeddings are the source of truth: the index catches up with them before searching.
+        self.vector_index_path = os.getenv("KG_VECTOR_INDEX_PATH")
+        if self.vector_index_path and os.path.exists(self.vector_index_path):
+            self.vector_index = VectorIndex.load(self.vector_index_path)
+        else:
+            self.vector_index = VectorIndex()
+        self._vector_index_synced = False
+        # Only one worker at a time writes the index file; the lease is held this long
+        self.vector_index_save_lease = float(os.getenv("KG_VECTOR_INDEX_SAVE_LEASE", "300"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        # Rows per UNWIND statement in the bulk write methods
+        self.write_chunk_size = int(os.getenv("KG_WRITE_CHUNK_SIZE", "500"))
+        # Set once connect() has created the schema; labels upserted by name get their index on first use
+        self.bootstrap_schema = os.getenv("KG_SCHEMA_BOOTSTRAP", "true").lower() == "true"
+        self._schema_ready = False
+        self._fulltext_ready = False
+        self._name_indexed = {"Concept", "Tool"}
+        # Write-only records (task results, tool usage, metrics) are batched off the request path once started
+        self.write_behind = WriteBehindBuffer(
+            self.add_or_update_nodes,
+            batch_size=int(os.getenv("KG_WRITE_BEHIND_BATCH", "100")),
+            interval=float(os.getenv("KG_WRITE_BEHIND_INTERVAL", "2.0")),
+            max_pending=int(os.getenv("KG_WRITE_BEHIND_MAX_PENDING", "10000"))
+        )
         logger.info(f"Initialized KnowledgeGraph with {'async' if self.is_async else 'sync'} driver")
 
     def __getitem__(self, key):
@@ -32,6 +106,9 @@ class KnowledgeGraph:
         self.nodes[key] = value
 
     async def connect(self):
+        if self.driver is None:
+            logger.info("Replaying Neo4j queries from a cassette; not connecting to the database")
+            return
         try:
             if self.is_async:
                 await self.driver.verify_connectivity()
@@ -41,14 +118,112 @@ class KnowledgeGraph:
         except Exception as e:
             logger.error(f"Failed to connect to Neo4j database: {str(e)}")
             raise
+        if self.bootstrap_schema:
+            await self.ensure_schema()
+
+    async def _apply_schema(self, statement: str) -> bool:
+        # Schema changes are not application data, so they bypass the cassette
+        try:
+            await self._run_query(statement)
+            return True
+        except Exception as e:
+            # e.g. existing duplicate names block a uniqueness constraint; lookups still work, only slower
+            logger.warning(f"Could not apply schema statement ({statement}): {str(e)}")
+            return False
+
+    async def ensure_schema(self):
+        """Create the constraints and indexes the queries in this class rely on, and label older nodes."""
+        applied = [await self._apply_schema(statement) for statement in SCHEMA_STATEMENTS]
+        self._fulltext_ready = await self._apply_schema(FULLTEXT_STATEMENT)
+        applied.append(self._fulltext_ready)
+        await self._backfill_entity_label()
+        self._schema_ready = True
+        logger.info(f"Schema bootstrap applied {sum(applied)} of {len(applied)} statements")
+
+    async def _backfill_entity_label(self):
+        backfill = f"""
+        MATCH (n)
+        WHERE n.id IS NOT NULL AND NOT n:{ENTITY_LABEL}
+        WITH n LIMIT {_BACKFILL_BATCH}
+        SET n:{ENTITY_LABEL}
+        RETURN count(n) AS labelled
+        """
+        try:
+            marker = await self._run_query("MATCH (m:SchemaMigration {name: $name}) RETURN count(m) > 0 AS done",
+                                           {"name": _BACKFILL_MARKER})
+            if marker and marker[0].get("done"):
+                return
+            labelled = _BACKFILL_BATCH
+            while labelled == _BACKFILL_BATCH:
+                result = await self._run_query(backfill)
+                labelled = result[0]["labelled"] if result else 0
+            await self._run_query("MERGE (m:SchemaMigration {name: $name}) SET m.applied_at = timestamp()",
+                                  {"name": _BACKFILL_MARKER})
+        except Exception as e:
+            logger.warning(f"Could not label existing nodes as {ENTITY_LABEL}: {str(e)}")
+
+    async def _ensure_name_index(self, label: str):
+        if not self._schema_ready or label in self._name_indexed:
+            return
+        self._name_indexed.add(label)
+        await self._apply_schema(f"CREATE INDEX {label.lower()}_name IF NOT EXISTS FOR (n:{self._check_identifier(label)}) ON (n.name)")
+
+    def start_write_behind(self):
+        self.write_behind.start()
+
+    async def stop_write_behind(self):
+        await self.write_behind.stop()
+
+    async def refresh_vector_index(self):
+        """Bring the vector index in line with the shared embeddings, which other workers also write."""
+        loop = asyncio.get_running_loop()
+        stored = set(await loop.run_in_executor(None, list, self.embeddings))
+        # Embeddings reach the store before the index, so anything indexed but not stored was deleted
+        for node_id in [node_id for node_id in self.vector_index.ids() if node_id not in stored]:
+            self.vector_index.remove(node_id)
+        missing = [node_id for node_id in stored if node_id not in self.vector_index]
+        if missing:
+            rows = await loop.run_in_executor(None, lambda: [(node_id, self.embeddings.get(node_id), self.embedding_labels.get(node_id))
+                                                             for node_id in missing])
+            for node_id, embedding, label in rows:
+                if embedding is not None and node_id not in self.vector_index:
+                    self.vector_index.add(node_id, embedding, label)
+        self._vector_index_synced = True
+
+    async def save_vector_index(self) -> bool:
+        """Write the index to KG_VECTOR_INDEX_PATH, unless another worker holds the save lease."""
+        if not self.vector_index_path:
+            return False
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.state_store.acquire_lease, "kg_vector_index_save",
+                                          self.owner, self.vector_index_save_lease):
+            logger.info("Another worker saved the vector index recently; not saving it again")
+            return False
+        await self.refresh_vector_index()
+        self.vector_index.save(self.vector_index_path)
+        logger.info(f"Saved vector index with {len(self.vector_index)} embeddings to {self.vector_index_path}")
+        return True
 
     async def close(self):
+        await self.stop_write_behind()
+        await self.save_vector_index()
         if self.driver:
-            await self.driver.close()
+            if self.is_async:
+                await self.driver.close()
+            else:
+                self.driver.close()
             logger.info("Closed connection to Neo4j database")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def execute_query(self, query: str, parameters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        if self.cassette is None:
+            return await self._run_query(query, parameters)
+        return await self.cassette.around("neo4j", {"query": query, "parameters": parameters},
+                                          lambda: self._run_query(query, parameters))
+
+    # Only transient driver errors are worth retrying; query errors would fail the same way again
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
+           retry=retry_if_exception_type((ServiceUnavailable, SessionExpired, TransientError)))
+    async def _run_query(self, query: str, parameters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         try:
             if self.is_async:
                 async with self.driver.session() as session:
@@ -64,47 +239,115 @@ class KnowledgeGraph:
             logger.error(f"Parameters: {parameters}")
             raise
 
-    async def add_or_update_node(self, label: str, properties: Dict[str, Any], embedding: np.ndarray = None):
-        node_id = properties.get('id') or str(uuid.uuid4())
-        properties['id'] = node_id
-
-        # Serialize any non-primitive types
+    @staticmethod
+    def _serialize_properties(properties: Dict[str, Any]) -> Dict[str, Any]:
+        # Neo4j only stores primitives and homogeneous lists of primitives
         for key, value in properties.items():
             if not isinstance(value, (str, int, float, bool, list)) or (isinstance(value, list) and not all(isinstance(item, (str, int, float, bool)) for item in value)):
                 properties[key] = json.dumps(value)
+        return properties
+
+    @staticmethod
+    def _check_identifier(name: str) -> str:
+        # Labels and relationship types cannot be query parameters, so they are interpolated and must be plain names
+        if not _IDENTIFIER.match(name or ""):
+            raise ValueError(f"Invalid label or relationship type: {name!r}")
+        return name
+
+    def _chunks(self, rows: List[Dict[str, Any]], chunk_size: int = None):
+        chunk_size = chunk_size or self.write_chunk_size
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    async def _remember_nodes(self, label: str, rows: List[Dict[str, Any]], embeddings: List[np.ndarray] = None):
+        # The state store may be a SQLite file: write in one transaction per map, off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.nodes.update, {row['id']: row for row in rows})
+        vectors = {row['id']: embedding for row, embedding in zip(rows, embeddings or ()) if embedding is not None}
+        if vectors:
+            await self._remember_embeddings(label, vectors)
+
+    async def _remember_embeddings(self, label: str, vectors: Dict[str, np.ndarray]):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.embeddings.update, vectors)
+        await loop.run_in_executor(None, self.embedding_labels.update, dict.fromkeys(vectors, label))
+        for node_id, embedding in vectors.items():
+            self.vector_index.add(node_id, embedding, label)
+            self.temporal_data[node_id] = {'created_at': time.time(), 'last_accessed': time.time()}
 
-        # First, try to find an existing node with the same 'name' property
-        find_query = f"""
-        MATCH (n:{label} {{name: $name}})
-        RETURN n
-        """
-        result = await self.execute_query(find_query, {"name": properties.get('name')})
-
-        if result:
-            # If a node with the same name exists, update it
-            update_query = f"""
-            MATCH (n:{label} {{name: $name}})
-            SET n += $properties
+    async def add_or_update_node(self, label: str, properties: Dict[str, Any], embedding: np.ndarray = None):
+        self._check_identifier(label)
+        node_id = properties.get('id') or str(uuid.uuid4())
+        properties['id'] = node_id
+        self._serialize_properties(properties)
+
+        # Nodes are identified by 'name'; MERGE finds or creates one in a single round-trip.
+        # Nodes without a name can never match, so they are always created.
+        if properties.get('name') is not None:
+            await self._ensure_name_index(label)
+            query = f"""
+            MERGE (n:{label} {{name: $name}})
+            SET n += $properties, n:{ENTITY_LABEL}
             RETURN n
             """
-            await self.execute_query(update_query, {"name": properties.get('name'), "properties": properties})
-            logger.info(f"Updated existing node with name: {properties.get('name')}")
         else:
-            # If no node with the same name exists, create a new one
-            create_query = f"""
-            CREATE (n:{label} $properties)
+            query = f"""
+            CREATE (n:{label}:{ENTITY_LABEL} $properties)
             RETURN n
             """
-            await self.execute_query(create_query, {"properties": properties})
-            logger.info(f"Created new node with ID: {node_id}")
+        await self.execute_query(query, {"name": properties.get('name'), "properties": properties})
 
-        if embedding is not None:
-            self.embeddings[node_id] = embedding
-            self.temporal_data[node_id] = {'created_at': time.time(), 'last_accessed': time.time()}
-
-        self.nodes[node_id] = properties
+        await self._remember_nodes(label, [properties], [embedding])
         logger.info(f"Added or updated node with ID: {node_id}")
 
+    async def add_or_update_nodes(self, label: str, rows: List[Dict[str, Any]], embeddings: List[np.ndarray] = None,
+                                  chunk_size: int = None) -> List[str]:
+        """Upsert many nodes with one UNWIND statement per chunk of rows.
+
+        Rows follow the same rules as add_or_update_node. Returns the node ids in row order.
+        """
+        self._check_identifier(label)
+        named, unnamed = [], []
+        for row in rows:
+            row['id'] = row.get('id') or str(uuid.uuid4())
+            self._serialize_properties(row)
+            (named if row.get('name') is not None else unnamed).append(row)
+
+        if named:
+            await self._ensure_name_index(label)
+        merge_query = f"""
+        UNWIND $rows AS row
+        MERGE (n:{label} {{name: row.name}})
+        SET n += row, n:{ENTITY_LABEL}
+        """
+        create_query = f"""
+        UNWIND $rows AS row
+        CREATE (n:{label}:{ENTITY_LABEL})
+        SET n = row
+        """
+        for query, group in ((merge_query, named), (create_query, unnamed)):
+            for chunk in self._chunks(group, chunk_size):
+                await self.execute_query(query, {"rows": chunk})
+
+        await self._remember_nodes(label, rows, embeddings)
+        logger.info(f"Added or updated {len(rows)} {label} nodes")
+        return [row['id'] for row in rows]
+
+    async def write_behind_node(self, label: str, properties: Dict[str, Any]):
+        """Store a node nothing reads back right away: buffered when write-behind is running, written now otherwise."""
+        if self.write_behind.running:
+            self.write_behind.enqueue(label, properties)
+        else:
+            await self.add_or_update_node(label, properties)
+
+    async def search_similar(self, vector: np.ndarray, k: int = 10, label: str = None) -> List[Dict[str, Any]]:
+        """The `k` nodes whose embeddings are closest to `vector` (cosine), most similar first."""
+        loop = asyncio.get_running_loop()
+        if not self._vector_index_synced or await loop.run_in_executor(None, len, self.embeddings) != len(self.vector_index):
+            await self.refresh_vector_index()
+        matches = self.vector_index.search(vector, k, label)
+        nodes = await loop.run_in_executor(None, lambda: [self.nodes.get(node_id) for node_id, _ in matches])
+        return [{"id": node_id, "score": score, "node": node} for (node_id, score), node in zip(matches, nodes)]
+
     async def add_relationship(self, start_node: Dict[str, Any], end_node: Dict[str, Any], relationship_type: str, properties: Dict[str, Any] = None):
         start_node_id = start_node.get('id')
         end_node_id = end_node.get('id')
@@ -117,8 +360,8 @@ class KnowledgeGraph:
         properties['id'] = relationship_id
 
         query = f"""
-        MATCH (a {{id: $start_node_id}})
-        MATCH (b {{id: $end_node_id}})
+        MATCH (a:{ENTITY_LABEL} {{id: $start_node_id}})
+        MATCH (b:{ENTITY_LABEL} {{id: $end_node_id}})
         CREATE (a)-[r:{relationship_type} $properties]->(b)
         RETURN r
         """
@@ -129,6 +372,32 @@ class KnowledgeGraph:
         })
         logger.info(f"Created relationship {relationship_type} between {start_node_id} and {end_node_id}")
 
+    async def add_relationships(self, rows: List[Dict[str, Any]], chunk_size: int = None):
+        """Create many relationships with one UNWIND statement per relationship type and chunk.
+
+        Each row is {"start_id", "end_id", "type", "properties"}; properties are optional.
+        """
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            if not row.get('start_id') or not row.get('end_id'):
+                raise ValueError("Every relationship needs a 'start_id' and an 'end_id'")
+            properties = self._serialize_properties(dict(row.get('properties') or {}))
+            properties['id'] = str(uuid.uuid4())
+            by_type.setdefault(self._check_identifier(row['type']), []).append(
+                {"start_id": row['start_id'], "end_id": row['end_id'], "properties": properties})
+
+        for relationship_type, group in by_type.items():
+            query = f"""
+            UNWIND $rows AS row
+            MATCH (a:{ENTITY_LABEL} {{id: row.start_id}})
+            MATCH (b:{ENTITY_LABEL} {{id: row.end_id}})
+            CREATE (a)-[r:{relationship_type}]->(b)
+            SET r = row.properties
+            """
+            for chunk in self._chunks(group, chunk_size):
+                await self.execute_query(query, {"rows": chunk})
+        logger.info(f"Created {len(rows)} relationships")
+
     async def get_node(self, label: str, properties: Dict[str, Any]) -> Dict[str, Any]:
         query = f"""
         MATCH (n:{label} {{name: $name}})
@@ -152,7 +421,7 @@ class KnowledgeGraph:
             "result": result,
             "timestamp": time.time()
         }
-        await self.add_or_update_node("TaskResult", task_node)
+        await self.write_behind_node("TaskResult", task_node)
         logger.info(f"Added task result for task: {task[:100]}...")
 
     async def add_improvement_suggestion(self, improvement: str):
@@ -186,10 +455,7 @@ class KnowledgeGraph:
 
     async def store_performance_metric(self, metric: str, value: float):
         try:
-            query = """
-            CREATE (p:Performance {metric: $metric, value: $value, timestamp: $timestamp})
-            """
-            await self.execute_query(query, {"metric": metric, "value": value, "timestamp": time.time()})
+            await self.write_behind_node("Performance", {"metric": metric, "value": value, "timestamp": time.time()})
             logger.info(f"Stored performance metric: {metric} = {value}")
         except Exception as e:
             logger.error(f"Error storing performance metric: {str(e)}", exc_info=True)
@@ -210,7 +476,7 @@ class KnowledgeGraph:
             "result": json.dumps(result),
             "timestamp": time.time()
         }
-        await self.add_or_update_node("ToolUsage", tool_usage)
+        await self.write_behind_node("ToolUsage", tool_usage)
 
     async def get_tool_usage_history(self, tool_name: str, limit: int = 10) -> List[Dict[str, Any]]:
         query = """
@@ -248,13 +514,39 @@ class KnowledgeGraph:
         result = await self.execute_query(query)
         return [record['t'] for record in result]
 
-    async def get_relevant_knowledge(self, content: str) -> List[Dict[str, Any]]:
-        query = """
-        MATCH (n)
-        WHERE n.content CONTAINS $content
-        RETURN n
+    async def get_relevant_knowledge(self, content: str, limit: int = 10, labels: List[str] = None,
+                                     properties: List[str] = None) -> List[Dict[str, Any]]:
+        """Nodes whose name or content best match the words of `content`, most relevant first.
+
+        Uses the full-text index when the schema bootstrap created it and a bounded term-overlap
+        scan otherwise. `labels` restricts the node labels searched; `properties` projects the
+        returned nodes down to those keys.
         """
-        result = await self.execute_query(query, {"content": content})
+        terms = _search_terms(content)
+        if not terms:
+            return []
+        projection = "n {" + ", ".join(f".{self._check_identifier(key)}" for key in properties) + "}" if properties else "n"
+        if self._fulltext_ready:
+            query = f"""
+            CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $search) YIELD node AS n, score
+            WHERE $labels IS NULL OR any(label IN labels(n) WHERE label IN $labels)
+            RETURN {projection} AS n, score
+            ORDER BY score DESC
+            LIMIT $limit
+            """
+            search = " OR ".join(terms)
+        else:
+            query = f"""
+            MATCH (n)
+            WHERE n.content IS NOT NULL AND ($labels IS NULL OR any(label IN labels(n) WHERE label IN $labels))
+            WITH n, size([term IN $terms WHERE toLower(n.content) CONTAINS term]) AS score
+            WHERE score > 0
+            RETURN {projection} AS n, score
+            ORDER BY score DESC
+            LIMIT $limit
+            """
+            search = None
+        result = await self.execute_query(query, {"search": search, "terms": terms, "labels": labels, "limit": limit})
         return [record['n'] for record in result]
 
     async def store_compressed_knowledge(self, compressed_knowledge: str):
@@ -263,5 +555,5 @@ class KnowledgeGraph:
             "content": compressed_knowledge,
             "timestamp": time.time()
         }
-        await self.add_or_update_node("CompressedKnowledge", compressed_node)
+        await self.write_behind_node("CompressedKnowledge", compressed_node)
         logger.info(f"Stored compressed knowledge: {compressed_knowledge[:100]}...")
\ No newline at end of file
@@ -0,0 +1,228 @@
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """Cosine-similarity nearest-neighbour search over node embeddings.
+
+    Vectors are normalized and kept in one contiguous float32 matrix, so a query is a single
+    matrix-vector product. Below `train_size` vectors the search is exact. From then on the index
+    is an IVF (inverted file): k-means centroids partition the vectors, each partition keeps the list
+    of its rows, and a query scores only the rows of its `nprobe` closest partitions. Deleting moves
+    the last row into the freed one, so the matrix stays contiguous.
+    """
+
+    def __init__(self, dim: int = None, train_size: int = 20000, nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.train_size = train_size
+        self.nprobe = nprobe
+        self._rng = np.random.default_rng(seed)
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._label_names: List[str] = []
+        self._label_codes: Dict[str, int] = {}
+        self._codes = np.zeros(0, dtype=np.int32)  # label code per row, -1 for none
+        self._centroids: Optional[np.ndarray] = None
+        self._assign = np.zeros(0, dtype=np.int32)  # partition per row once trained
+        self._slot = np.zeros(0, dtype=np.int64)  # position of each row in its partition's list
+        self._lists: List[np.ndarray] = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._rows
+
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    def _normalize(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self.dim is None:
+            self.dim = vector.shape[0]
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a vector of dimension {self.dim}, got {vector.shape[0]}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _label_code(self, label: Optional[str]) -> int:
+        if label is None:
+            return -1
+        if label not in self._label_codes:
+            self._label_codes[label] = len(self._label_names)
+            self._label_names.append(label)
+        return self._label_codes[label]
+
+    def _grow(self):
+        capacity = max(1024, 2 * self._matrix.shape[0])
+        for name in ("_matrix", "_codes", "_assign", "_slot"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _list_append(self, partition: int, row: int):
+        size = self._list_sizes[partition]
+        rows = self._lists[partition]
+        if size == len(rows):
+            rows = self._lists[partition] = np.concatenate([rows, np.zeros(max(16, len(rows)), dtype=np.int64)])
+        rows[size] = row
+        self._slot[row] = size
+        self._assign[row] = partition
+        self._list_sizes[partition] = size + 1
+
+    def _list_remove(self, row: int):
+        partition = self._assign[row]
+        rows = self._lists[partition]
+        last = self._list_sizes[partition] - 1
+        moved = rows[last]
+        rows[self._slot[row]] = moved
+        self._slot[moved] = self._slot[row]
+        self._list_sizes[partition] = last
+
+    def _build_lists(self):
+        nlist = len(self._centroids)
+        assign = self._assign[:self._size]
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self._slot[order] = np.arange(self._size) - offsets[assign[order]]
+        self._lists = [rows.copy() for rows in np.split(order.astype(np.int64), np.cumsum(counts)[:-1])]
+        self._list_sizes = counts.astype(np.int64)
+
+    def add(self, node_id: str, vector, label: str = None):
+        """Insert a vector, or replace the vector and label already stored for `node_id`."""
+        vector = self._normalize(vector)
+        row = self._rows.get(node_id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._ids.append(node_id)
+            self._rows[node_id] = row
+        elif self._centroids is not None:
+            self._list_remove(row)
+        self._matrix[row] = vector
+        self._codes[row] = self._label_code(label)
+        if self._centroids is not None:
+            self._list_append(int(np.argmax(self._centroids @ vector)), row)
+        # Retrain as the index outgrows the partitions it was trained with
+        if self._size >= self.train_size and self._size >= 4 * self._trained_size:
+            self.train()
+
+    def remove(self, node_id: str) -> bool:
+        row = self._rows.pop(node_id, None)
+        if row is None:
+            return False
+        if self._centroids is not None:
+            self._list_remove(row)
+        last = self._size - 1
+        if row != last:
+            moved = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._codes[row] = self._codes[last]
+            self._assign[row] = self._assign[last]
+            self._slot[row] = self._slot[last]
+            if self._centroids is not None:
+                self._lists[self._assign[row]][self._slot[row]] = row
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        self._size -= 1
+        return True
+
+    def train(self, iterations: int = 8):
+        """(Re)build the IVF partitions with k-means on a sample of the stored vectors."""
+        vectors = self._matrix[:self._size]
+        nlist = max(1, int(np.sqrt(self._size)))
+        sample_size = min(self._size, 64 * nlist)
+        sample = vectors[self._rng.choice(self._size, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for partition in range(nlist):
+                members = sample[assign == partition]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[partition] = centroid / norm if norm > 0 else centroid
+        self._centroids = centroids
+        self._assign[:self._size] = np.argmax(vectors @ centroids.T, axis=1)
+        self._build_lists()
+        self._trained_size = self._size
+        logger.info(f"Trained vector index with {nlist} partitions over {self._size} vectors")
+
+    def _top_k(self, rows: Optional[np.ndarray], query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        candidates = self._matrix[:self._size] if rows is None else self._matrix[rows]
+        if len(candidates) == 0:
+            return []
+        scores = candidates @ query
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        positions = best if rows is None else rows[best]
+        return [(self._ids[position], float(scores[index])) for position, index in zip(positions, best)]
+
+    def search(self, vector, k: int = 10, label: str = None) -> List[Tuple[str, float]]:
+        """The `k` stored vectors most similar to `vector`, as (node id, cosine similarity), best first."""
+        if self._size == 0 or k <= 0:
+            return []
+        if label is not None and label not in self._label_codes:
+            return []
+        query = self._normalize(vector)
+        label_mask = self._codes[:self._size] == self._label_codes[label] if label is not None else None
+        if self._centroids is None:
+            rows = np.flatnonzero(label_mask) if label_mask is not None else None
+            return self._top_k(rows, query, k)
+        probes = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        rows = np.concatenate([self._lists[partition][:self._list_sizes[partition]] for partition in probes])
+        if label_mask is not None:
+            rows = rows[label_mask[rows]]
+        results = self._top_k(rows, query, k)
+        if len(results) < k and label_mask is not None:
+            # A rare label may be missing from the probed partitions; its rows are few enough to scan
+            results = self._top_k(np.flatnonzero(label_mask), query, k)
+        return results
+
+    def save(self, path: str):
+        """Write the index to `path` (an .npz file), replacing any previous file atomically."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(f,
+                     matrix=self._matrix[:self._size],
+                     ids=np.array(self._ids, dtype=str),
+                     codes=self._codes[:self._size],
+                     labels=np.array(self._label_names, dtype=str),
+                     assign=self._assign[:self._size],
+                     centroids=self._centroids if self._centroids is not None else np.zeros((0, self.dim or 0), dtype=np.float32),
+                     settings=np.array([self.dim or 0, self.train_size, self.nprobe, self._trained_size]))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        with np.load(path, allow_pickle=False) as data:
+            dim, train_size, nprobe, trained_size = (int(value) for value in data["settings"])
+            index = cls(dim=dim or None, train_size=train_size, nprobe=nprobe)
+            index._size = len(data["ids"])
+            index._matrix = data["matrix"].astype(np.float32).reshape(index._size, dim)
+            index._ids = [str(node_id) for node_id in data["ids"]]
+            index._rows = {node_id: row for row, node_id in enumerate(index._ids)}
+            index._label_names = [str(label) for label in data["labels"]]
+            index._label_codes = {label: code for code, label in enumerate(index._label_names)}
+            index._codes = data["codes"].astype(np.int32)
+            index._assign = data["assign"].astype(np.int32)
+            index._slot = np.zeros(index._size, dtype=np.int64)
+            index._centroids = data["centroids"] if len(data["centroids"]) else None
+            index._trained_size = trained_size
+        if index._centroids is not None:
+            index._build_lists()
+        return index
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindBuffer:
+    """Collects write-only rows per label and hands them to `flush_rows(label, rows)` in batches.
+
+    A flush happens every `interval` seconds, or sooner once a label has `batch_size` rows waiting.
+    At most `max_pending` rows are held; writes beyond that are dropped and counted rather than
+    letting memory grow while the database is slow or down.
+    """
+
+    def __init__(self, flush_rows: Callable[[str, List[Dict[str, Any]]], Awaitable[Any]],
+                 batch_size: int = 100, interval: float = 2.0, max_pending: int = 10000):
+        self.flush_rows = flush_rows
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+        self._size = 0
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0,
+                      "max_delay": 0.0, "total_delay": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="kg-write-behind")
+
+    def enqueue(self, label: str, row: Dict[str, Any]) -> bool:
+        """Buffer `row` for `label`; returns False if it was dropped because the buffer is full."""
+        if self._size >= self.max_pending:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] == 1 or self.stats["dropped"] % 1000 == 0:
+                logger.warning(f"Write-behind buffer is full ({self._size} rows); dropped {self.stats['dropped']} writes so far")
+            return False
+        rows = self._pending.setdefault(label, [])
+        rows.append((time.monotonic(), row))
+        self._size += 1
+        self.stats["enqueued"] += 1
+        if len(rows) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far; a failed batch is logged and counted, not retried."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            self._size = 0
+            for label, rows in pending.items():
+                delay = time.monotonic() - rows[0][0]
+                try:
+                    await self.flush_rows(label, [row for _, row in rows])
+                except Exception as e:
+                    self.stats["failed"] += len(rows)
+                    logger.error(f"Write-behind flush of {len(rows)} {label} rows failed: {str(e)}")
+                    continue
+                self.stats["written"] += len(rows)
+                self.stats["flushes"] += 1
+                self.stats["total_delay"] += delay
+                self.stats["max_delay"] = max(self.stats["max_delay"], delay)
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        flushes = self.stats["flushes"]
+        return dict(self.stats, pending=self._size, running=self.running,
+                    mean_delay=self.stats["total_delay"] / flushes if flushes else 0.0,
+                    pending_by_label={label: len(rows) for label, rows in self._pending.items()})
@@ -1,11 +1,13 @@
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.chat_with_ollama import ChatGPT
+from app.llm.structured_output import StructuredOutputError
+from app.llm.circuit_breaker import LLMUnavailableError
 from typing import Dict, Any, List
 import logging
 import neo4j
 import json
 import re
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -15,6 +17,49 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
+NAMED_ITEMS_SCHEMA = {
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "value": {"type": "string"}
+        },
+        "required": ["name", "value"]
+    }
+}
+
+IMPROVEMENT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "key_concepts": {"type": "array", "items": {"type": "string"}},
+        "potential_applications": {"type": "array", "items": {"type": "string"}},
+        "suggested_updates": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "target": {"type": "string", "enum": ["knowledge_graph", "model", "workflow"]},
+                    "update_type": {"type": "string", "enum": ["add", "modify", "remove"]},
+                    "details": {"type": "string"}
+                },
+                "required": ["target", "update_type", "details"]
+            }
+        }
+    },
+    "required": ["key_concepts", "potential_applications", "suggested_updates"]
+}
+
+COLLABORATION_RECOMMENDATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "collaboration_strategy": {"type": "string"},
+        "respond_tool_involvement": {"type": "string"}
+    },
+    "required": ["collaboration_strategy", "respond_tool_involvement"]
+}
+
 class ContinuousLearner:
     def __init__(self, knowledge_graph: KnowledgeGraph, llm: ChatGPT):
         self.knowledge_graph = knowledge_graph
@@ -34,7 +79,7 @@ class ContinuousLearner:
         
         self.learning_rate = max(0.01, min(1.0, self.learning_rate))  # Keep learning rate between 0.01 and 1.0
         
-        await self._update_knowledge_graph(extracted_knowledge)
+        await self._store_knowledge(extracted_knowledge)
 
         # Recommend collaboration if the task is new or unfamiliar
         if novelty_score > self.novelty_threshold:
@@ -45,8 +90,6 @@ class ContinuousLearner:
         # This is a placeholder implementation
         return sum(len(item['value']) for item in knowledge) / 1000
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10),
-           retry=retry_if_exception_type(ValueError))
     async def _extract_knowledge(self, task: Dict[str, Any], result: Dict[str, Any]) -> List[Dict[str, Any]]:
         prompt = f"""
         Task: {task['content']}
@@ -59,23 +102,20 @@ class ContinuousLearner:
             {{"name": "Concept2", "value": "Description of Concept2"}}
         ]
         """
-        extracted_knowledge = await self.llm.chat_with_ollama("You are a knowledge extraction expert.", prompt)
-        parsed_knowledge = self._parse_json_or_text(extracted_knowledge)
-        
-        if not parsed_knowledge:
-            raise ValueError("Failed to extract valid knowledge. Retrying with more specific instructions.")
-        
-        return parsed_knowledge
+        # Schema-constrained output replaces the old parse-and-retry loop; repairs are a last resort
+        return await self.llm.generate_structured("You are a knowledge extraction expert.", prompt, NAMED_ITEMS_SCHEMA, max_repairs=2)
 
-    async def _update_knowledge_graph(self, knowledge: List[Dict[str, Any]]):
+    async def _store_knowledge(self, knowledge: List[Dict[str, Any]]):
         for item in knowledge:
-            try:
-                item['id'] = str(uuid.uuid4())  # Add an 'id' field if it doesn't exist
-                await self.knowledge_graph.add_or_update_node("Concept", item)
-            except Exception as e:
-                logger.error(f"Error updating knowledge graph: {str(e)}", exc_info=True)
+            item['id'] = str(uuid.uuid4())  # Add an 'id' field if it doesn't exist
+        try:
+            # One batched upsert instead of a round-trip per concept
+            await self.knowledge_graph.add_or_update_nodes("Concept", knowledge)
+        except Exception as e:
+            logger.error(f"Error updating knowledge graph: {str(e)}", exc_info=True)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=8))
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=8),
+           retry=retry_if_not_exception_type(LLMUnavailableError))
     async def _apply_concepts(self, task: Dict[str, Any], concepts: List[Dict[str, Any]]) -> str:
         concepts_str = json.dumps(concepts, indent=2)
         prompt = f"""
@@ -92,8 +132,6 @@ class ContinuousLearner:
         
         return response
 
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10),
-           retry=retry_if_exception_type(ValueError))
     async def _extract_insights(self, text: str) -> List[Dict[str, Any]]:
         prompt = f"""
         Extract key insights and learnings from the following text:
@@ -107,13 +145,7 @@ class ContinuousLearner:
         Ensure that the output is valid JSON and contains at least one insight.
         If unsure or unknown, use the respond tool to gather more information.
         """
-        insights = await self.llm.chat_with_ollama("You are an AI tasked with extracting insights from feedback.", prompt)
-        parsed_insights = self._parse_json_or_text(insights)
-        
-        if not parsed_insights:
-            raise ValueError("Failed to extract valid insights. Retrying with more specific instructions.")
-        
-        return parsed_insights
+        return await self.llm.generate_structured("You are an AI tasked with extracting insights from feedback.", prompt, NAMED_ITEMS_SCHEMA, max_repairs=2)
 
     def _parse_json_or_text(self, text: str) -> List[Dict[str, Any]]:
         try:
@@ -183,8 +215,7 @@ class ContinuousLearner:
         }}
         If unsure or unknown, use the respond tool to gather more information.
         """
-        analysis = await self.llm.chat_with_ollama("You are an AI specializing in continuous learning and improvement.", prompt)
-        parsed_analysis = json.loads(analysis)
+        parsed_analysis = await self.llm.generate_structured("You are an AI specializing in continuous learning and improvement.", prompt, IMPROVEMENT_ANALYSIS_SCHEMA)
         
         for update in parsed_analysis['suggested_updates']:
             if update['target'] == 'knowledge_graph':
@@ -218,11 +249,10 @@ class ContinuousLearner:
             "respond_tool_involvement": "Description of how the respond tool will be involved"
         }}
         """
-        collaboration_response = await self.llm.chat_with_ollama("You are an AI specializing in recommending collaboration strategies.", prompt)
         try:
-            collaboration_strategy = json.loads(collaboration_response)
+            collaboration_strategy = await self.llm.generate_structured("You are an AI specializing in recommending collaboration strategies.", prompt, COLLABORATION_RECOMMENDATION_SCHEMA)
             logger.info(f"Recommended collaboration strategy: {collaboration_strategy}")
-        except json.JSONDecodeError:
-            logger.warning("Failed to parse JSON response for collaboration recommendation.")
-            logger.error(f"JSON parsing error: {collaboration_response}", exc_info=True)
+        except StructuredOutputError as e:
+            logger.warning("Failed to get a valid collaboration recommendation.")
+            logger.error(f"Structured output error: {e}", exc_info=True)
 
@@ -0,0 +1,264 @@
+import aiohttp
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.config.config_manager import ConfigManager
+from app.llm.circuit_breaker import CircuitBreaker, LLMUnavailableError
+
+logger = logging.getLogger(__name__)
+
+class NoBackendAvailableError(LLMUnavailableError):
+    """Raised when no healthy backend with a closed circuit serves the requested model."""
+
+class Backend:
+    """One inference server in the pool; requests are written in Ollama's API shape and translated here."""
+
+    kind = "ollama"
+    health_path = "/api/tags"
+
+    def __init__(self, url: str, models: Iterable[str] = None, api_key: str = None, name: str = None,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.name = name or self.url
+        # Models pinned in config; when empty, availability comes from health checks (or is assumed)
+        self.models: Set[str] = set(models or [])
+        self.available_models: Optional[Set[str]] = None
+        self.api_key = api_key
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.breaker = CircuitBreaker(name=self.name, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+    def serves(self, model: str) -> bool:
+        if self.models:
+            return model in self.models
+        if self.available_models is None:
+            return True
+        return model in self.available_models or f"{model}:latest" in self.available_models
+
+    def is_available(self) -> bool:
+        return self.healthy and self.breaker.can_admit()
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def prepare(self, path: str, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Return the URL and body to send for an Ollama-shaped request."""
+        return f"{self.url}{path}", payload
+
+    def extract_text(self, data: Dict[str, Any]) -> Optional[str]:
+        # /api/generate returns {"response": ...}; /api/chat returns {"message": {"content": ...}}
+        if 'response' in data:
+            return data['response']
+        if isinstance(data.get('message'), dict):
+            return data['message'].get('content', '')
+        return None
+
+    def usage(self, data: Dict[str, Any]) -> Optional[Tuple[Optional[int], Optional[int], Optional[float]]]:
+        """Return (prompt tokens, completion tokens, seconds to first token) reported in a response, if any."""
+        if "eval_count" not in data and "prompt_eval_count" not in data:
+            return None
+        # Ollama reports durations in nanoseconds; loading the model plus prompt evaluation precede the first token
+        prefill = data.get("load_duration", 0) + data.get("prompt_eval_duration", 0)
+        return data.get("prompt_eval_count"), data.get("eval_count"), prefill / 1e9 if prefill else None
+
+    def parse_stream_line(self, line: bytes) -> Tuple[Optional[str], bool, Optional[tuple]]:
+        """Parse one streamed line into (text chunk, done, usage)."""
+        data = json.loads(line)
+        if 'error' in data:
+            raise Exception(f"Error from Ollama API: {data['error']}")
+        return self.extract_text(data), bool(data.get('done')), self.usage(data)
+
+    def parse_models(self, data: Dict[str, Any]) -> Set[str]:
+        return {model["name"] for model in data.get("models", [])}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "models": sorted(self.models or self.available_models or []),
+            "circuit": self.breaker.get_stats()
+        }
+
+class OpenAIBackend(Backend):
+    """OpenAI-compatible chat completions server (OpenAI, vLLM, llama.cpp server, ...)."""
+
+    kind = "openai"
+    health_path = "/v1/models"
+
+    def prepare(self, path: str, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        if path == "/api/chat":
+            messages = payload["messages"]
+        else:
+            messages = [{"role": "user", "content": payload["prompt"]}]
+        body = {"model": payload["model"], "messages": messages, "stream": payload.get("stream", False)}
+        if body["stream"]:
+            # Token counts only arrive in a final chunk, and only when asked for
+            body["stream_options"] = {"include_usage": True}
+        options = payload.get("options") or {}
+        if "num_predict" in options:
+            body["max_tokens"] = options["num_predict"]
+        for key in ("temperature", "top_p", "seed", "stop"):
+            if key in options:
+                body[key] = options[key]
+        output_format = payload.get("format")
+        if output_format == "json":
+            body["response_format"] = {"type": "json_object"}
+        elif isinstance(output_format, dict):
+            body["response_format"] = {"type": "json_schema", "json_schema": {"name": "response", "schema": output_format}}
+        return f"{self.url}/v1/chat/completions", body
+
+    def extract_text(self, data: Dict[str, Any]) -> Optional[str]:
+        choices = data.get("choices")
+        if not choices:
+            return None
+        return (choices[0].get("message") or {}).get("content", "")
+
+    def usage(self, data: Dict[str, Any]) -> Optional[Tuple[Optional[int], Optional[int], Optional[float]]]:
+        usage = data.get("usage")
+        if not usage:
+            return None
+        return usage.get("prompt_tokens"), usage.get("completion_tokens"), None
+
+    def parse_stream_line(self, line: bytes) -> Tuple[Optional[str], bool, Optional[tuple]]:
+        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"; the usage chunk
+        # follows the one carrying finish_reason, so the stream only counts as done at [DONE]
+        line = line.decode() if isinstance(line, bytes) else line
+        if not line.startswith("data:"):
+            return None, False, None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None, True, None
+        data = json.loads(data)
+        choices = data.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content"), False, self.usage(data)
+
+    def parse_models(self, data: Dict[str, Any]) -> Set[str]:
+        return {model["id"] for model in data.get("data", [])}
+
+BACKEND_KINDS = {"ollama": Backend, "openai": OpenAIBackend}
+
+class BackendPool:
+    """Spreads LLM requests over several inference servers.
+
+    Requests go to the available backend serving the model with the fewest requests outstanding
+    (ties rotate). Requests carrying a session key stick to the backend that served the session
+    before, so its KV cache for the conversation prefix is reused, unless that backend has become
+    unavailable. Health checks mark backends up or down and refresh the models they serve.
+    """
+
+    def __init__(self, backends: List[Backend], max_sticky_sessions: int = 1024):
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        self.backends = backends
+        self._rotation = itertools.count()
+        # Least recently used session pins are dropped past the cap
+        self._sticky: "OrderedDict[str, Backend]" = OrderedDict()
+        self.max_sticky_sessions = max_sticky_sessions
+
+    @classmethod
+    def from_config(cls, config: List[Dict[str, Any]], failure_threshold: int = 5, reset_timeout: float = 30.0) -> "BackendPool":
+        backends = []
+        for entry in config:
+            backend_cls = BACKEND_KINDS[entry.get("kind", "ollama")]
+            api_key_env = entry.get("api_key_env")
+            backends.append(backend_cls(
+                entry["url"],
+                models=entry.get("models"),
+                api_key=os.getenv(api_key_env) if api_key_env else None,
+                name=entry.get("name"),
+                failure_threshold=failure_threshold,
+                reset_timeout=reset_timeout
+            ))
+        return cls(backends)
+
+    @classmethod
+    def from_environment(cls, default_url: str, extra_urls: Iterable[str] = (), config_file: str = None,
+                         failure_threshold: int = 5, reset_timeout: float = 30.0) -> "BackendPool":
+        """Build the pool from `llm.backends` in config.yaml, else OLLAMA_BACKENDS, else `default_url` alone."""
+        config_file = config_file or os.getenv("LLM_ROUTING_CONFIG", "config.yaml")
+        config = []
+        if os.path.exists(config_file):
+            config = list((ConfigManager(config_file).get("llm", {}) or {}).get("backends") or [])
+        if not config:
+            urls = [url.strip() for url in os.getenv("OLLAMA_BACKENDS", "").split(",") if url.strip()] or [default_url]
+            config = [{"url": url} for url in urls]
+        known = {entry["url"].rstrip("/") for entry in config}
+        config += [{"url": url} for url in extra_urls if url and url.rstrip("/") not in known]
+        return cls.from_config(config, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def get(self, url: str) -> Backend:
+        for backend in self.backends:
+            if backend.url == url.rstrip("/"):
+                return backend
+        raise KeyError(url)
+
+    def select(self, model: str, session_key: str = None, exclude: Iterable[Backend] = ()) -> Backend:
+        excluded = set(id(backend) for backend in exclude)
+        candidates = [b for b in self.backends if id(b) not in excluded and b.serves(model) and b.is_available()]
+        if not candidates:
+            raise NoBackendAvailableError(f"No available backend serves model {model}")
+        if session_key is not None:
+            sticky = self._sticky.get(session_key)
+            if sticky is not None and sticky in candidates:
+                self._sticky.move_to_end(session_key)
+                return sticky
+        fewest = min(backend.outstanding for backend in candidates)
+        least_loaded = [backend for backend in candidates if backend.outstanding == fewest]
+        backend = least_loaded[next(self._rotation) % len(least_loaded)]
+        if session_key is not None:
+            self._sticky[session_key] = backend
+            self._sticky.move_to_end(session_key)
+            while len(self._sticky) > self.max_sticky_sessions:
+                self._sticky.popitem(last=False)
+        return backend
+
+    def release_session(self, session_key: str):
+        self._sticky.pop(session_key, None)
+
+    @contextlib.contextmanager
+    def track(self, backend: Backend):
+        backend.outstanding += 1
+        backend.requests += 1
+        try:
+            yield backend
+        finally:
+            backend.outstanding -= 1
+
+    async def check_health(self, session, timeout: float = 5.0):
+        """Probe every backend's model listing, updating its health and served models."""
+        await asyncio.gather(*(self._check_backend(session, backend, timeout) for backend in self.backends))
+
+    async def _check_backend(self, session, backend: Backend, timeout: float):
+        try:
+            async with session.get(f"{backend.url}{backend.health_path}", headers=backend.headers,
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status != 200:
+                    raise Exception(f"health check returned {response.status}")
+                backend.available_models = backend.parse_models(await response.json())
+            if not backend.healthy:
+                logger.info(f"LLM backend {backend.name} is healthy again")
+            backend.healthy = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if backend.healthy:
+                logger.warning(f"LLM backend {backend.name} failed its health check: {e}")
+            backend.healthy = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {backend.name: backend.get_stats() for backend in self.backends},
+            "sticky_sessions": len(self._sticky)
+        }
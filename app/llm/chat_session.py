@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+from app.llm.json_stream import extract_json
+from app.llm.structured_output import StructuredOutputError, validation_errors
+
+logger = logging.getLogger(__name__)
+
+class ChatSession:
+    """Multi-turn conversation with Ollama's /api/chat that keeps the prompt prefix stable.
+
+    The system prompt is sent byte-identical on every turn and earlier turns are replayed in order,
+    so each request extends the previous one and Ollama can reuse the KV cache for the shared prefix
+    instead of re-prefilling it. Create sessions with ChatGPT.chat_session().
+    """
+
+    def __init__(self, llm, system_prompt: str, call_site: str = None, max_turns: int = 20):
+        self.llm = llm
+        self.session_id = str(uuid.uuid4())
+        self.system_prompt = system_prompt
+        self.call_site = call_site
+        self.max_turns = max_turns
+        self.history: List[Dict[str, str]] = []
+        self._lock = asyncio.Lock()
+
+    def build_messages(self, user_prompt: str) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": self.system_prompt}] + self.history + [{"role": "user", "content": user_prompt}]
+
+    async def send(self, user_prompt: str, remember: bool = True, call_site: str = None, format: Any = None) -> str:
+        """Send one user turn and return the assistant reply; `remember=False` leaves the history untouched."""
+        # Turns are serialized so the history (and therefore the cached prefix) stays in a consistent order
+        async with self._lock:
+            messages = self.build_messages(user_prompt)
+            # The session id pins the conversation to one backend, where its prefix is already cached
+            reply = await self.llm.chat_messages(messages, call_site=call_site or self.call_site, session_key=self.session_id,
+                                                 format=format)
+            if remember:
+                self.history.append({"role": "user", "content": user_prompt})
+                self.history.append({"role": "assistant", "content": reply})
+                self._trim_history()
+            return reply
+
+    async def send_structured(self, user_prompt: str, schema: Dict[str, Any], remember: bool = True, call_site: str = None,
+                              max_repairs: int = 1) -> Any:
+        """Send one user turn constrained to the JSON `schema` and return the validated reply.
+
+        Invalid replies get repair turns, which are not remembered; StructuredOutputError is raised
+        once `max_repairs` are used up, as with ChatGPT.generate_structured.
+        """
+        call_site = call_site or self.call_site
+        format = schema if self.llm.schema_format else "json"
+        reply = await self.send(user_prompt, remember=remember, call_site=call_site, format=format)
+        repairs = 0
+        while True:
+            try:
+                data = extract_json(reply)
+                errors = validation_errors(schema, data)
+            except ValueError as e:
+                errors = [f"Response is not valid JSON: {e}"]
+            if not errors:
+                self.llm.structured_stats.record(call_site, repairs, success=True)
+                return data
+            logger.error(f"Invalid JSON reply in chat session {self.session_id}: {errors}")
+            if repairs >= max_repairs:
+                self.llm.structured_stats.record(call_site, repairs, success=False)
+                raise StructuredOutputError(f"Failed to get a valid JSON response after {repairs} repair attempts: {errors}")
+            repairs += 1
+            feedback_prompt = f"""
+            The previous response was not in valid JSON format or did not match the required schema. Please correct it.
+            Original prompt: {user_prompt}
+            Previous response: {reply}
+            Problems: {"; ".join(errors)}
+            Provide a valid JSON response matching this JSON schema:
+            {json.dumps(schema, indent=2)}
+            """
+            reply = await self.send(feedback_prompt, remember=False, call_site=call_site, format=format)
+
+    def _trim_history(self):
+        # Dropping whole turns from the front invalidates the cached prefix, so only do it past the cap
+        overflow = len(self.history) - self.max_turns * 2
+        if overflow > 0:
+            del self.history[:overflow]
+            logger.debug(f"Trimmed {overflow} messages from chat session {self.session_id}")
+
+    def reset(self):
+        self.history.clear()
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "system_prompt": self.system_prompt, "history": list(self.history)}
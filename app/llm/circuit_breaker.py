@@ -0,0 +1,97 @@
+import logging
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+class LLMUnavailableError(Exception):
+    """Base for failures that retrying immediately cannot fix; outer retry loops should give up on these."""
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised instead of sending a request while a backend's circuit is open."""
+
+class DeadlineExceededError(LLMUnavailableError):
+    """Raised when an LLM call (including its retries) runs past its deadline."""
+
+class LLMRequestError(Exception):
+    """Raised when the server rejects a request (a 4xx status); sending it again would fail the same way."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+class CircuitBreaker:
+    """Stops sending requests to a backend that keeps failing, then probes it before trusting it again.
+
+    Closed: requests flow and consecutive failures are counted. After `failure_threshold` of them the
+    circuit opens and requests fail fast with CircuitOpenError for `reset_timeout` seconds. Then it is
+    half-open: up to `half_open_max_calls` probe requests are let through; a success closes the
+    circuit and a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str = "ollama", failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def can_admit(self) -> bool:
+        """Whether before_call would admit a request right now, without taking a probe slot."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and self._probes < self.half_open_max_calls)
+
+    def before_call(self):
+        """Admit a request or raise CircuitOpenError; every admitted request must report its outcome."""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probes >= self.half_open_max_calls):
+            self._rejected += 1
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        if state == self.HALF_OPEN:
+            self._probes += 1
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed after a successful probe")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probes = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._times_opened += 1
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} consecutive failures")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probes = 0
+
+    def release_probe(self):
+        """Give back a half-open probe slot when the request ended without an outcome (e.g. cancelled)."""
+        if self._state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "rejected": self._rejected,
+            "times_opened": self._times_opened
+        }
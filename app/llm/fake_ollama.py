@@ -0,0 +1,226 @@
+"""Deterministic stand-in for an Ollama server, for load tests, profiling and tests without a GPU.
+
+Speaks /api/generate, /api/chat (streaming and not), /api/tags and /api/version. Responses are
+canned per prompt family: requests carrying a JSON schema as `format` get an instance that
+validates against it, and the rest are matched against regex rules. Latency before the first
+token, the token rate and a failure rate are configurable, and every random choice is seeded
+from the request itself so runs are reproducible even under concurrency.
+
+    python -m app.llm.fake_ollama --port 11435 --latency 0.2 --jitter 0.1 --tokens-per-second 50
+
+Then point the client at it with OLLAMA_BASE_URL=http://localhost:11435.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# (pattern, response) pairs tried in order against the prompt; the first match wins
+DEFAULT_RULES: List[Tuple[str, str]] = [
+    (r"(single word|one word)", "researcher"),
+    (r"number between 0 and 1", "0.5"),
+    (r"JSON array of strings", '["analysis", "coding"]'),
+    (r"plan as a JSON array|optimized plan as a JSON array",
+     '[{"description": "Draft a response", "tool": "respond", "dependencies": []}]'),
+    (r"break down the following task",
+     '{"id": "1", "action": "create_file", "parameters": {"file_name": "example.txt", "content": "Hello, World!"}, '
+     '"estimated_complexity": 0.2, "dependencies": [], "required_skills": ["file_manipulation"]}'),
+    (r"JSON", "{}"),
+]
+
+DEFAULT_RESPONSE = "This is a deterministic response from the fake Ollama server."
+
+def instance_for_schema(schema: Dict[str, Any]) -> Any:
+    """Build a small value that validates against a (draft 7 subset) JSON schema."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    for combinator in ("anyOf", "oneOf"):
+        if combinator in schema:
+            return instance_for_schema(schema[combinator][0])
+    schema_type = schema.get("type", "object")
+    if isinstance(schema_type, list):
+        schema_type = schema_type[0]
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        required = schema.get("required", list(properties))
+        return {name: instance_for_schema(properties.get(name, {})) for name in required}
+    if schema_type == "array":
+        count = max(1, schema.get("minItems", 1))
+        return [instance_for_schema(schema.get("items", {})) for _ in range(count)]
+    if schema_type == "string":
+        return "x" * schema.get("minLength", 0) or "example"
+    if schema_type in ("number", "integer"):
+        minimum = schema.get("minimum", 0)
+        maximum = schema.get("maximum", minimum + 1)
+        value = (minimum + maximum) / 2
+        return int(math.ceil(value)) if schema_type == "integer" else value
+    if schema_type == "boolean":
+        return True
+    return None
+
+class FakeOllamaServer:
+    """aiohttp application imitating Ollama; see the module docstring."""
+
+    def __init__(self, models: List[str] = None, rules: List[Tuple[str, str]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, distribution: str = "uniform", tokens_per_second: float = None,
+                 failure_rate: float = 0.0, failure_status: int = 503, seed: int = 0):
+        self.models = models or ["hermes3:latest", "qwen2.5:0.5b", "llama3.1:latest"]
+        self.rules = [(re.compile(pattern, re.IGNORECASE), response) for pattern, response in (rules or DEFAULT_RULES)]
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.seed = seed
+        # Repeats of the same prompt get their own seed, so a retry is not doomed to fail like the first try
+        self._attempts = defaultdict(int)
+        self.stats = {"requests": 0, "failures": 0, "streamed": 0, "tokens": 0}
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/api/generate", self.handle_generate),
+            web.post("/api/chat", self.handle_chat),
+            web.get("/api/tags", self.handle_tags),
+            web.get("/api/version", self.handle_version),
+            web.get("/fake/stats", self.handle_stats),
+        ])
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the current event loop and return the base URL (port 0 picks a free port)."""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode()).hexdigest()
+        self._attempts[digest] += 1
+        return random.Random(f"{digest}:{self._attempts[digest]}")
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        if self.distribution == "lognormal" and self.latency > 0:
+            # `jitter` is the sigma of the underlying normal; `latency` the median
+            return rng.lognormvariate(math.log(self.latency), self.jitter)
+        if self.distribution == "exponential" and self.latency > 0:
+            return rng.expovariate(1.0 / self.latency)
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def respond(self, prompt: str, output_format: Any = None) -> str:
+        if isinstance(output_format, dict):
+            return json.dumps(instance_for_schema(output_format))
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response
+        return "{}" if output_format == "json" else DEFAULT_RESPONSE
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", text) or [""]
+
+    async def _handle(self, request: web.Request, body: Dict[str, Any], prompt: str, shape) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        rng = self._rng(prompt)
+        if rng.random() < self.failure_rate:
+            self.stats["failures"] += 1
+            return web.json_response({"error": "injected failure"}, status=self.failure_status)
+
+        started = time.monotonic()
+        await asyncio.sleep(self._sample_latency(rng))
+        text = self.respond(prompt, body.get("format"))
+        tokens = self._tokens(text)
+        prompt_tokens = len(self._tokens(prompt))
+        self.stats["tokens"] += len(tokens)
+        model = body.get("model", self.models[0])
+
+        if not body.get("stream", True):
+            if self.tokens_per_second:
+                await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response(dict(shape(model, text, True), **self._timings(started, prompt_tokens, len(tokens))))
+
+        self.stats["streamed"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for token in tokens:
+            if self.tokens_per_second:
+                await asyncio.sleep(1.0 / self.tokens_per_second)
+            await response.write(json.dumps(shape(model, token, False)).encode() + b"\n")
+        final = dict(shape(model, "", True), **self._timings(started, prompt_tokens, len(tokens)))
+        await response.write(json.dumps(final).encode() + b"\n")
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _timings(started: float, prompt_eval_count: int, eval_count: int) -> Dict[str, Any]:
+        return {"total_duration": int((time.monotonic() - started) * 1e9), "prompt_eval_count": prompt_eval_count, "eval_count": eval_count}
+
+    async def handle_generate(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        return await self._handle(request, body, body.get("prompt", ""), lambda model, text, done: {
+            "model": model, "response": text, "done": done
+        })
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get("messages") or [{}]
+        return await self._handle(request, body, messages[-1].get("content", ""), lambda model, text, done: {
+            "model": model, "message": {"role": "assistant", "content": text}, "done": done
+        })
+
+    async def handle_tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": name} for name in self.models]})
+
+    async def handle_version(self, request: web.Request) -> web.Response:
+        return web.json_response({"version": "0.0.0-fake"})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token (median for lognormal)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- spread, or lognormal sigma")
+    parser.add_argument("--distribution", choices=["uniform", "lognormal", "exponential"], default="uniform")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rules", help="JSON file with a list of [pattern, response] pairs tried before the defaults")
+    args = parser.parse_args()
+
+    rules = DEFAULT_RULES
+    if args.rules:
+        with open(args.rules) as f:
+            rules = [tuple(rule) for rule in json.load(f)] + DEFAULT_RULES
+    server = FakeOllamaServer(
+        rules=rules, latency=args.latency, jitter=args.jitter, distribution=args.distribution,
+        tokens_per_second=args.tokens_per_second, failure_rate=args.failure_rate,
+        failure_status=args.failure_status, seed=args.seed
+    )
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(server.app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+class LatencyWindow:
+    """Sliding window of recent request latencies used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percentile: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(percentile / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+class Hedger:
+    """Sends a duplicate request to a second backend when the first one is slower than usual.
+
+    The hedge fires once the primary has been outstanding longer than the `percentile` latency of
+    recent requests (`default_delay` until `min_samples` are recorded). Whichever copy succeeds first
+    wins and the other is cancelled; if one fails the other is still awaited.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, default_delay: float = 10.0, window: int = 200):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.latencies = LatencyWindow(window)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def delay(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay
+        return self.latencies.percentile(self.percentile)
+
+    async def run(self, primary: Callable[[], Awaitable[Any]], secondary: Callable[[], Awaitable[Any]]) -> Any:
+        tasks = [asyncio.ensure_future(primary())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done:
+                return tasks[0].result()
+
+            self.hedges_sent += 1
+            hedge_task = asyncio.ensure_future(secondary())
+            tasks.append(hedge_task)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancelling the loser closes its HTTP response, which stops the duplicate generation
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "delay": self.delay(),
+            "samples": len(self.latencies),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won
+        }
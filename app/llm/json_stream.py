@@ -0,0 +1,72 @@
+import json
+from typing import Any, Optional
+
+class JSONStreamScanner:
+    """Finds the first complete top-level JSON object or array in text that arrives in chunks.
+
+    Feed completion chunks as they stream in; `feed` returns True as soon as the opening bracket's
+    match has been seen and the enclosed text parses, so the caller can stop generation there
+    instead of waiting for any prose the model adds afterwards. Brackets inside strings are
+    ignored, and a bracketed span that turns out not to be JSON is skipped.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.done = False
+        self.text: Optional[str] = None
+        self.value: Any = None
+
+    def feed(self, chunk: str) -> bool:
+        if self.done:
+            return True
+        self._text += chunk
+        while self._pos < len(self._text):
+            char = self._text[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if char in "{[":
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0 and self._complete():
+                    return True
+        return False
+
+    def _complete(self) -> bool:
+        candidate = self._text[self._start:self._pos]
+        try:
+            self.value = json.loads(candidate)
+        except json.JSONDecodeError:
+            # Brackets in prose rather than JSON; resume scanning just after the false start
+            self._pos = self._start + 1
+            self._start = None
+            return False
+        self.text = candidate
+        self.done = True
+        return True
+
+def extract_json(text: str) -> Any:
+    """Return the first complete JSON object or array embedded in `text`."""
+    scanner = JSONStreamScanner()
+    if not scanner.feed(text):
+        raise ValueError("No JSON object found in the response")
+    return scanner.value
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """Persistent LLM response cache stored in a single SQLite file.
+
+    Entries are keyed by a hash of model, system prompt, prompt and generation options. Entries expire
+    after `ttl_seconds` (if set) and the least recently used entries are evicted once the cache holds
+    more than `max_entries`. The file survives restarts, so replays and restarted workers reuse the
+    answers to deterministic prompts instead of paying for them again.
+    """
+
+    def __init__(self, path: str = "llm_cache.sqlite3", ttl_seconds: Optional[float] = None, max_entries: int = 10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.call_site_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Lookups run in the default executor, so the connection is shared between threads behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_accessed ON llm_responses (last_accessed)")
+        self._conn.commit()
+        self._entries = self._count()
+        logger.info(f"Opened LLM response cache at {path} with {self._entries} entries")
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        material = json.dumps({
+            "model": model,
+            "system": system_prompt,
+            "prompt": prompt,
+            "options": options or {}
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str, call_site: str = None) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._entries -= 1
+                row = None
+            if row is None:
+                self._record(False, call_site)
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._record(True, call_site)
+            return row[0]
+
+    def put(self, key: str, response: str, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, created_at, last_accessed, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, now, now, expires_at)
+            )
+            self._conn.commit()
+            # Overcounts replacements; _evict recounts before deleting anything
+            self._entries += 1
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM llm_responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        self._entries = self._count()
+        overflow = self._entries - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY last_accessed ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+            self._entries -= overflow
+            logger.debug(f"Evicted {overflow} least recently used LLM cache entries")
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def _record(self, hit: bool, call_site: Optional[str]):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if call_site:
+            self.call_site_stats[call_site]["hits" if hit else "misses"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+            self._entries = 0
+        logger.info("LLM response cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": self._entries,
+            "call_sites": {site: dict(stats) for site, stats in self.call_site_stats.items()}
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
@@ -0,0 +1,73 @@
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+from app.config.config_manager import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ModelRoute:
+    model: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+class ModelRouter:
+    """Maps LLM call sites and prompt classes to a model and generation options.
+
+    `profiles` name reusable (model, options) pairs. `routes` map a call site (`Class.method`, or
+    `Class.` for every method of a class) to a profile name. `prompt_rules` route by a regex on the
+    user prompt, for prompt classes that are not tied to one call site. Call-site routes win over
+    prompt rules; anything unmatched uses the default route.
+    """
+
+    def __init__(self, default_model: str = "hermes3", default_options: Dict[str, Any] = None,
+                 profiles: Dict[str, Dict[str, Any]] = None, routes: Dict[str, str] = None,
+                 prompt_rules: List[Dict[str, str]] = None):
+        self.default_route = ModelRoute(default_model, dict(default_options or {}))
+        self.profiles = {
+            name: ModelRoute(profile.get("model", default_model), dict(profile.get("options") or {}))
+            for name, profile in (profiles or {}).items()
+        }
+        self.routes = dict(routes or {})
+        self.prompt_rules = [(re.compile(rule["pattern"], re.IGNORECASE), rule["profile"]) for rule in (prompt_rules or [])]
+        for profile in list(self.routes.values()) + [profile for _, profile in self.prompt_rules]:
+            if profile not in self.profiles:
+                raise ValueError(f"LLM route refers to unknown profile: {profile}")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ModelRouter":
+        return cls(
+            default_model=config.get("default_model", "hermes3"),
+            default_options=config.get("default_options"),
+            profiles=config.get("profiles"),
+            routes=config.get("routes"),
+            prompt_rules=config.get("prompt_rules")
+        )
+
+    @classmethod
+    def from_config_file(cls, config_file: str = None) -> "ModelRouter":
+        config_file = config_file or os.getenv("LLM_ROUTING_CONFIG", "config.yaml")
+        if not os.path.exists(config_file):
+            logger.info(f"No LLM routing config at {config_file}, routing every call to the default model")
+            return cls()
+        config = ConfigManager(config_file).get("llm", {}) or {}
+        return cls.from_config(config)
+
+    def resolve(self, call_chain: Sequence[str], user_prompt: str = "") -> ModelRoute:
+        """Pick the route for a call; `call_chain` lists call sites innermost first."""
+        for call_site in call_chain:
+            profile = self._match_call_site(call_site)
+            if profile is not None:
+                return self.profiles[profile]
+        for pattern, profile in self.prompt_rules:
+            if pattern.search(user_prompt):
+                return self.profiles[profile]
+        return self.default_route
+
+    def _match_call_site(self, call_site: str) -> Optional[str]:
+        profile = self.routes.get(call_site)
+        if profile is not None:
+            return profile
+        class_name = call_site.split(".", 1)[0] + "."
+        return self.routes.get(class_name)
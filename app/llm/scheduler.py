@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    PLANNING = 1
+    BACKGROUND = 2
+
+class LoadShedError(Exception):
+    """Raised when a background LLM request is rejected because the queue is saturated."""
+
+class _Waiter:
+    __slots__ = ("future", "granted", "cancelled")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self):
+        # A waiter cancelled after being granted the slot passes it on itself
+        if not self.future.done():
+            self.future.set_result(None)
+
+class LLMScheduler:
+    """Bounds concurrent outbound LLM requests and admits queued requests in priority order.
+
+    At most `max_concurrency` requests run at once. Waiting requests are served interactive first,
+    then planning, then background, FIFO within a lane. Background requests are shed (LoadShedError)
+    instead of queued once `shed_queue_depth` requests are already waiting. One scheduler can be
+    shared by clients running on different event loops (see SyncChatGPT); a slot released on one
+    loop is handed to a waiter on another through that waiter's loop.
+    """
+
+    def __init__(self, max_concurrency: int = 4, shed_queue_depth: int = 32):
+        self.max_concurrency = max_concurrency
+        self.shed_queue_depth = shed_queue_depth
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: List[Tuple[int, int, "_Waiter"]] = []
+        self._sequence = itertools.count()
+        self._queued = {priority: 0 for priority in Priority}
+        self._admitted = {priority: 0 for priority in Priority}
+        self._shed = {priority: 0 for priority in Priority}
+        self._total_wait = {priority: 0.0 for priority in Priority}
+        self._max_wait = {priority: 0.0 for priority in Priority}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        waited = await self.acquire(priority)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Wait for a free slot and return the time spent queued, in seconds."""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                self._record_admission(priority, 0.0)
+                return 0.0
+
+            if priority == Priority.BACKGROUND and self.queue_depth() >= self.shed_queue_depth:
+                self._shed[priority] += 1
+                logger.warning(f"Shedding background LLM request, queue depth {self.queue_depth()}")
+                raise LoadShedError(f"LLM queue saturated ({self.queue_depth()} waiting)")
+
+            waiter = _Waiter(asyncio.get_running_loop().create_future())
+            heapq.heappush(self._waiters, (int(priority), next(self._sequence), waiter))
+            self._queued[priority] += 1
+        started = time.monotonic()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    waiter.cancelled = True
+                    self._queued[priority] -= 1
+            if granted:
+                # The slot was handed over just before cancellation; pass it on
+                self.release()
+            raise
+        waited = time.monotonic() - started
+        with self._lock:
+            self._record_admission(priority, waited)
+        return waited
+
+    def release(self):
+        # Hand the slot directly to the highest-priority live waiter so it cannot be stolen
+        with self._lock:
+            waiter = None
+            while self._waiters:
+                priority, _, candidate = heapq.heappop(self._waiters)
+                if candidate.cancelled:
+                    continue
+                candidate.granted = True
+                self._queued[Priority(priority)] -= 1
+                waiter = candidate
+                break
+            if waiter is None:
+                self._active -= 1
+                return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        loop = waiter.future.get_loop()
+        if loop is running:
+            waiter.wake()
+        else:
+            loop.call_soon_threadsafe(waiter.wake)
+
+    def _record_admission(self, priority: Priority, waited: float):
+        self._admitted[priority] += 1
+        self._total_wait[priority] += waited
+        self._max_wait[priority] = max(self._max_wait[priority], waited)
+
+    def queue_depth(self) -> int:
+        return sum(self._queued.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth(),
+            "lanes": {
+                priority.name.lower(): {
+                    "queued": self._queued[priority],
+                    "admitted": self._admitted[priority],
+                    "shed": self._shed[priority],
+                    "avg_wait": self._total_wait[priority] / self._admitted[priority] if self._admitted[priority] else 0.0,
+                    "max_wait": self._max_wait[priority]
+                }
+                for priority in Priority
+            }
+        }
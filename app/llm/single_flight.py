@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key so only one upstream request is in flight per key.
+
+    Every waiter receives the result (or exception) of the shared call. Waiters await the shared task
+    through asyncio.shield, so cancelling one waiter never cancels the call the others depend on.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Tasks are bound to their event loop, so calls are only shared within the same loop
+        call_key = (asyncio.get_running_loop(), key)
+        task = self._calls.get(call_key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[call_key] = task
+            task.add_done_callback(lambda t, k=call_key: self._forget(k, t))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalesced duplicate in-flight call ({self.coalesced} so far)")
+        return await asyncio.shield(task)
+
+    def _forget(self, call_key: Tuple[asyncio.AbstractEventLoop, Hashable], task: asyncio.Task):
+        if self._calls.get(call_key) is task:
+            del self._calls[call_key]
+        # Mark the exception as retrieved in case every waiter was cancelled before the call finished
+        if not task.cancelled():
+            task.exception()
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        """Whether a call to `do(key, ...)` made now would join an existing call instead of starting one."""
+        return (asyncio.get_running_loop(), key) in self._calls
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": self.in_flight()}
@@ -0,0 +1,71 @@
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Type
+import jsonschema
+
+logger = logging.getLogger(__name__)
+
+class StructuredOutputError(ValueError):
+    """Raised when the model's output still does not match the schema after every repair attempt."""
+
+_validators: Dict[str, jsonschema.Draft7Validator] = {}
+
+def get_validator(schema: Dict[str, Any]) -> jsonschema.Draft7Validator:
+    """Return a compiled validator for `schema`, building it once per distinct schema."""
+    key = json.dumps(schema, sort_keys=True)
+    validator = _validators.get(key)
+    if validator is None:
+        jsonschema.Draft7Validator.check_schema(schema)
+        validator = jsonschema.Draft7Validator(schema)
+        _validators[key] = validator
+    return validator
+
+def validation_errors(schema: Dict[str, Any], instance: Any) -> list:
+    return [error.message for error in get_validator(schema).iter_errors(instance)]
+
+def to_response_type(data: Any, response_type: Type = None) -> Any:
+    """Convert validated JSON into `response_type` (a pydantic model, dataclass or any callable)."""
+    if response_type is None:
+        return data
+    if hasattr(response_type, "parse_obj"):
+        return response_type.parse_obj(data)
+    if isinstance(data, dict):
+        return response_type(**data)
+    return response_type(data)
+
+class StructuredOutputStats:
+    """Counts how often structured calls validate first time and how many repair round-trips they need."""
+
+    def __init__(self):
+        self.requests = 0
+        self.first_try_valid = 0
+        self.repair_attempts = 0
+        self.repaired = 0
+        self.failures = 0
+        self.call_sites: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "repair_attempts": 0, "failures": 0})
+
+    def record(self, call_site: str, repair_attempts: int, success: bool):
+        self.requests += 1
+        self.repair_attempts += repair_attempts
+        if success and repair_attempts == 0:
+            self.first_try_valid += 1
+        elif success:
+            self.repaired += 1
+        else:
+            self.failures += 1
+        site = self.call_sites[call_site]
+        site["requests"] += 1
+        site["repair_attempts"] += repair_attempts
+        if not success:
+            site["failures"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "first_try_valid": self.first_try_valid,
+            "repair_attempts": self.repair_attempts,
+            "repaired": self.repaired,
+            "failures": self.failures,
+            "call_sites": {site: dict(stats) for site, stats in self.call_sites.items()}
+        }
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+class SyncChatGPT:
+    """Blocking facade over the async ChatGPT client for legacy synchronous callers.
+
+    The client lives on a private event loop running in a daemon thread; each call submits the
+    coroutine there and blocks the calling thread until it finishes, so the caller's own event loop
+    (if any) is never entered and aiohttp sessions stay bound to one loop. Not meant to be called
+    from async code: await the ChatGPT methods directly there.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any] = None, timeout: float = None):
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="sync-llm-client", daemon=True)
+        self._thread.start()
+        if client_factory is None:
+            from app.chat_with_ollama import ChatGPT
+            client_factory = ChatGPT
+        self.client = self._call(self._create_client(client_factory))
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @staticmethod
+    async def _create_client(client_factory: Callable[[], Any]) -> Any:
+        # Built on the facade's loop so anything the client binds to the running loop lands there
+        return client_factory()
+
+    def _call(self, coro) -> Any:
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("SyncChatGPT cannot be called from its own event loop thread")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(self.timeout)
+
+    def chat_with_ollama(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        return self._call(self.client.chat_with_ollama(system_prompt, user_prompt, **kwargs))
+
+    def chat_json(self, system_prompt: str, user_prompt: str, **kwargs) -> Any:
+        return self._call(self.client.chat_json(system_prompt, user_prompt, **kwargs))
+
+    def generate_structured(self, system_prompt: str, user_prompt: str, schema, **kwargs) -> Any:
+        return self._call(self.client.generate_structured(system_prompt, user_prompt, schema, **kwargs))
+
+    def generate(self, prompt: str) -> str:
+        return self._call(self.client.generate(prompt))
+
+    def generate_code(self, prompt: str) -> str:
+        return self._call(self.client.generate_code(prompt))
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        try:
+            self._call(self.client.close())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self) -> "SyncChatGPT":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
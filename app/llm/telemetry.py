@@ -0,0 +1,171 @@
+import bisect
+import contextlib
+import contextvars
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are reported as the upper bound of the bucket they fall in."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = percentile / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {("+Inf" if i == len(self.buckets) else str(bound)): count
+                        for i, (bound, count) in enumerate(zip(self.buckets + (None,), self.counts))}
+        }
+
+class CallRecord:
+    """Measurements for one logical LLM call; the transport fills them in as the call progresses."""
+
+    def __init__(self, call_site: str, model: str, prompt_chars: int):
+        self.call_site = call_site
+        self.model = model
+        self.prompt_chars = prompt_chars
+        self.started = time.monotonic()
+        self.queue_wait = 0.0
+        self.time_to_first_token: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.attempts = 0
+        self.cache: Optional[str] = None
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.monotonic() - self.started
+
+    def usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int], time_to_first_token: float = None):
+        if prompt_tokens is not None:
+            self.prompt_tokens = prompt_tokens
+        if completion_tokens is not None:
+            self.completion_tokens = completion_tokens
+        if time_to_first_token is not None and self.time_to_first_token is None:
+            self.time_to_first_token = time_to_first_token
+
+_current_call: contextvars.ContextVar[Optional[CallRecord]] = contextvars.ContextVar("llm_call_record", default=None)
+
+def current_call() -> Optional[CallRecord]:
+    """The record of the LLM call running in this context, if telemetry is tracking one."""
+    return _current_call.get()
+
+class CallSiteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.repairs = 0
+        self.cache = defaultdict(int)
+        self.histograms = {
+            "queue_wait": Histogram(LATENCY_BUCKETS),
+            "time_to_first_token": Histogram(LATENCY_BUCKETS),
+            "latency": Histogram(LATENCY_BUCKETS),
+            "prompt_tokens": Histogram(TOKEN_BUCKETS),
+            "completion_tokens": Histogram(TOKEN_BUCKETS),
+            "prompt_chars": Histogram(tuple(bucket * 4 for bucket in TOKEN_BUCKETS))
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "repairs": self.repairs,
+            "cache": dict(self.cache),
+            "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+        }
+
+class LLMTelemetry:
+    """Aggregates per-call LLM metrics by call site.
+
+    Each call records queue wait, time to first token, total latency, prompt and completion token
+    counts (from Ollama's prompt_eval_count/eval_count), retries and the cache outcome ("hit",
+    "miss", or "coalesced" for a caller that joined an identical in-flight request); structured
+    output repairs are counted per call site. One summary line per call is logged at INFO.
+    """
+
+    def __init__(self):
+        self.call_sites: Dict[str, CallSiteStats] = defaultdict(CallSiteStats)
+
+    @contextlib.contextmanager
+    def track(self, call_site: str, model: str, prompt_chars: int = 0):
+        record = CallRecord(call_site, model, prompt_chars)
+        token = _current_call.set(record)
+        failed = False
+        try:
+            yield record
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _current_call.reset(token)
+            self._finish(record, failed)
+
+    def _finish(self, record: CallRecord, failed: bool):
+        latency = time.monotonic() - record.started
+        stats = self.call_sites[record.call_site]
+        stats.calls += 1
+        stats.errors += failed
+        stats.retries += max(0, record.attempts - 1)
+        if record.cache is not None:
+            stats.cache[record.cache] += 1
+        histograms = stats.histograms
+        histograms["latency"].record(latency)
+        histograms["prompt_chars"].record(record.prompt_chars)
+        # Cache hits and coalesced followers sent no request of their own, so they add no queueing or token cost
+        if record.cache not in ("hit", "coalesced"):
+            histograms["queue_wait"].record(record.queue_wait)
+            for name in ("time_to_first_token", "prompt_tokens", "completion_tokens"):
+                value = getattr(record, name)
+                if value is not None:
+                    histograms[name].record(value)
+        logger.info(
+            f"LLM call {record.call_site} model={record.model} latency={latency:.3f}s "
+            f"queue_wait={record.queue_wait:.3f}s ttft={record.time_to_first_token} "
+            f"prompt_tokens={record.prompt_tokens} completion_tokens={record.completion_tokens} "
+            f"attempts={record.attempts} cache={record.cache} failed={failed}"
+        )
+
+    def record_repairs(self, call_site: str, repairs: int):
+        self.call_sites[call_site].repairs += repairs
+
+    def get_stats(self) -> Dict[str, Any]:
+        call_sites = {site: stats.snapshot() for site, stats in self.call_sites.items()}
+        # Call sites ordered by total time spent, the most expensive first
+        ordered = sorted(call_sites.items(), key=lambda item: item[1]["histograms"]["latency"]["sum"], reverse=True)
+        return {"call_sites": dict(ordered)}
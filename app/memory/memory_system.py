@@ -1,11 +1,14 @@
 from typing import Dict, Any, List
+import asyncio
 import logging
+from app.shared_state.store import StateStore, SharedDict, get_state_store
 
 logger = logging.getLogger(__name__)
 
 class MemorySystem:
-    def __init__(self):
-        self.memories = {}
+    def __init__(self, state_store: StateStore = None):
+        # With a shared state store, every worker process sees the same memories
+        self.memories = SharedDict(state_store or get_state_store(), "memories")
 
     def store(self, key: str, value: Any) -> None:
         self.memories[key] = value
@@ -36,7 +39,7 @@ class MemorySystem:
         return key in self.memories
 
     async def store(self, key: str, value: Any) -> None:
-        self.memories[key] = value
+        await asyncio.get_running_loop().run_in_executor(None, self.memories.__setitem__, key, value)
         logger.info(f"Stored memory with key: {key}")
 
     async def get_recent_executions(self) -> List[Dict[str, Any]]:
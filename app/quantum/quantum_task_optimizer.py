@@ -2,8 +2,6 @@ import numpy as np
 from typing import List, Dict, Any
 import logging
 import json
-from scipy.optimize import minimize
-from sklearn.cluster import KMeans
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +21,9 @@ class QuantumInspiredTaskOptimizer:
                 cost -= priority * (len(tasks) - i)  # Higher priority tasks should come first
             return cost
 
+        # Imported on first use; scipy adds noticeably to worker cold start
+        from scipy.optimize import minimize
+
         # Use simulated annealing to find the optimal order
         initial_order = list(range(len(tasks)))
         result = minimize(cost_function, initial_order, method='nelder-mead', options={'maxiter': 1000})
@@ -72,7 +73,8 @@ class QuantumInspiredTaskOptimizer:
     async def quantum_inspired_task_clustering(self, tasks: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
         embeddings = [await self.quantum_inspired_embedding(task) for task in tasks]
         
-        # Use K-means clustering
+        # Use K-means clustering (sklearn is imported on first use)
+        from sklearn.cluster import KMeans
         kmeans = KMeans(n_clusters=min(3, len(tasks)), random_state=42)
         cluster_labels = kmeans.fit_predict(embeddings)
         
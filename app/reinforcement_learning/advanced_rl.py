@@ -4,8 +4,8 @@ import torch.optim as optim
 import torch.nn.functional as F
 import numpy as np
 from typing import Tuple, List, Dict, Any  # Import Dict and Any
-from collections import deque
 import random
+from app.shared_state.store import StateStore, SharedLog, get_state_store
 
 class AdvancedPolicyNetwork(nn.Module):
     def __init__(self, input_dim: int, hidden_dim: int, output_dim: int):
@@ -23,13 +23,15 @@ class AdvancedPolicyNetwork(nn.Module):
         return action_probs, value
 
 class AdvancedRL(nn.Module):
-    def __init__(self, input_dim: int, hidden_dim: int, output_dim: int, learning_rate: float = 0.001, gamma: float = 0.99, tau: float = 0.005):
+    def __init__(self, input_dim: int, hidden_dim: int, output_dim: int, learning_rate: float = 0.001, gamma: float = 0.99, tau: float = 0.005,
+                 state_store: StateStore = None):
         super(AdvancedRL, self).__init__()
         self.policy_net = AdvancedPolicyNetwork(input_dim, hidden_dim, output_dim)
         self.target_net = AdvancedPolicyNetwork(input_dim, hidden_dim, output_dim)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=learning_rate)
-        self.memory = deque(maxlen=10000)
+        # Replay buffer; with a shared state store, experience from every worker process lands in it
+        self.memory = SharedLog(state_store or get_state_store(), "rl_replay", maxlen=10000)
         self.batch_size = 64
         self.gamma = gamma
         self.tau = tau
@@ -47,7 +49,7 @@ class AdvancedRL(nn.Module):
         if len(self.memory) < self.batch_size:
             return
 
-        batch = random.sample(self.memory, self.batch_size)
+        batch = self.memory.sample(self.batch_size)
         states, actions, rewards, next_states, dones = zip(*batch)
 
         states = torch.FloatTensor(states)
@@ -0,0 +1,182 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class CassetteMissError(KeyError):
+    """Raised in strict replay when a call has no recording."""
+
+class ReplayedError(Exception):
+    """Re-raised in replay for a call that failed while it was being recorded."""
+
+class Cassette:
+    """Records external calls (LLM requests, Neo4j queries) to a file and replays them later.
+
+    Each call is one JSON line holding its kind, a key hashed from the request, the request itself,
+    the response (or error) and the latency; `.gz` paths are gzip-compressed. In replay, calls are
+    matched by key, identical calls replaying in recorded order. A call with no exact match gets the
+    next unplayed recording of its kind, so traffic with per-run ids or timestamps in it still
+    replays; `strict=True` raises CassetteMissError instead. With `simulate_latency` each replayed
+    call takes as long as it originally did.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    _shared: Dict[tuple, "Cassette"] = {}
+
+    def __init__(self, path: str, mode: str = REPLAY, simulate_latency: bool = False, strict: bool = False):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._file = None
+        self._by_key: Dict[str, deque] = defaultdict(deque)
+        self._by_kind: Dict[str, deque] = defaultdict(deque)
+        self.stats = {"recorded": 0, "replayed": 0, "fallbacks": 0}
+        if mode == self.RECORD:
+            self._file = gzip.open(path, "at") if path.endswith(".gz") else open(path, "a")
+        else:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        """The process-wide cassette configured by CASSETTE_PATH and CASSETTE_MODE, if any.
+
+        LLM and Neo4j clients share one instance per path so their calls land in the same file.
+        """
+        path = os.getenv("CASSETTE_PATH")
+        if not path:
+            return None
+        mode = os.getenv("CASSETTE_MODE", cls.REPLAY)
+        key = (path, mode)
+        if key not in cls._shared:
+            cls._shared[key] = cls(
+                path,
+                mode=mode,
+                simulate_latency=os.getenv("CASSETTE_SIMULATE_LATENCY", "0").lower() in ("1", "true", "yes"),
+                strict=os.getenv("CASSETTE_STRICT", "0").lower() in ("1", "true", "yes")
+            )
+        return cls._shared[key]
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == self.REPLAY
+
+    @staticmethod
+    def make_key(kind: str, request: Dict[str, Any]) -> str:
+        canonical = json.dumps({"kind": kind, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["played"] = False
+                self._by_key[entry["key"]].append(entry)
+                self._by_kind[entry["kind"]].append(entry)
+        logger.info(f"Loaded {sum(len(entries) for entries in self._by_kind.values())} recorded calls from {self.path}")
+
+    def _write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.stats["recorded"] += 1
+
+    def _take(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.make_key(kind, request)
+        candidates = self._by_key.get(key)
+        entry = None
+        if candidates:
+            entry = next((candidate for candidate in candidates if not candidate["played"]), candidates[-1])
+        elif not self.strict:
+            entry = next((candidate for candidate in self._by_kind.get(kind, ()) if not candidate["played"]), None)
+            if entry is not None:
+                self.stats["fallbacks"] += 1
+        if entry is None:
+            raise CassetteMissError(f"No recorded {kind} call matches {key}")
+        entry["played"] = True
+        self.stats["replayed"] += 1
+        return entry
+
+    async def around(self, kind: str, request: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+        """Replay the call's recording, or run `call` and record it."""
+        if self.replaying:
+            entry = self._take(kind, request)
+            if self.simulate_latency:
+                await asyncio.sleep(entry["latency"])
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return entry["response"]
+
+        started = time.monotonic()
+        entry = {"kind": kind, "key": self.make_key(kind, request), "request": request}
+        try:
+            entry["response"] = await call()
+            return entry["response"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if "response" in entry or "error" in entry:
+                entry["latency"] = round(time.monotonic() - started, 6)
+                self._write(entry)
+
+    async def around_stream(self, kind: str, request: Dict[str, Any], stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Streaming version of `around`; chunk arrival times are recorded and replayed too."""
+        if self.replaying:
+            entry = self._take(kind, request)
+            elapsed = 0.0
+            for chunk, offset in zip(entry["response"], entry["offsets"]):
+                if self.simulate_latency:
+                    await asyncio.sleep(max(0.0, offset - elapsed))
+                    elapsed = offset
+                yield chunk
+            if "error" in entry:
+                raise ReplayedError(entry["error"])
+            return
+
+        started = time.monotonic()
+        chunks: List[str] = []
+        offsets: List[float] = []
+        entry = {"kind": kind, "key": self.make_key(kind, request), "request": request}
+        live = stream()
+        try:
+            async for chunk in live:
+                chunks.append(chunk)
+                offsets.append(round(time.monotonic() - started, 6))
+                yield chunk
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            await live.aclose()
+            # Streams the consumer closed early are recorded as far as they were read
+            entry.update(response=chunks, offsets=offsets, latency=round(time.monotonic() - started, 6))
+            self._write(entry)
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+                self._file = None
+        for key, cassette in list(self._shared.items()):
+            if cassette is self:
+                del self._shared[key]
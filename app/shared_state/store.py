@@ -0,0 +1,380 @@
+import logging
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+class StateStore(ABC):
+    """Namespaced state shared by the components of a worker process, or by several worker processes.
+
+    Two kinds of state are supported: key/value maps (caches, memories, embeddings, session state)
+    with least-recently-used eviction, and bounded append-only logs (the RL replay buffer). Leases
+    let one worker claim a periodic job for a while. Values are pickled by backends that cross
+    process boundaries.
+    """
+
+    # Key/value maps
+    @abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def set_many(self, namespace: str, items: Dict[str, Any]):
+        """Set several keys at once; backends that persist write them in one transaction."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def contains(self, namespace: str, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def keys(self, namespace: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def count(self, namespace: str) -> int:
+        pass
+
+    @abstractmethod
+    def clear(self, namespace: str):
+        pass
+
+    @abstractmethod
+    def touch(self, namespace: str, key: str):
+        """Mark a key as recently used, so `evict` drops it last."""
+
+    @abstractmethod
+    def evict(self, namespace: str, max_entries: int) -> int:
+        """Drop the least recently used keys beyond `max_entries`; returns how many were dropped."""
+
+    # Bounded logs
+    @abstractmethod
+    def append(self, namespace: str, value: Any, maxlen: int = None):
+        pass
+
+    @abstractmethod
+    def sample(self, namespace: str, n: int) -> List[Any]:
+        pass
+
+    @abstractmethod
+    def length(self, namespace: str) -> int:
+        pass
+
+    # Leases
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Claim `name` for `owner` for `ttl` seconds; succeeds if unclaimed, expired or already ours."""
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str):
+        pass
+
+    def close(self):
+        pass
+
+class InMemoryStateStore(StateStore):
+    """Process-local store; the default, and what every component used before state was shareable."""
+
+    def __init__(self):
+        self._maps: Dict[str, "OrderedDict[str, Any]"] = defaultdict(OrderedDict)
+        self._logs: Dict[str, deque] = {}
+        self._leases: Dict[str, tuple] = {}
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._maps[namespace].get(key, default)
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._maps[namespace][key] = value
+        self._maps[namespace].move_to_end(key)
+
+    def set_many(self, namespace: str, items: Dict[str, Any]):
+        for key, value in items.items():
+            self.set(namespace, key, value)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._maps[namespace].pop(key, _MISSING) is not _MISSING
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self._maps[namespace]
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self._maps[namespace])
+
+    def count(self, namespace: str) -> int:
+        return len(self._maps[namespace])
+
+    def clear(self, namespace: str):
+        self._maps[namespace].clear()
+        self._logs.pop(namespace, None)
+
+    def touch(self, namespace: str, key: str):
+        if key in self._maps[namespace]:
+            self._maps[namespace].move_to_end(key)
+
+    def evict(self, namespace: str, max_entries: int) -> int:
+        entries = self._maps[namespace]
+        evicted = 0
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def append(self, namespace: str, value: Any, maxlen: int = None):
+        if namespace not in self._logs:
+            self._logs[namespace] = deque(maxlen=maxlen)
+        self._logs[namespace].append(value)
+
+    def sample(self, namespace: str, n: int) -> List[Any]:
+        return random.sample(list(self._logs.get(namespace, ())), n)
+
+    def length(self, namespace: str) -> int:
+        return len(self._logs.get(namespace, ()))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        holder, expires_at = self._leases.get(name, (None, 0.0))
+        if holder not in (None, owner) and expires_at > time.time():
+            return False
+        self._leases[name] = (owner, time.time() + ttl)
+        return True
+
+    def release_lease(self, name: str, owner: str):
+        if self._leases.get(name, (None,))[0] == owner:
+            del self._leases[name]
+
+_MISSING = object()
+
+class SQLiteStateStore(StateStore):
+    """Store in a SQLite file in WAL mode, shared by every worker process on the host.
+
+    WAL lets readers proceed while one process writes; `busy_timeout` makes concurrent writers wait
+    for each other instead of failing. Each process opens its own connection.
+    """
+
+    def __init__(self, path: str = "shared_state.sqlite3", busy_timeout: float = 5.0):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_kv_last_used ON kv (namespace, last_used);
+            CREATE TABLE IF NOT EXISTS log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                value BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_log_namespace ON log (namespace, seq);
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        logger.info(f"Opened shared state store at {path}")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        rows = self._query("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        return pickle.loads(rows[0][0]) if rows else default
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._write(
+            "INSERT INTO kv (namespace, key, value, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+            (namespace, key, pickle.dumps(value), time.time())
+        )
+
+    def set_many(self, namespace: str, items: Dict[str, Any]):
+        now = time.time()
+        rows = [(namespace, key, pickle.dumps(value), now) for key, value in items.items()]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO kv (namespace, key, value, last_used) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, last_used = excluded.last_used",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._write("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)) > 0
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return bool(self._query("SELECT 1 FROM kv WHERE namespace = ? AND key = ?", (namespace, key)))
+
+    def keys(self, namespace: str) -> List[str]:
+        return [row[0] for row in self._query("SELECT key FROM kv WHERE namespace = ? ORDER BY last_used", (namespace,))]
+
+    def count(self, namespace: str) -> int:
+        return self._query("SELECT COUNT(*) FROM kv WHERE namespace = ?", (namespace,))[0][0]
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+            self._conn.execute("DELETE FROM log WHERE namespace = ?", (namespace,))
+
+    def touch(self, namespace: str, key: str):
+        self._write("UPDATE kv SET last_used = ? WHERE namespace = ? AND key = ?", (time.time(), namespace, key))
+
+    def evict(self, namespace: str, max_entries: int) -> int:
+        return self._write(
+            "DELETE FROM kv WHERE namespace = ? AND key IN ("
+            "SELECT key FROM kv WHERE namespace = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (namespace, namespace, max_entries)
+        )
+
+    def append(self, namespace: str, value: Any, maxlen: int = None):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT INTO log (namespace, value) VALUES (?, ?)", (namespace, pickle.dumps(value)))
+                if maxlen is not None:
+                    self._conn.execute(
+                        "DELETE FROM log WHERE namespace = ? AND seq <= ("
+                        "SELECT seq FROM log WHERE namespace = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                        (namespace, namespace, maxlen)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def sample(self, namespace: str, n: int) -> List[Any]:
+        with self._lock:
+            seqs = [row[0] for row in self._conn.execute("SELECT seq FROM log WHERE namespace = ?", (namespace,))]
+            chosen = random.sample(seqs, n)
+            placeholders = ",".join("?" * len(chosen))
+            rows = self._conn.execute(f"SELECT value FROM log WHERE seq IN ({placeholders})", chosen).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def length(self, namespace: str) -> int:
+        return self._query("SELECT COUNT(*) FROM log WHERE namespace = ?", (namespace,))[0][0]
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        return self._write(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, owner, now + ttl, now)
+        ) > 0
+
+    def release_lease(self, name: str, owner: str):
+        self._write("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        for key, store in list(_shared_stores.items()):
+            if store is self:
+                del _shared_stores[key]
+
+class SharedDict(MutableMapping):
+    """dict view of one namespace of a StateStore, so existing dict-based code keeps working."""
+
+    def __init__(self, store: StateStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.store.get(self.namespace, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.store.get(self.namespace, key, default)
+
+    def __setitem__(self, key: str, value: Any):
+        self.store.set(self.namespace, key, value)
+
+    def update(self, items=(), **kwargs):
+        # One set_many call instead of a write per key
+        self.store.set_many(self.namespace, dict(items, **kwargs))
+
+    def __delitem__(self, key: str):
+        if not self.store.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return self.store.contains(self.namespace, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return self.store.count(self.namespace)
+
+    def clear(self):
+        self.store.clear(self.namespace)
+
+class SharedLog:
+    """Bounded append-only log in a StateStore namespace, standing in for a `deque(maxlen=...)`."""
+
+    def __init__(self, store: StateStore, namespace: str, maxlen: int = None):
+        self.store = store
+        self.namespace = namespace
+        self.maxlen = maxlen
+
+    def append(self, value: Any):
+        self.store.append(self.namespace, value, self.maxlen)
+
+    def sample(self, n: int) -> List[Any]:
+        return self.store.sample(self.namespace, n)
+
+    def __len__(self) -> int:
+        return self.store.length(self.namespace)
+
+_shared_stores: Dict[tuple, StateStore] = {}
+
+def get_state_store() -> StateStore:
+    """The store selected by STATE_BACKEND (`memory`, the default, or `sqlite` at STATE_PATH).
+
+    SQLite stores are shared by every component of a process; with `memory` each caller gets its
+    own private store, matching the old per-object state.
+    """
+    backend = os.getenv("STATE_BACKEND", "memory").lower()
+    if backend == "memory":
+        return InMemoryStateStore()
+    if backend != "sqlite":
+        raise ValueError(f"Unknown STATE_BACKEND: {backend}")
+    # Connections must not cross a fork, so stores are kept per process
+    key = (os.getpid(), os.getenv("STATE_PATH", "shared_state.sqlite3"))
+    if key not in _shared_stores:
+        _shared_stores[key] = SQLiteStateStore(key[1])
+    return _shared_stores[key]
@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_memo: contextvars.ContextVar[Optional["BatchMemo"]] = contextvars.ContextVar("batch_memo", default=None)
+
+def normalize_content(content: Any) -> str:
+    """Case- and whitespace-insensitive form of a task's content, so near-identical tasks share lookups."""
+    text = content if isinstance(content, str) else json.dumps(content, sort_keys=True, default=str)
+    return " ".join(text.lower().split())
+
+class BatchMemo:
+    """Results of planning and knowledge lookups shared by the tasks of one batch.
+
+    Keys are (kind, key) pairs, normally built from normalized task content. The first task to ask
+    runs the lookup; tasks asking for the same key meanwhile or later get its result. Failed lookups
+    are forgotten so a later task can try again. Waiters await through asyncio.shield, as with
+    SingleFlight, so one task being cancelled does not cancel the lookup for the others.
+    """
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def get_or_run(self, kind: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        memo_key = (kind, key)
+        future = self._results.get(memo_key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._results[memo_key] = future
+            future.add_done_callback(lambda f, k=memo_key: self._forget_failure(k, f))
+            self.executed += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _forget_failure(self, memo_key: Tuple[str, Hashable], future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            if self._results.get(memo_key) is future:
+                del self._results[memo_key]
+
+    def close(self):
+        """Cancel lookups still running once nothing in the batch is waiting for them."""
+        for future in self._results.values():
+            if not future.done():
+                future.cancel()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"executed": self.executed, "shared": self.shared}
+
+def use_batch_memo(memo: BatchMemo):
+    """Make `memo` the batch memo of the running task (and of tasks it creates from now on)."""
+    _current_memo.set(memo)
+
+async def batch_memoized(kind: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """`await fn()`, shared with the other tasks of the current batch when there is one."""
+    memo = _current_memo.get()
+    if memo is None:
+        return await fn()
+    return await memo.get_or_run(kind, key, fn)
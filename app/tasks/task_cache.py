@@ -1,14 +1,15 @@
 import logging
-from typing import Dict, Any
-from collections import OrderedDict
+from typing import Any
 import hashlib
+from app.shared_state.store import StateStore, SharedDict, get_state_store
 
 logger = logging.getLogger(__name__)
 
 class NLPCache:
-    def __init__(self, max_size: int = 1000):
+    def __init__(self, max_size: int = 1000, state_store: StateStore = None):
         self.max_size = max_size
-        self.cache: OrderedDict[str, Any] = OrderedDict()
+        # With a shared state store, every worker process sees the same cache
+        self.cache = SharedDict(state_store or get_state_store(), "nlp_cache")
         logger.info(f"Initialized NLPCache with max size: {max_size}")
 
     def _hash_input(self, input_text: str) -> str:
@@ -17,10 +18,11 @@ class NLPCache:
     def get(self, input_text: str) -> Any:
         try:
             key = self._hash_input(input_text)
-            if key in self.cache:
-                self.cache.move_to_end(key)
+            value = self.cache.get(key)
+            if value is not None:
+                self.cache.store.touch(self.cache.namespace, key)
                 logger.debug(f"Cache hit for key: {key[:8]}...")
-                return self.cache[key]
+                return value
             logger.debug(f"Cache miss for key: {key[:8]}...")
             return None
         except Exception as e:
@@ -30,11 +32,8 @@ class NLPCache:
     def put(self, input_text: str, value: Any) -> None:
         try:
             key = self._hash_input(input_text)
-            if key in self.cache:
-                self.cache.move_to_end(key)
-            elif len(self.cache) >= self.max_size:
-                self.cache.popitem(last=False)
             self.cache[key] = value
+            self.cache.store.evict(self.cache.namespace, self.max_size)
             logger.debug(f"Added/updated key in cache: {key[:8]}...")
         except Exception as e:
             logger.error(f"Error in NLPCache.put: {str(e)}")
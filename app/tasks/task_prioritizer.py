@@ -1,5 +1,7 @@
-from typing import List, Dict, Any
-import networkx as nx
+from typing import List, Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 class TaskPrioritizer:
     def __init__(self):
@@ -13,6 +15,9 @@ class TaskPrioritizer:
         return task
 
     def prioritize_tasks(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Imported on first use; only dependency-aware prioritization needs it
+        import networkx as nx
+
         G = nx.DiGraph()
         
         for task in tasks:
@@ -35,7 +40,7 @@ class TaskPrioritizer:
         
         return sorted(prioritized_tasks, key=lambda x: x['priority'], reverse=True)
 
-    def _calculate_priority(self, task: Dict[str, Any], G: nx.DiGraph) -> float:
+    def _calculate_priority(self, task: Dict[str, Any], G: "nx.DiGraph") -> float:
         importance = task.get('importance', 1)
         urgency = task.get('urgency', 1)
         num_dependents = len(list(G.successors(task['id'])))
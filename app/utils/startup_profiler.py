@@ -0,0 +1,81 @@
+import contextlib
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """Wall-clock timings of the steps of application startup.
+
+    Steps awaited concurrently overlap, so their sum can exceed the total.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.timings: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.monotonic() - started
+
+    async def timed(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        with self.step(name):
+            return await awaitable
+
+    def total(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        steps = ", ".join(f"{name}={duration:.2f}s" for name, duration in self.timings.items())
+        return f"Startup took {self.total():.2f}s ({steps})"
+
+    def report(self) -> str:
+        lines = ["Initialization (wall clock):"]
+        for name, duration in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {duration * 1000:10.1f} ms  {name}")
+        lines.append(f"  {self.total() * 1000:10.1f} ms  total")
+        return "\n".join(lines)
+
+# Where main.py lives, so `import main` resolves however the process was started
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def profile_imports(module: str = "main", cwd: str = _PROJECT_ROOT) -> List[Tuple[str, float, float]]:
+    """Import `module` in a fresh interpreter under `-X importtime`, run from `cwd`.
+
+    Returns (module, self seconds, cumulative seconds) for every module imported, in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=cwd)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)) / 1e6, int(match.group(2)) / 1e6))
+    if result.returncode != 0:
+        logger.warning(f"Importing {module} failed: {result.stderr.strip().splitlines()[-1:]}")
+    return rows
+
+def import_report(rows: List[Tuple[str, float, float]], top: int = 25) -> str:
+    """Import time grouped by top-level package, then the slowest individual modules."""
+    by_package = defaultdict(float)
+    for name, self_time, _ in rows:
+        by_package[name.split(".")[0]] += self_time
+    lines = [f"Imports: {sum(by_package.values()) * 1000:.1f} ms across {len(rows)} modules", "By top-level package:"]
+    for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        lines.append(f"  {seconds * 1000:10.1f} ms  {package}")
+    lines.append("Slowest modules (cumulative, including their own imports):")
+    for name, _, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        lines.append(f"  {cumulative * 1000:10.1f} ms  {name}")
+    return "\n".join(lines)
@@ -10,19 +10,25 @@ from app.workspace.workspace_manager import WorkspaceManager
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.memory.memory_system import MemorySystem
 from app.quantum.quantum_task_optimizer import QuantumInspiredTaskOptimizer  # Updated import
-from app.reinforcement_learning.advanced_rl import AdvancedRL
 from app.entropy_management.advanced_entropy_manager import AdvancedEntropyManager
 from app.chat_with_ollama import ChatGPT
+from app.llm.scheduler import Priority
 from app.agents.skill_manager import SkillManager
 from app.agents.task_planner import TaskPlanner
-from app.learning.continual_learner import ContinualLearner
 from app.agents.quantum_nlp_agent import QuantumNLPAgent
+from app.execution.background_worker import BackgroundWorker
+from app.execution.job_scheduler import JobScheduler
+from app.api.tasks import router as tasks_router
+from app.shared_state.store import get_state_store
+from app.utils.startup_profiler import StartupProfiler, import_report, profile_imports
 import logging
 import json
 import asyncio
+import contextlib
 import os
+import sys
+import time
 from dotenv import load_dotenv  # Ensure you have this import
-from neo4j import GraphDatabase  # Ensure you import the Neo4j driver
 from app.utils.logger import logger  # New import
 
 # Load environment variables from .env file
@@ -31,8 +37,21 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def build_reinforcement_learning(state_store):
+    """Build the RL model and continual learner; torch is imported here, on first use, not with main."""
+    from app.reinforcement_learning.advanced_rl import AdvancedRL
+    from app.learning.continual_learner import ContinualLearner
+    
+    # Specify dimensions for AdvancedRL
+    input_dim = 10  # Set this to the appropriate input dimension
+    hidden_dim = 64  # Set this to the desired hidden layer size
+    output_dim = 5  # Set this to the number of possible actions or outputs
+    advanced_rl = AdvancedRL(input_dim, hidden_dim, output_dim, state_store=state_store)  # Provide the required arguments
+    return advanced_rl, ContinualLearner(advanced_rl.policy_net)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    profiler = app.state.startup_profile = StartupProfiler()
     try:
         # Startup
         logger.info("Initializing AGI components...", {"component": "startup"})
@@ -45,71 +64,98 @@ async def lifespan(app: FastAPI):
         # Log the values for debugging (optional)
         logger.info(f"Connecting to Neo4j with URI: {uri}, User: {user}", {"component": "startup"})
 
-        app.state.knowledge_graph = KnowledgeGraph(uri, user, password)  # Updated initialization
-        await app.state.knowledge_graph.connect()
-        
-        # Specify a base path for the VirtualEnvironment
-        base_path = os.getenv("VIRTUAL_ENV_BASE_PATH", "./virtual_env")  # Default to './virtual_env' if not set
-        app.state.virtual_env = VirtualEnvironment(base_path)  # Provide the base_path argument
-        
-        # Specify a base path for the WorkspaceManager
-        workspace_base_path = os.getenv("WORKSPACE_BASE_PATH", "./workspaces")  # Default to './workspaces' if not set
-        app.state.workspace_manager = WorkspaceManager(workspace_base_path)  # Provide the base_path argument
+        # Caches, memories, the replay buffer and embeddings live here; set STATE_BACKEND=sqlite to share
+        # them between `--workers` processes
+        app.state.state_store = get_state_store()
         
-        app.state.memory_system = MemorySystem()
-        app.state.quantum_optimizer = QuantumInspiredTaskOptimizer()  # Updated to new optimizer
-        
-        # Initialize LLM before AdvancedEntropyManager
-        app.state.llm = ChatGPT()
+        with profiler.step("construct_components"):
+            app.state.knowledge_graph = KnowledgeGraph(uri, user, password, state_store=app.state.state_store)  # Updated initialization
+            
+            # Specify a base path for the VirtualEnvironment
+            base_path = os.getenv("VIRTUAL_ENV_BASE_PATH", "./virtual_env")  # Default to './virtual_env' if not set
+            app.state.virtual_env = VirtualEnvironment(base_path)  # Provide the base_path argument
+            
+            # Specify a base path for the WorkspaceManager
+            workspace_base_path = os.getenv("WORKSPACE_BASE_PATH", "./workspaces")  # Default to './workspaces' if not set
+            app.state.workspace_manager = WorkspaceManager(workspace_base_path)  # Provide the base_path argument
+            
+            app.state.memory_system = MemorySystem(app.state.state_store)
+            app.state.quantum_optimizer = QuantumInspiredTaskOptimizer()  # Updated to new optimizer
+            
+            # Initialize LLM before AdvancedEntropyManager
+            app.state.llm = ChatGPT()
         
-        # Specify dimensions for AdvancedRL
-        input_dim = 10  # Set this to the appropriate input dimension
-        hidden_dim = 64  # Set this to the desired hidden layer size
-        output_dim = 5  # Set this to the number of possible actions or outputs
-        app.state.advanced_rl = AdvancedRL(input_dim, hidden_dim, output_dim)  # Provide the required arguments
+        # The Neo4j connection, the RL model build (torch import included, in a thread) and the LLM
+        # warm-up do not depend on each other, so they run at the same time
+        rl_components, _, _ = await asyncio.gather(
+            profiler.timed("rl_model_build", asyncio.to_thread(build_reinforcement_learning, app.state.state_store)),
+            profiler.timed("neo4j_connect", app.state.knowledge_graph.connect()),
+            profiler.timed("llm_warm_up", app.state.llm.warm_up())
+        )
+        app.state.advanced_rl, app.state.continual_learner = rl_components
+        app.state.knowledge_graph.start_write_behind()
+        app.state.llm_health_checks = asyncio.create_task(app.state.llm.run_health_checks())
         
-        app.state.entropy_manager = AdvancedEntropyManager(app.state.knowledge_graph, app.state.llm)
-        app.state.skill_manager = SkillManager()
+        with profiler.step("construct_agents"):
+            app.state.entropy_manager = AdvancedEntropyManager(app.state.knowledge_graph, app.state.llm)
+            app.state.skill_manager = SkillManager()
 
-        # Initialize QuantumNLPAgent
-        app.state.quantum_nlp = QuantumNLPAgent("quantum_nlp_id", "Quantum NLP Agent", app.state.skill_manager, app.state.llm)
+            # Initialize QuantumNLPAgent
+            app.state.quantum_nlp = QuantumNLPAgent("quantum_nlp_id", "Quantum NLP Agent", app.state.skill_manager, app.state.llm)
 
-        # Initialize TaskPlanner with QuantumNLPAgent
-        app.state.task_planner = TaskPlanner("task_planner_id", "Task Planner", app.state.skill_manager, app.state.llm, app.state.quantum_nlp)
-
-        app.state.continual_learner = ContinualLearner(app.state.advanced_rl.policy_net)
-        
-        # Initialize agent_factory before meta_agent
-        app.state.agent_factory = AgentFactory(
-            app.state.skill_manager,
-            app.state.llm,
-            app.state.knowledge_graph,
-            app.state.memory_system,
-            app.state.quantum_optimizer,
-            app.state.advanced_rl,
-            app.state.entropy_manager,
-            app.state.task_planner
-        )
+            # Initialize TaskPlanner with QuantumNLPAgent
+            app.state.task_planner = TaskPlanner("task_planner_id", "Task Planner", app.state.skill_manager, app.state.llm, app.state.quantum_nlp)
+            
+            # Initialize agent_factory before meta_agent
+            app.state.agent_factory = AgentFactory(
+                app.state.skill_manager,
+                app.state.llm,
+                app.state.knowledge_graph,
+                app.state.memory_system,
+                app.state.quantum_optimizer,
+                app.state.advanced_rl,
+                app.state.entropy_manager,
+                app.state.task_planner
+            )
+            
+            app.state.meta_agent = MetaAgent(
+                app.state.agent_factory,
+                app.state.virtual_env,
+                app.state.workspace_manager,
+                app.state.knowledge_graph,
+                app.state.memory_system,
+                app.state.quantum_optimizer,
+                app.state.advanced_rl,
+                app.state.entropy_manager,
+                app.state.llm
+            )
+            
+            app.state.collaboration_system = CollaborationSystem(
+                app.state.meta_agent,
+                app.state.knowledge_graph,
+                app.state.llm
+            )
         
-        app.state.meta_agent = MetaAgent(
-            app.state.agent_factory,
-            app.state.virtual_env,
-            app.state.workspace_manager,
-            app.state.knowledge_graph,
-            app.state.memory_system,
-            app.state.quantum_optimizer,
-            app.state.advanced_rl,
-            app.state.entropy_manager,
-            app.state.llm
+        # Post-response bookkeeping (learning, knowledge graph writes) runs off the request path
+        app.state.background = BackgroundWorker(
+            concurrency=int(os.getenv("BACKGROUND_WORKERS", "2")),
+            max_queue=int(os.getenv("BACKGROUND_QUEUE_SIZE", "100"))
         )
+        app.state.background.start()
         
-        app.state.collaboration_system = CollaborationSystem(
-            app.state.meta_agent,
-            app.state.knowledge_graph,
-            app.state.llm
+        # Periodic jobs; each runs at most once at a time and is cancelled if it overruns its budget
+        app.state.scheduler = JobScheduler(state_store=app.state.state_store)
+        app.state.scheduler.add_job(
+            "continuous_improvement",
+            lambda: continuous_improvement_cycle(app),
+            interval=float(os.getenv("IMPROVEMENT_INTERVAL_SECONDS", "3600")),
+            jitter=0.1,
+            timeout=float(os.getenv("IMPROVEMENT_TIMEOUT_SECONDS", "900"))
         )
+        app.state.scheduler.start()
         
         logger.info("AGI components initialized successfully", {"component": "startup"})
+        logger.info(profiler.summary(), {"component": "startup", "timings": profiler.timings})
         yield
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", {"component": "startup", "error": str(e)})
@@ -117,8 +163,23 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down AGI components...", {"component": "shutdown"})
+        if getattr(app.state, "scheduler", None):
+            await app.state.scheduler.stop()
+        if getattr(app.state, "background", None):
+            await app.state.background.stop()
+        health_checks = getattr(app.state, "llm_health_checks", None)
+        if health_checks:
+            health_checks.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await health_checks
+        if getattr(app.state, "llm", None):
+            await app.state.llm.close()
         if app.state.knowledge_graph:
+            # Flush buffered writes (including those from the background jobs above) before disconnecting
+            await app.state.knowledge_graph.stop_write_behind()
             await app.state.knowledge_graph.close()
+        if getattr(app.state, "state_store", None):
+            app.state.state_store.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -130,6 +191,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(tasks_router)
+
 @app.get("/")
 async def get():
     return HTMLResponse(content="""
@@ -165,24 +228,62 @@ async def get():
     </html>
     """)
 
+@app.get("/metrics/llm")
+async def llm_metrics():
+    """Per-call-site LLM latency, token and cache histograms, plus scheduler, cache and backend stats."""
+    return app.state.llm.get_stats()
+
+@app.get("/metrics/jobs")
+async def job_metrics():
+    """Last run, duration and failure counts of the scheduled background jobs."""
+    return app.state.scheduler.get_stats()
+
+@app.get("/metrics/knowledge_graph")
+async def knowledge_graph_metrics():
+    """Buffered, written, dropped and failed write-behind rows, and how long rows waited to be written."""
+    return app.state.knowledge_graph.write_behind.get_stats()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # Streaming mode (ws://host/ws?stream=1) forwards stage events and partial LLM output as they are produced
+    stream_mode = websocket.query_params.get("stream", "").lower() in ("1", "true", "yes")
     try:
         while True:
             data = await websocket.receive_text()
             logger.info(f"Received message: {data}", {"component": "websocket", "message": data})
             
             task = {"content": data}
-            
-            # Use quantum-inspired task optimization
-            optimized_task = await app.state.quantum_optimizer.optimize_task_order([task])
-            
-            # Use the CollaborationSystem to process the task
-            result = await app.state.collaboration_system.collaborate_on_task(optimized_task[0])
-            
-            # Generate a novel approach using the MetaLearningAgent
-            novel_approach = await app.state.meta_agent.generate_novel_approach(data)
+            timings = {}
+
+            async def send_event(event: str, **payload):
+                if stream_mode:
+                    await websocket.send_text(json.dumps({"event": event, **payload}))
+
+            async def run_stage(name: str, coro):
+                async def forward_chunk(chunk: str):
+                    await send_event("token", stage=name, data=chunk)
+
+                await send_event("stage", stage=name, status="started")
+                started = time.monotonic()
+                # Stages run as separate tasks, so each one tags its own streamed tokens
+                with app.state.llm.stream_to(forward_chunk) if stream_mode else contextlib.nullcontext():
+                    result = await coro
+                timings[name] = round(time.monotonic() - started, 3)
+                logger.info(f"Stage {name} took {timings[name]}s", {"component": "websocket", "stage": name, "duration": timings[name]})
+                await send_event("stage", stage=name, status="completed", duration=timings[name])
+                return result
+
+            async def standard_result():
+                # Use quantum-inspired task optimization, then the CollaborationSystem to process the task
+                optimized_task = await run_stage("optimize", app.state.quantum_optimizer.optimize_task_order([task]))
+                return await run_stage("collaboration", app.state.collaboration_system.collaborate_on_task(optimized_task[0]))
+
+            # The novel approach (from the MetaLearningAgent) does not depend on the standard result, so both run at once
+            result, novel_approach = await gather_stages(
+                standard_result(),
+                run_stage("novel_approach", app.state.meta_agent.generate_novel_approach(data))
+            )
             
             # Combine the standard result with the novel approach
             combined_result = {
@@ -190,46 +291,74 @@ async def websocket_endpoint(websocket: WebSocket):
                 "novel_approach": novel_approach
             }
             
-            await websocket.send_text(json.dumps(combined_result))
-            
-            # Perform continuous learning
-            await app.state.continual_learner.learn(task, combined_result)
+            if stream_mode:
+                await send_event("result", data=combined_result)
+            else:
+                await websocket.send_text(json.dumps(combined_result))
             
-            # Update the knowledge graph with the task and result
-            await app.state.knowledge_graph.add_task_result(data, json.dumps(combined_result))
+            logger.info(f"Pipeline stage timings: {timings}", {"component": "websocket", "timings": timings})
             
-            # Trigger the continuous improvement loop
-            asyncio.create_task(continuous_improvement_loop(app))
+            # Continuous learning and the knowledge graph update happen after the response; submitting
+            # waits while the background queue is full, which slows this connection down instead of
+            # letting bookkeeping pile up. The jobs run later, so they bind this message's values now:
+            # the next message on this connection rebinds the loop variables
+            await app.state.background.submit(
+                "continual_learning",
+                lambda task=task, result=combined_result: app.state.continual_learner.learn(task, result))
+            await app.state.background.submit(
+                "knowledge_graph_update",
+                lambda data=data, result=combined_result: app.state.knowledge_graph.add_task_result(data, json.dumps(result)))
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected", {"component": "websocket"})
     except Exception as e:
         logger.error(f"Error in WebSocket endpoint: {str(e)}", {"component": "websocket", "error": str(e)})
 
-async def continuous_improvement_loop(app):
-    while True:
-        try:
-            logger.info("Starting continuous improvement cycle", {"component": "improvement_loop"})
-            
-            performance_metrics = await app.state.knowledge_graph.get_system_performance()
-            
-            # Use the MetaLearningAgent to suggest improvements
-            improvement_suggestions = await app.state.meta_agent.suggest_improvements(json.dumps(performance_metrics))
-            
-            # Implement the suggested improvements
-            await app.state.meta_agent.implement_improvements(improvement_suggestions)
-            
-            # Adapt the system architecture if needed
-            adaptation_plan = await app.state.meta_agent.adapt_system_architecture(performance_metrics)
-            
-            # Learn from the improvements and adaptations
-            await app.state.continual_learner.learn_from_improvements(json.dumps(adaptation_plan))
-            
-            logger.info("Completed continuous improvement cycle", {"component": "improvement_loop"})
-        except Exception as e:
-            logger.error(f"Error in continuous improvement loop: {str(e)}", {"component": "improvement_loop", "error": str(e)})
-        finally:
-            await asyncio.sleep(3600)  # Run every hour
+async def gather_stages(*coros):
+    """Run independent stages concurrently; if one fails, the others are cancelled and the error propagates."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def continuous_improvement_cycle(app):
+    """One improvement pass; the lifespan's JobScheduler runs it periodically."""
+    logger.info("Starting continuous improvement cycle", {"component": "improvement_loop"})
+    
+    performance_metrics = await app.state.knowledge_graph.get_system_performance()
+    
+    # Improvement work yields to interactive traffic and is shed first under load
+    with app.state.llm.priority(Priority.BACKGROUND):
+        # Use the MetaLearningAgent to suggest improvements
+        improvement_suggestions = await app.state.meta_agent.suggest_improvements(json.dumps(performance_metrics))
+        
+        # Implement the suggested improvements
+        await app.state.meta_agent.implement_improvements(improvement_suggestions)
+        
+        # Adapt the system architecture if needed
+        adaptation_plan = await app.state.meta_agent.adapt_system_architecture(performance_metrics)
+        
+        # Learn from the improvements and adaptations
+        await app.state.continual_learner.learn_from_improvements(json.dumps(adaptation_plan))
+    
+    logger.info("Completed continuous improvement cycle", {"component": "improvement_loop"})
+
+async def profile_startup():
+    """Report import time per module and initialization time per component, then shut down again."""
+    print(import_report(profile_imports("main")))
+    try:
+        async with lifespan(app):
+            pass
+    finally:
+        print(app.state.startup_profile.report())
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        asyncio.run(profile_startup())
+        sys.exit(0)
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need an import string, and STATE_BACKEND=sqlite so they share one brain
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
\ No newline at end of file
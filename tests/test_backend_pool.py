@@ -0,0 +1,99 @@
+import json
+import pytest
+from app.llm.backend_pool import Backend, BackendPool, NoBackendAvailableError, OpenAIBackend
+
+def make_pool(*urls):
+    return BackendPool([Backend(url) for url in urls])
+
+def test_least_outstanding_backend_is_selected():
+    pool = make_pool("http://a", "http://b")
+    busy, idle = pool.backends
+    with pool.track(busy):
+        assert pool.select("hermes3") is idle
+
+def test_ties_rotate_between_backends():
+    pool = make_pool("http://a", "http://b")
+    assert {pool.select("hermes3").url for _ in range(4)} == {"http://a", "http://b"}
+
+def test_sessions_stick_to_their_backend():
+    pool = make_pool("http://a", "http://b")
+    first = pool.select("hermes3", session_key="s1")
+    with pool.track(first):
+        assert pool.select("hermes3", session_key="s1") is first
+
+def test_sticky_session_moves_when_backend_goes_down():
+    pool = make_pool("http://a", "http://b")
+    first = pool.select("hermes3", session_key="s1")
+    first.healthy = False
+    assert pool.select("hermes3", session_key="s1") is not first
+
+def test_only_backends_serving_the_model_are_used():
+    pool = BackendPool([Backend("http://a", models=["hermes3"]), Backend("http://b", models=["qwen2.5:0.5b"])])
+    assert pool.select("qwen2.5:0.5b").url == "http://b"
+    with pytest.raises(NoBackendAvailableError):
+        pool.select("llama3.1")
+
+def test_half_open_backend_with_its_probe_taken_is_skipped():
+    pool = make_pool("http://a", "http://b")
+    breaker = pool.backends[0].breaker
+    breaker.failure_threshold = 1
+    breaker.reset_timeout = 0
+    breaker.record_failure()
+    assert pool.backends[0].is_available()
+    breaker.before_call()  # the only probe is in flight
+    assert {pool.select("hermes3").url for _ in range(3)} == {"http://b"}
+
+def test_open_circuit_takes_backend_out_of_rotation():
+    pool = make_pool("http://a", "http://b")
+    pool.backends[0].breaker.failure_threshold = 1
+    pool.backends[0].breaker.record_failure()
+    assert {pool.select("hermes3").url for _ in range(3)} == {"http://b"}
+
+def test_openai_backend_translates_requests_and_responses():
+    backend = OpenAIBackend("https://api.example.com", api_key="key")
+    url, body = backend.prepare("/api/generate", {"model": "gpt", "prompt": "hi", "stream": True,
+                                                  "format": "json", "options": {"num_predict": 8}})
+    assert url == "https://api.example.com/v1/chat/completions"
+    assert body["messages"] == [{"role": "user", "content": "hi"}]
+    assert body["max_tokens"] == 8
+    assert body["response_format"] == {"type": "json_object"}
+    assert backend.headers == {"Authorization": "Bearer key"}
+    assert backend.extract_text({"choices": [{"message": {"content": "hello"}}]}) == "hello"
+    line = b"data: " + json.dumps({"choices": [{"delta": {"content": "he"}, "finish_reason": None}]}).encode()
+    assert backend.parse_stream_line(line) == ("he", False, None)
+    line = b"data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}}).encode()
+    assert backend.parse_stream_line(line) == (None, False, (12, 3, None))
+    assert backend.parse_stream_line(b"data: [DONE]") == (None, True, None)
+
+class FakeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def get(self, url, **kwargs):
+        return self.responses[url]
+
+@pytest.mark.asyncio
+async def test_health_check_updates_health_and_models():
+    pool = make_pool("http://a", "http://b")
+    session = FakeSession({
+        "http://a/api/tags": FakeResponse(200, {"models": [{"name": "hermes3:latest"}]}),
+        "http://b/api/tags": FakeResponse(503, {})
+    })
+    await pool.check_health(session)
+    up, down = pool.backends
+    assert up.healthy and up.serves("hermes3") and not up.serves("llama3.1")
+    assert not down.healthy
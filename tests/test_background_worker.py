@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from app.execution.background_worker import BackgroundWorker
+
+@pytest.mark.asyncio
+async def test_jobs_run_and_failures_are_contained():
+    worker = BackgroundWorker(concurrency=2, max_queue=10)
+    worker.start()
+    done = []
+
+    async def job(n):
+        await asyncio.sleep(0)
+        done.append(n)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    await worker.submit("one", lambda: job(1))
+    await worker.submit("fails", failing)
+    await worker.submit("two", lambda: job(2))
+    await worker.stop()
+    assert sorted(done) == [1, 2]
+    stats = worker.get_stats()
+    assert stats["completed"] == 2
+    assert stats["failed"] == 1
+    assert stats["queued"] == 0
+
+@pytest.mark.asyncio
+async def test_submit_blocks_when_queue_is_full():
+    worker = BackgroundWorker(concurrency=1, max_queue=1)
+    worker.start()
+    release = asyncio.Event()
+    await worker.submit("slow", release.wait)
+    await asyncio.sleep(0)  # the worker picks up the slow job
+    await worker.submit("queued", release.wait)
+
+    blocked = asyncio.ensure_future(worker.submit("blocked", release.wait))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert worker.get_stats()["blocked_submits"] == 1
+
+    release.set()
+    await asyncio.wait_for(blocked, 1)
+    await worker.stop()
+    assert worker.get_stats()["completed"] == 3
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from app.tasks.batch_memo import BatchMemo, batch_memoized, normalize_content, use_batch_memo
+
+@pytest.mark.asyncio
+async def test_overlapping_tasks_in_a_batch_share_lookups():
+    calls = []
+
+    async def lookup(content):
+        calls.append(content)
+        await asyncio.sleep(0.01)
+        return [content.strip()]
+
+    async def task(content):
+        return await batch_memoized("knowledge", normalize_content(content), lambda: lookup(content))
+
+    async def batch_worker(memo, contents):
+        use_batch_memo(memo)
+        return [await task(content) for content in contents]
+
+    memo = BatchMemo()
+    first, second = await asyncio.gather(batch_worker(memo, ["Explain entropy", "other"]),
+                                         batch_worker(memo, ["  explain   ENTROPY "]))
+    assert calls == ["Explain entropy", "other"]
+    assert second == [first[0]]
+    assert memo.get_stats() == {"executed": 2, "shared": 1}
+
+    # Outside a batch every call runs
+    await task("Explain entropy")
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_failed_lookups_are_not_shared():
+    memo = BatchMemo()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("database down")
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        await memo.get_or_run("plan", "task", flaky)
+    assert await memo.get_or_run("plan", "task", flaky) == "ok"
+    assert await memo.get_or_run("plan", "task", flaky) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.agents.meta_agent import MetaAgent
+from app.api.tasks import router
+
+def make_meta_agent(mocker):
+    return MetaAgent(*(mocker.Mock() for _ in range(9)))
+
+@pytest.mark.asyncio
+async def test_batch_runs_concurrently_and_shares_duplicates(mocker):
+    meta_agent = make_meta_agent(mocker)
+    running = []
+    peak = []
+
+    async def process(task):
+        running.append(task["content"])
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(task["content"])
+        if task["content"] == "bad":
+            raise RuntimeError("boom")
+        return {"result": task["content"].upper()}
+
+    process_mock = mocker.patch.object(meta_agent, "_process_uncached", side_effect=process)
+    tasks = [{"content": "a"}, {"content": "b"}, {"content": "a"}, {"content": "bad"}, {"content": "c", "priority": "high"}]
+    results = {index: result async for index, result in meta_agent.process_batch(tasks, concurrency=2)}
+
+    assert results == {0: {"result": "A"}, 1: {"result": "B"}, 2: {"result": "A"}, 3: {"error": "boom"}, 4: {"result": "C"}}
+    assert process_mock.call_count == 4
+    assert max(peak) == 2
+    # The high priority task is dispatched first
+    assert process_mock.call_args_list[0].args[0]["content"] == "c"
+
+def test_batch_endpoint_streams_ndjson(mocker):
+    app = FastAPI()
+    app.include_router(router)
+    app.state.meta_agent = make_meta_agent(mocker)
+
+    async def process(task):
+        return {"result": task["content"]}
+
+    mocker.patch.object(app.state.meta_agent, "_process_uncached", side_effect=process)
+    response = TestClient(app).post("/process_batch", json={"tasks": [{"content": "x"}, {"content": "y"}]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert {line["result"]["result"] for line in lines} == {"x", "y"}
+
+@pytest.mark.asyncio
+async def test_batch_accepts_structured_content(mocker):
+    meta_agent = make_meta_agent(mocker)
+
+    async def process(task):
+        return {"result": task["content"]}
+
+    process_mock = mocker.patch.object(meta_agent, "_process_uncached", side_effect=process)
+    tasks = [{"content": {"goal": "x", "steps": [1, 2]}}, {"content": {"steps": [1, 2], "goal": "x"}}, {"content": ["y"]}]
+    results = {index: result async for index, result in meta_agent.process_batch(tasks)}
+
+    assert results[0] == results[1] == {"result": {"goal": "x", "steps": [1, 2]}}
+    assert results[2] == {"result": ["y"]}
+    assert process_mock.call_count == 2
@@ -0,0 +1,66 @@
+import pytest
+from app.chat_with_ollama import ChatGPT
+from app.knowledge.knowledge_graph import KnowledgeGraph
+from app.llm.fake_ollama import FakeOllamaServer
+from app.replay.cassette import Cassette, CassetteMissError, ReplayedError
+
+@pytest.mark.asyncio
+async def test_llm_calls_replay_without_the_server(tmp_path):
+    path = str(tmp_path / "session.jsonl.gz")
+    server = FakeOllamaServer()
+    recorder = Cassette(path, mode=Cassette.RECORD)
+    chatgpt = ChatGPT(base_url=await server.start(), cassette=recorder)
+    answer = await chatgpt.chat_with_ollama("system", "Answer with one word")
+    chunks = [chunk async for chunk in chatgpt.stream_chat_with_ollama("system", "hello")]
+    await chatgpt.close()
+    await server.stop()
+    recorder.close()
+
+    player = Cassette(path, mode=Cassette.REPLAY, strict=True)
+    replayed = ChatGPT(base_url=server.url, cassette=player)
+    assert await replayed.chat_with_ollama("system", "Answer with one word") == answer
+    assert [chunk async for chunk in replayed.stream_chat_with_ollama("system", "hello")] == chunks
+    with pytest.raises(CassetteMissError):
+        await replayed.chat_with_ollama("system", "never recorded")
+    await replayed.close()
+
+@pytest.mark.asyncio
+async def test_neo4j_queries_replay_in_order_with_errors(tmp_path):
+    path = str(tmp_path / "graph.jsonl")
+    recorder = Cassette(path, mode=Cassette.RECORD)
+    results = iter([[{"n": 1}], [{"n": 2}]])
+
+    async def run(*args):
+        return next(results)
+
+    await recorder.around("neo4j", {"query": "MATCH (n) RETURN n", "parameters": None}, run)
+    await recorder.around("neo4j", {"query": "MATCH (n) RETURN n", "parameters": None}, run)
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await recorder.around("neo4j", {"query": "BAD", "parameters": None}, fail)
+    recorder.close()
+
+    graph = KnowledgeGraph(None, None, None, cassette=Cassette(path, mode=Cassette.REPLAY))
+    await graph.connect()
+    assert await graph.execute_query("MATCH (n) RETURN n") == [{"n": 1}]
+    assert await graph.execute_query("MATCH (n) RETURN n") == [{"n": 2}]
+    with pytest.raises(ReplayedError, match="boom"):
+        await graph.execute_query("BAD")
+
+@pytest.mark.asyncio
+async def test_unmatched_calls_fall_back_to_recorded_order(tmp_path):
+    path = str(tmp_path / "loose.jsonl")
+    recorder = Cassette(path, mode=Cassette.RECORD)
+
+    async def respond():
+        return "recorded"
+
+    await recorder.around("llm", {"prompt": "id=1"}, respond)
+    recorder.close()
+
+    player = Cassette(path, mode=Cassette.REPLAY)
+    assert await player.around("llm", {"prompt": "id=2"}, respond) == "recorded"
+    assert player.stats["fallbacks"] == 1
@@ -0,0 +1,65 @@
+import pytest
+from app.llm.chat_session import ChatSession
+from app.llm.structured_output import StructuredOutputError, StructuredOutputStats
+
+class RecordingLLM:
+    schema_format = True
+
+    def __init__(self, replies=None):
+        self.calls = []
+        self.formats = []
+        self.replies = list(replies or [])
+        self.structured_stats = StructuredOutputStats()
+
+    async def chat_messages(self, messages, call_site=None, priority=None, session_key=None, format=None):
+        self.calls.append([dict(message) for message in messages])
+        self.formats.append(format)
+        return self.replies.pop(0) if self.replies else f"reply {len(self.calls)}"
+
+@pytest.mark.asyncio
+async def test_turns_extend_a_stable_prefix():
+    llm = RecordingLLM()
+    session = ChatSession(llm, "system prompt")
+    await session.send("first")
+    await session.send("second")
+    first, second = llm.calls
+    assert first[0] == {"role": "system", "content": "system prompt"}
+    assert second[:len(first)] == first
+    assert second[-1] == {"role": "user", "content": "second"}
+
+@pytest.mark.asyncio
+async def test_unremembered_turn_leaves_history_untouched():
+    llm = RecordingLLM()
+    session = ChatSession(llm, "system prompt")
+    await session.send("first")
+    await session.send("side question", remember=False)
+    assert [message["content"] for message in session.history] == ["first", "reply 1"]
+
+@pytest.mark.asyncio
+async def test_history_is_capped():
+    llm = RecordingLLM()
+    session = ChatSession(llm, "system prompt", max_turns=2)
+    for turn in range(4):
+        await session.send(f"turn {turn}")
+    assert len(session.history) == 4
+    assert session.history[0]["content"] == "turn 2"
+
+STEPS_SCHEMA = {"type": "array", "items": {"type": "object", "required": ["tool"]}}
+
+@pytest.mark.asyncio
+async def test_structured_turn_is_constrained_validated_and_repaired():
+    llm = RecordingLLM(replies=['Here you go:\n```json\n[{"description": "no tool"}]\n```', '[{"tool": "respond"}]'])
+    session = ChatSession(llm, "system prompt")
+    assert await session.send_structured("plan it", STEPS_SCHEMA, call_site="Test.plan") == [{"tool": "respond"}]
+    assert llm.formats == [STEPS_SCHEMA, STEPS_SCHEMA]
+    assert "'tool' is a required property" in llm.calls[1][-1]["content"]
+    assert [message["content"] for message in session.history][0] == "plan it"
+    assert llm.structured_stats.get_stats()["repaired"] == 1
+
+@pytest.mark.asyncio
+async def test_structured_turn_raises_instead_of_returning_nothing():
+    llm = RecordingLLM(replies=["no json here", "still none"])
+    session = ChatSession(llm, "system prompt")
+    with pytest.raises(StructuredOutputError):
+        await session.send_structured("plan it", STEPS_SCHEMA, remember=False)
+    assert session.history == []
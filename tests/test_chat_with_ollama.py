@@ -0,0 +1,220 @@
+import json
+import asyncio
+import pytest
+from app.chat_with_ollama import ChatGPT
+from app.llm.structured_output import StructuredOutputError
+from app.llm.circuit_breaker import CircuitOpenError, DeadlineExceededError, LLMRequestError
+from app.llm.backend_pool import Backend, BackendPool, NoBackendAvailableError
+from app.llm.scheduler import Priority
+
+@pytest.fixture
+def chatgpt():
+    return ChatGPT(base_url="http://localhost:11434", pool_size=4, per_host_limit=2)
+
+@pytest.mark.asyncio
+async def test_session_is_shared_across_calls(chatgpt):
+    first = await chatgpt._get_session()
+    second = await chatgpt._get_session()
+    assert first is second
+    assert first.connector.limit == 4
+    assert first.connector.limit_per_host == 2
+    await chatgpt.close()
+
+@pytest.mark.asyncio
+async def test_close_releases_session(chatgpt):
+    session = await chatgpt._get_session()
+    await chatgpt.close()
+    assert session.closed
+    reopened = await chatgpt._get_session()
+    assert reopened is not session
+    await chatgpt.close()
+
+class FakeStreamResponse:
+    def __init__(self, lines, status=200):
+        self.status = status
+        self.content = self._iter_lines(lines)
+
+    async def _iter_lines(self, lines):
+        for line in lines:
+            yield line
+
+    async def text(self):
+        return ""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def stream_lines(*chunks):
+    lines = [json.dumps({"response": chunk, "done": False}).encode() + b"\n" for chunk in chunks]
+    lines.append(json.dumps({"response": "", "done": True}).encode() + b"\n")
+    return lines
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_ollama_yields_chunks(chatgpt, mocker):
+    session = mocker.Mock()
+    session.post.return_value = FakeStreamResponse(stream_lines("Hel", "lo"))
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+
+    chunks = [chunk async for chunk in chatgpt.stream_chat_with_ollama("system", "user")]
+    assert chunks == ["Hel", "lo"]
+    assert session.post.call_args.kwargs["json"]["stream"] is True
+
+@pytest.mark.asyncio
+async def test_stream_to_forwards_chunks_to_listener(chatgpt, mocker):
+    session = mocker.Mock()
+    session.post.return_value = FakeStreamResponse(stream_lines("a", "b", "c"))
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+    received = []
+
+    async def listener(chunk):
+        received.append(chunk)
+
+    with chatgpt.stream_to(listener):
+        response = await chatgpt.chat_with_ollama("system", "user")
+    assert response == "abc"
+    assert received == ["a", "b", "c"]
+
+@pytest.mark.asyncio
+async def test_chat_json_stops_reading_once_json_closes(chatgpt, mocker):
+    lines = stream_lines('Sure: {"a": ', '[1, "}"]}', " and some trailing prose")
+    consumed = []
+
+    class TrackingResponse(FakeStreamResponse):
+        async def _iter_lines(self, lines):
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+    session = mocker.Mock()
+    session.post.return_value = TrackingResponse(lines)
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+
+    result = await chatgpt.chat_json("system", "user")
+    assert result == {"a": [1, "}"]}
+    assert len(consumed) == 2
+
+STEP_SCHEMA = {
+    "type": "object",
+    "properties": {"step": {"type": "string"}},
+    "required": ["step"]
+}
+
+@pytest.mark.asyncio
+async def test_generate_structured_passes_schema_as_format(chatgpt, mocker):
+    chat = mocker.patch.object(chatgpt, 'chat_with_ollama', return_value='{"step": "plan"}')
+    result = await chatgpt.generate_structured("system", "user", STEP_SCHEMA)
+    assert result == {"step": "plan"}
+    assert chat.call_args.kwargs["format"] == STEP_SCHEMA
+    assert chatgpt.structured_stats.first_try_valid == 1
+
+@pytest.mark.asyncio
+async def test_generate_structured_repairs_invalid_output(chatgpt, mocker):
+    chat = mocker.patch.object(chatgpt, 'chat_with_ollama', side_effect=['{"other": 1}', '{"step": "plan"}'])
+    result = await chatgpt.generate_structured("system", "user", STEP_SCHEMA)
+    assert result == {"step": "plan"}
+    assert chat.call_count == 2
+    assert "'step' is a required property" in chat.call_args.args[1]
+    assert chatgpt.structured_stats.repaired == 1
+
+@pytest.mark.asyncio
+async def test_generate_structured_raises_after_max_repairs(chatgpt, mocker):
+    mocker.patch.object(chatgpt, 'chat_with_ollama', return_value='not json')
+    with pytest.raises(StructuredOutputError):
+        await chatgpt.generate_structured("system", "user", STEP_SCHEMA, max_repairs=1)
+    assert chatgpt.structured_stats.failures == 1
+
+class FakeJSONResponse:
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return "overloaded"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+@pytest.mark.asyncio
+async def test_post_retries_are_bounded_and_open_the_circuit(chatgpt, mocker):
+    chatgpt.max_attempts = 3
+    chatgpt.pool.get(chatgpt.base_url).breaker.failure_threshold = 3
+    session = mocker.Mock()
+    session.post.side_effect = lambda *args, **kwargs: FakeJSONResponse(503)
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+    mocker.patch('asyncio.sleep', return_value=None)
+
+    with pytest.raises(Exception, match="503"):
+        await chatgpt.chat_with_ollama("system", "user")
+    assert session.post.call_count == 3
+    # Further calls fail fast without reaching the backend
+    with pytest.raises(NoBackendAvailableError):
+        await chatgpt.chat_with_ollama("system", "other")
+    assert session.post.call_count == 3
+
+@pytest.mark.asyncio
+async def test_rejected_requests_are_not_retried(chatgpt, mocker):
+    chatgpt.max_attempts = 3
+    session = mocker.Mock()
+    session.post.side_effect = lambda *args, **kwargs: FakeJSONResponse(404)
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+
+    with pytest.raises(LLMRequestError) as error:
+        await chatgpt.chat_with_ollama("system", "user")
+    assert error.value.status == 404
+    assert session.post.call_count == 1
+    assert chatgpt.pool.get(chatgpt.base_url).is_available()
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_the_whole_call(chatgpt, mocker):
+    async def slow_post(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    mocker.patch.object(chatgpt, '_post_hedged', side_effect=slow_post)
+    with chatgpt.deadline(0.05):
+        with pytest.raises(DeadlineExceededError):
+            await chatgpt.chat_with_ollama("system", "user")
+
+@pytest.mark.asyncio
+async def test_request_moves_on_when_its_backend_stops_admitting(mocker):
+    chatgpt = ChatGPT(backend_pool=BackendPool([Backend("http://a"), Backend("http://b")]))
+    tried = []
+
+    async def post_once(backend, path, payload, priority):
+        tried.append(backend.url)
+        if len(tried) == 1:
+            raise CircuitOpenError(f"Circuit for {backend.url} is open")
+        return "ok"
+
+    mocker.patch.object(chatgpt, '_post_once', side_effect=post_once)
+    assert await chatgpt.chat_with_ollama("system", "user", use_cache=False) == "ok"
+    assert len(set(tried)) == 2
+
+class MalformedJSONResponse(FakeJSONResponse):
+    async def json(self):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+@pytest.mark.asyncio
+async def test_half_open_probe_is_released_when_no_outcome_is_recorded(chatgpt, mocker):
+    backend = chatgpt.pool.get(chatgpt.base_url)
+    backend.breaker.reset_timeout = 0
+    backend.breaker.half_open_max_calls = 1
+    for _ in range(backend.breaker.failure_threshold):
+        backend.breaker.record_failure()
+    assert backend.breaker.state == backend.breaker.HALF_OPEN
+    session = mocker.Mock()
+    session.post.side_effect = lambda *args, **kwargs: MalformedJSONResponse(200)
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+
+    payload = {"model": "llama3", "messages": [], "stream": False}
+    with pytest.raises(ValueError):
+        await chatgpt._post_once(backend, "/api/chat", payload, Priority.INTERACTIVE)
+    assert backend.breaker.can_admit()
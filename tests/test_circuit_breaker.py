@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.llm.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.llm.hedging import Hedger
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_allows_one_probe_then_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_failed_probe_reopens_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.reset_timeout = 60
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+@pytest.mark.asyncio
+async def test_hedge_wins_when_primary_is_slow():
+    hedger = Hedger(default_delay=0.01)
+    primary_cancelled = asyncio.Event()
+
+    async def primary():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+        return "primary"
+
+    async def secondary():
+        return "secondary"
+
+    assert await hedger.run(primary, secondary) == "secondary"
+    await asyncio.sleep(0)
+    assert primary_cancelled.is_set()
+    assert hedger.hedges_won == 1
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    hedger = Hedger(default_delay=1)
+
+    async def primary():
+        return "primary"
+
+    async def secondary():
+        raise AssertionError("hedge should not fire")
+
+    assert await hedger.run(primary, secondary) == "primary"
+    assert hedger.hedges_sent == 0
+
+@pytest.mark.asyncio
+async def test_hedge_falls_back_to_primary_when_hedge_fails():
+    hedger = Hedger(default_delay=0.01)
+
+    async def primary():
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    async def secondary():
+        raise ConnectionError("down")
+
+    assert await hedger.run(primary, secondary) == "primary"
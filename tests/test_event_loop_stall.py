@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from app.chat_with_ollama import ChatGPT
+from app.llm.sync_client import SyncChatGPT
+
+class SlowResponse:
+    """Response whose body takes `delay` seconds to arrive, like a model generating."""
+
+    def __init__(self, delay):
+        self.status = 200
+        self.delay = delay
+
+    async def json(self):
+        await asyncio.sleep(self.delay)
+        return {"response": "done"}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+async def max_tick_gap(coro, interval=0.01):
+    """Run `coro` while a ticker measures the longest time the event loop went without running it."""
+    gaps = []
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    tick_task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        tick_task.cancel()
+    return result, max(gaps)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["chat_with_ollama", "chat_text"])
+async def test_llm_calls_do_not_block_the_event_loop(method, mocker):
+    chatgpt = ChatGPT(base_url="http://localhost:11434")
+    session = mocker.Mock()
+    session.post.side_effect = lambda *args, **kwargs: SlowResponse(0.3)
+    mocker.patch.object(chatgpt, '_get_session', return_value=session)
+
+    result, gap = await max_tick_gap(getattr(chatgpt, method)("system", "user"))
+    assert result == "done"
+    assert gap < 0.1
+
+def test_sync_facade_runs_on_its_own_loop():
+    class FakeClient:
+        async def chat_with_ollama(self, system_prompt, user_prompt, **kwargs):
+            await asyncio.sleep(0)
+            return f"{system_prompt}:{user_prompt}:{id(asyncio.get_running_loop())}"
+
+        async def close(self):
+            pass
+
+    with SyncChatGPT(FakeClient) as client:
+        first = client.chat_with_ollama("system", "user")
+        second = client.chat_with_ollama("system", "user")
+    assert first.startswith("system:user:")
+    # Every call runs on the same private loop, so loop-bound resources can be reused
+    assert first == second
+
+def test_legacy_nojson_call_stays_blocking_and_keeps_its_model(mocker):
+    class FakeSyncClient:
+        def __init__(self, client_factory):
+            self.client = client_factory()
+
+        def chat_with_ollama(self, system_prompt, user_prompt, **kwargs):
+            return f"{user_prompt}:{kwargs['call_site']}"
+
+    mocker.patch("app.llm.sync_client.SyncChatGPT", FakeSyncClient)
+    chatgpt = ChatGPT(base_url="http://localhost:11434")
+    assert chatgpt.chat_with_ollama_nojson("system", "user") == "user:ChatGPT.chat_with_ollama_nojson"
+    assert chatgpt.router.resolve(["ChatGPT.chat_with_ollama_nojson"]).model == "llama3.1"
+    # The blocking client shares this client's backends, concurrency limit, routes, cassette and metrics
+    sync_client = chatgpt._sync_client.client
+    assert sync_client is not chatgpt
+    for name in ("pool", "scheduler", "router", "cassette", "response_cache", "telemetry", "structured_stats"):
+        assert getattr(sync_client, name) is getattr(chatgpt, name)
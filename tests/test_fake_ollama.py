@@ -0,0 +1,56 @@
+import jsonschema
+import pytest
+from app.chat_with_ollama import ChatGPT, PLAN_SCHEMA
+from app.llm.fake_ollama import FakeOllamaServer, instance_for_schema
+
+def test_schema_instances_validate():
+    schema = {
+        "type": "object",
+        "properties": {
+            "score": {"type": "number", "minimum": 0, "maximum": 1},
+            "tags": {"type": "array", "items": {"type": "string"}, "minItems": 2},
+            "level": {"type": "string", "enum": ["low", "high"]}
+        },
+        "required": ["score", "tags", "level"]
+    }
+    jsonschema.validate(instance_for_schema(schema), schema)
+    jsonschema.validate(instance_for_schema(PLAN_SCHEMA), PLAN_SCHEMA)
+
+@pytest.mark.asyncio
+async def test_client_round_trip():
+    server = FakeOllamaServer()
+    chatgpt = ChatGPT(base_url=await server.start())
+    try:
+        assert await chatgpt.chat_with_ollama("system", "Answer with a single word") == "researcher"
+        assert await chatgpt.generate_structured("system", "plan it", PLAN_SCHEMA) == instance_for_schema(PLAN_SCHEMA)
+        chunks = [chunk async for chunk in chatgpt.stream_chat_with_ollama("system", "hello")]
+        assert len(chunks) > 1
+        assert "".join(chunks) == "This is a deterministic response from the fake Ollama server."
+        reply = await chatgpt.chat_session("system").send("one word please")
+        assert reply == "researcher"
+        plan = await chatgpt.chat_session("system").send_structured("plan it", PLAN_SCHEMA)
+        assert plan == instance_for_schema(PLAN_SCHEMA)
+    finally:
+        await chatgpt.close()
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_injected_failures_are_deterministic():
+    outcomes = []
+    for _ in range(2):
+        server = FakeOllamaServer(failure_rate=0.5, seed=7)
+        await server.start()
+        chatgpt = ChatGPT(base_url=server.url)
+        chatgpt.max_attempts = 1
+        run = []
+        for prompt in ("a", "b", "c", "d", "e", "f"):
+            try:
+                await chatgpt.chat_with_ollama("system", prompt)
+                run.append(True)
+            except Exception:
+                run.append(False)
+        outcomes.append(run)
+        await chatgpt.close()
+        await server.stop()
+    assert outcomes[0] == outcomes[1]
+    assert not all(outcomes[0])
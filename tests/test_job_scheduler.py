@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.execution.job_scheduler import JobScheduler
+
+@pytest.mark.asyncio
+async def test_jobs_are_deduplicated_and_run_periodically():
+    scheduler = JobScheduler()
+    runs = []
+
+    async def job():
+        runs.append(1)
+
+    assert scheduler.add_job("tick", job, interval=0.01, jitter=0)
+    assert not scheduler.add_job("tick", job, interval=0.01, jitter=0)
+    scheduler.start()
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+    stats = scheduler.get_stats()["tick"]
+    assert len(scheduler.jobs) == 1
+    assert stats["runs"] == len(runs) >= 3
+    assert stats["last_duration"] is not None
+
+@pytest.mark.asyncio
+async def test_runs_never_overlap_and_overruns_are_cancelled():
+    scheduler = JobScheduler()
+    active = []
+    overlaps = []
+
+    async def slow():
+        overlaps.append(len(active))
+        active.append(1)
+        try:
+            await asyncio.sleep(10)
+        finally:
+            active.pop()
+
+    scheduler.add_job("slow", slow, interval=3600, timeout=0.05, initial_delay=0)
+    scheduler.start()
+    await asyncio.sleep(0.01)
+    assert not scheduler.trigger("slow")
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+    stats = scheduler.get_stats()["slow"]
+    assert overlaps == [0]
+    assert stats["timeouts"] == 1
+    assert stats["skipped"] == 1
+    assert not active
+
+@pytest.mark.asyncio
+async def test_failures_keep_the_schedule():
+    scheduler = JobScheduler()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    scheduler.add_job("failing", failing, interval=0.01, jitter=0, initial_delay=0)
+    scheduler.start()
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+    stats = scheduler.get_stats()["failing"]
+    assert stats["failures"] == stats["runs"] >= 2
+    assert stats["last_error"] == "boom"
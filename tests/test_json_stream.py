@@ -0,0 +1,25 @@
+import pytest
+from app.llm.json_stream import JSONStreamScanner, extract_json
+
+def test_scanner_completes_when_top_level_object_closes():
+    scanner = JSONStreamScanner()
+    assert not scanner.feed('Here is the plan: {"steps": [')
+    assert not scanner.feed('{"name": "a"}')
+    assert scanner.feed('], "done": true} Let me know if')
+    assert scanner.value == {"steps": [{"name": "a"}], "done": True}
+    assert scanner.text == '{"steps": [{"name": "a"}], "done": true}'
+
+def test_scanner_ignores_brackets_inside_strings():
+    scanner = JSONStreamScanner()
+    assert scanner.feed('{"text": "a } and \\" ] inside"}')
+    assert scanner.value == {"text": 'a } and " ] inside'}
+
+def test_scanner_skips_bracketed_prose():
+    assert extract_json('Use [this] format: ["x", "y"]') == ["x", "y"]
+
+def test_extract_json_returns_first_value_not_greedy_span():
+    assert extract_json('{"a": 1} and later {"b": 2}') == {"a": 1}
+
+def test_extract_json_raises_without_json():
+    with pytest.raises(ValueError):
+        extract_json("no json here")
@@ -0,0 +1,216 @@
+import asyncio
+import numpy as np
+import pytest
+from app.agents.meta_learning_agent import MetaLearningAgent
+from app.knowledge.knowledge_graph import KnowledgeGraph
+from app.knowledge.vector_index import VectorIndex
+from app.replay.cassette import Cassette
+from app.shared_state.store import InMemoryStateStore
+
+@pytest.fixture
+def graph(tmp_path, mocker):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("")
+    cassette = Cassette(str(path), mode=Cassette.REPLAY)
+    graph = KnowledgeGraph(None, None, None, cassette=cassette, state_store=InMemoryStateStore())
+    graph.execute_query = mocker.AsyncMock(return_value=[])
+    return graph
+
+@pytest.mark.asyncio
+async def test_upsert_is_a_single_merge(graph):
+    await graph.add_or_update_node("Concept", {"name": "entropy", "value": {"nested": True}})
+    graph.execute_query.assert_awaited_once()
+    query, parameters = graph.execute_query.await_args.args
+    assert "MERGE (n:Concept {name: $name})" in query
+    assert parameters["properties"]["value"] == '{"nested": true}'
+
+    await graph.add_or_update_node("TaskResult", {"content": "no name"})
+    query, _ = graph.execute_query.await_args.args
+    assert "CREATE (n:TaskResult:Entity $properties)" in query
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_sends_one_statement_per_chunk(graph):
+    rows = [{"name": f"concept-{i}", "value": "v"} for i in range(5)] + [{"content": "unnamed"}]
+    ids = await graph.add_or_update_nodes("Concept", rows, chunk_size=2)
+
+    calls = graph.execute_query.await_args_list
+    assert len(calls) == 4  # three chunks of named rows, one of unnamed
+    assert all(call.args[0].lstrip().startswith("UNWIND $rows AS row") for call in calls)
+    assert [len(call.args[1]["rows"]) for call in calls] == [2, 2, 1, 1]
+    assert "CREATE (n:Concept:Entity)" in calls[-1].args[0]
+    assert len(set(ids)) == 6
+    assert graph[ids[0]]["name"] == "concept-0"
+
+@pytest.mark.asyncio
+async def test_bulk_relationships_are_grouped_by_type(graph):
+    await graph.add_relationships([
+        {"start_id": "a", "end_id": "b", "type": "RELATES_TO"},
+        {"start_id": "b", "end_id": "c", "type": "DERIVED_FROM", "properties": {"weight": 0.5}},
+        {"start_id": "a", "end_id": "c", "type": "RELATES_TO"}
+    ])
+    calls = {call.args[0].split("[r:")[1].split("]")[0]: call.args[1]["rows"] for call in graph.execute_query.await_args_list}
+    assert [row["end_id"] for row in calls["RELATES_TO"]] == ["b", "c"]
+    assert calls["DERIVED_FROM"][0]["properties"]["weight"] == 0.5
+
+@pytest.mark.asyncio
+async def test_bulk_writes_reject_unsafe_identifiers(graph):
+    with pytest.raises(ValueError):
+        await graph.add_or_update_nodes("Concept) DETACH DELETE (m", [{"name": "x"}])
+    with pytest.raises(ValueError):
+        await graph.add_or_update_node("Concept) DETACH DELETE (m", {"name": "x"})
+    with pytest.raises(ValueError):
+        await graph.add_relationships([{"start_id": "a", "end_id": "b", "type": "X]->() DELETE (a"}])
+    graph.execute_query.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_by_label_and_flushes_on_stop(graph):
+    graph.write_behind.interval = 60
+    graph.start_write_behind()
+    await graph.add_task_result("task one", "result")
+    await graph.store_performance_metric("latency", 0.5)
+    await graph.add_task_result("task two", "result")
+    graph.execute_query.assert_not_awaited()
+
+    await graph.close()
+    rows_by_label = {call.args[0].split("CREATE (n:")[1].split(":")[0]: call.args[1]["rows"]
+                     for call in graph.execute_query.await_args_list}
+    assert [row["content"] for row in rows_by_label["TaskResult"]] == ["task one", "task two"]
+    assert rows_by_label["Performance"][0]["metric"] == "latency"
+    stats = graph.write_behind.get_stats()
+    assert stats["written"] == 3 and stats["pending"] == 0 and not stats["running"]
+
+@pytest.mark.asyncio
+async def test_write_behind_flushes_full_batches_and_drops_past_the_bound(graph):
+    graph.write_behind.interval = 60
+    graph.write_behind.batch_size = 2
+    graph.write_behind.max_pending = 3
+    graph.start_write_behind()
+    for i in range(2):
+        await graph.store_tool_usage("search", {"step": i}, {"ok": True})
+    await asyncio.sleep(0.01)
+    assert graph.execute_query.await_count == 1  # a full batch does not wait for the interval
+
+    graph.execute_query.side_effect = RuntimeError("database down")
+    for i in range(4):
+        await graph.store_compressed_knowledge(f"summary {i}")
+    await graph.stop_write_behind()
+    stats = graph.write_behind.get_stats()
+    assert stats["dropped"] == 1
+    assert stats["failed"] == 3
+    assert stats["written"] == 2
+
+@pytest.mark.asyncio
+async def test_schema_bootstrap_is_tolerant_and_indexes_new_labels_once(graph, mocker):
+    def run(query, parameters=None):
+        if "concept_name" in query:
+            raise RuntimeError("duplicate names")
+        return [{"labelled": 0}] if "RETURN count(n)" in query else []
+    graph._run_query = mocker.AsyncMock(side_effect=run)
+
+    await graph.ensure_schema()
+    statements = [call.args[0] for call in graph._run_query.await_args_list]
+    assert any("REQUIRE n.id IS UNIQUE" in statement for statement in statements)
+    assert any("FOR (n:ToolUsage) ON (n.tool_name, n.timestamp)" in statement for statement in statements)
+
+    assert any("MERGE (m:SchemaMigration {name: $name})" in statement for statement in statements)
+
+    graph._run_query.reset_mock()
+    await graph.add_or_update_node("Skill", {"name": "search"})
+    await graph.add_or_update_nodes("Skill", [{"name": "plan"}])
+    await graph.add_or_update_node("Concept", {"name": "entropy"})
+    assert [call.args[0] for call in graph._run_query.await_args_list] == [
+        "CREATE INDEX skill_name IF NOT EXISTS FOR (n:Skill) ON (n.name)"]
+
+@pytest.mark.asyncio
+async def test_label_backfill_runs_once_per_database(graph, mocker):
+    graph._run_query = mocker.AsyncMock(side_effect=lambda query, parameters=None: [{"done": True}] if "SchemaMigration" in query else [])
+    await graph.ensure_schema()
+    assert not any("RETURN count(n) AS labelled" in call.args[0] for call in graph._run_query.await_args_list)
+
+@pytest.mark.asyncio
+async def test_relationships_match_nodes_through_the_indexed_label(graph):
+    await graph.add_relationship({"id": "a"}, {"id": "b"}, "RELATES_TO")
+    await graph.add_relationships([{"start_id": "a", "end_id": "b", "type": "RELATES_TO"}])
+    for call in graph.execute_query.await_args_list:
+        assert "MATCH (a:Entity {id:" in call.args[0]
+        assert "MATCH (b:Entity {id:" in call.args[0]
+
+@pytest.mark.asyncio
+async def test_relevant_knowledge_uses_the_fulltext_index_once_bootstrapped(graph, mocker):
+    graph.execute_query.return_value = [{"n": {"name": "entropy"}, "score": 2.0}]
+    assert await graph.get_relevant_knowledge("Explain entropy, then entropy again!", limit=3) == [{"name": "entropy"}]
+    query, parameters = graph.execute_query.await_args.args
+    assert "db.index.fulltext" not in query and "LIMIT $limit" in query
+    assert parameters["terms"] == ["explain", "entropy", "then", "again"]
+
+    graph._run_query = mocker.AsyncMock(return_value=[{"labelled": 0}])
+    await graph.ensure_schema()
+    await graph.get_relevant_knowledge("entropy (thermodynamics)", labels=["Concept"], properties=["name", "content"])
+    query, parameters = graph.execute_query.await_args.args
+    assert "db.index.fulltext.queryNodes('entity_text', $search)" in query
+    assert "RETURN n {.name, .content} AS n, score" in query
+    assert parameters["search"] == "entropy OR thermodynamics"
+    assert parameters["labels"] == ["Concept"] and parameters["limit"] == 10
+
+@pytest.mark.asyncio
+async def test_relevant_knowledge_of_nothing_skips_the_database(graph):
+    assert await graph.get_relevant_knowledge("?!") == []
+    graph.execute_query.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_embeddings_are_searchable_and_persisted_on_close(graph, tmp_path):
+    graph.vector_index_path = str(tmp_path / "vectors.npz")
+    await graph.add_or_update_node("Concept", {"name": "entropy"}, embedding=np.array([1.0, 0.0]))
+    await graph.add_or_update_nodes("Tool", [{"name": "search"}], embeddings=[np.array([0.9, 0.1])])
+    assert [match["node"]["name"] for match in await graph.search_similar(np.array([1.0, 0.0]), k=2)] == ["entropy", "search"]
+    assert [match["node"]["name"] for match in await graph.search_similar(np.array([1.0, 0.0]), label="Tool")] == ["search"]
+
+    await graph.close()
+    assert len(VectorIndex.load(graph.vector_index_path)) == 2
+
+def _graph_on(store, path, mocker):
+    cassette = Cassette(str(path), mode=Cassette.REPLAY)
+    graph = KnowledgeGraph(None, None, None, cassette=cassette, state_store=store)
+    graph.execute_query = mocker.AsyncMock(return_value=[])
+    return graph
+
+@pytest.mark.asyncio
+async def test_vector_index_follows_the_shared_embeddings(graph, tmp_path, mocker):
+    graph.vector_index_path = str(tmp_path / "vectors.npz")
+    await graph.add_or_update_node("Tool", {"name": "search"}, embedding=np.array([1.0, 0.0]))
+    await graph.add_or_update_node("Tool", {"name": "stale"}, embedding=np.array([0.0, 1.0]))
+    await graph.close()
+
+    # Another worker on the same store: one embedding deleted, one added after the file was saved
+    other = _graph_on(graph.state_store, tmp_path / "empty.jsonl", mocker)
+    stale_id = next(node_id for node_id, node in other.nodes.items() if node["name"] == "stale")
+    del other.embeddings[stale_id]
+    await other.add_or_update_node("Concept", {"name": "entropy"}, embedding=np.array([0.7, 0.7]))
+
+    mocker.patch.dict("os.environ", {"KG_VECTOR_INDEX_PATH": graph.vector_index_path})
+    restarted = _graph_on(graph.state_store, tmp_path / "empty.jsonl", mocker)
+    assert len(restarted.vector_index) == 2  # as saved
+    assert [match["node"]["name"] for match in await restarted.search_similar(np.array([1.0, 0.0]), k=5)] == ["search", "entropy"]
+    assert [match["node"]["name"] for match in await restarted.search_similar(np.array([1.0, 0.0]), label="Tool")] == ["search"]
+
+@pytest.mark.asyncio
+async def test_only_the_lease_holder_saves_the_vector_index(graph, tmp_path, mocker):
+    other = _graph_on(graph.state_store, tmp_path / "empty.jsonl", mocker)
+    other.owner = "another-host:1"
+    graph.vector_index_path = other.vector_index_path = str(tmp_path / "vectors.npz")
+    assert await graph.save_vector_index()
+    assert await graph.save_vector_index()
+    assert not await other.save_vector_index()
+
+@pytest.mark.asyncio
+async def test_task_analysis_uses_the_best_text_matches_only(graph, mocker):
+    graph.get_relevant_knowledge = mocker.AsyncMock(return_value=[{"name": "entropy"}])
+    llm = mocker.Mock()
+    llm.generate_structured = mocker.AsyncMock(return_value={"analysis": "split it up", "strategy": []})
+    agent = MetaLearningAgent(graph, llm, mocker.Mock(), mocker.Mock())
+
+    await agent.analyze_task("explain entropy")
+    graph.get_relevant_knowledge.assert_awaited_once_with("explain entropy", limit=3)
+    assert '"name": "entropy"' in llm.generate_structured.await_args.args[1]
+    # The quantum-inspired embedding is random, so analyses are not added to the vector index
+    assert len(graph.vector_index) == 0
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import pytest
+from app.llm.scheduler import LLMScheduler, Priority, LoadShedError
+
+async def hold(scheduler, priority, order, release):
+    async with scheduler.slot(priority):
+        order.append(priority)
+        await release.wait()
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_is_enforced():
+    scheduler = LLMScheduler(max_concurrency=2)
+    release = asyncio.Event()
+    order = []
+    tasks = [asyncio.ensure_future(hold(scheduler, Priority.INTERACTIVE, order, release)) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    assert scheduler.get_stats()["active"] == 2
+    assert scheduler.queue_depth() == 2
+    release.set()
+    await asyncio.gather(*tasks)
+    assert scheduler.get_stats()["active"] == 0
+
+@pytest.mark.asyncio
+async def test_queued_requests_are_admitted_by_priority():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+    blocker = asyncio.ensure_future(hold(scheduler, Priority.INTERACTIVE, order, release))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.ensure_future(hold(scheduler, Priority.BACKGROUND, order, release)),
+        asyncio.ensure_future(hold(scheduler, Priority.PLANNING, order, release)),
+        asyncio.ensure_future(hold(scheduler, Priority.INTERACTIVE, order, release)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocker, *waiters)
+    assert order == [Priority.INTERACTIVE, Priority.INTERACTIVE, Priority.PLANNING, Priority.BACKGROUND]
+
+@pytest.mark.asyncio
+async def test_background_requests_are_shed_when_saturated():
+    scheduler = LLMScheduler(max_concurrency=1, shed_queue_depth=1)
+    release = asyncio.Event()
+    order = []
+    blocker = asyncio.ensure_future(hold(scheduler, Priority.INTERACTIVE, order, release))
+    queued = asyncio.ensure_future(hold(scheduler, Priority.PLANNING, order, release))
+    await asyncio.sleep(0)
+    with pytest.raises(LoadShedError):
+        await scheduler.acquire(Priority.BACKGROUND)
+    assert scheduler.get_stats()["lanes"]["background"]["shed"] == 1
+    release.set()
+    await asyncio.gather(blocker, queued)
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+    blocker = asyncio.ensure_future(hold(scheduler, Priority.INTERACTIVE, order, release))
+    await asyncio.sleep(0)
+    cancelled = asyncio.ensure_future(scheduler.acquire(Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == 0
+    release.set()
+    await blocker
+    assert scheduler.get_stats()["active"] == 0
+
+@pytest.mark.asyncio
+async def test_slots_are_shared_across_event_loops():
+    scheduler = LLMScheduler(max_concurrency=1)
+    await scheduler.acquire()
+    admitted = threading.Event()
+
+    def other_loop():
+        async def wait_for_slot():
+            async with scheduler.slot():
+                admitted.set()
+        asyncio.run(wait_for_slot())
+
+    thread = threading.Thread(target=other_loop)
+    thread.start()
+    while scheduler.queue_depth() == 0:
+        await asyncio.sleep(0.001)
+    assert not admitted.is_set()
+    scheduler.release()
+    await asyncio.to_thread(thread.join, 5)
+    assert admitted.is_set()
+    assert scheduler.get_stats()["active"] == 0
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import pytest
+from app.chat_with_ollama import ChatGPT, PLAN_SCHEMA
+from app.llm.fake_ollama import FakeOllamaServer
+from app.llm.response_cache import LLMResponseCache
+from app.llm.telemetry import Histogram, LLMTelemetry
+
+def test_histogram_percentiles():
+    histogram = Histogram((1, 2, 5, 10))
+    for value in (0.5, 0.5, 1.5, 3, 20):
+        histogram.record(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 5
+    assert snapshot["max"] == 20
+    assert snapshot["p50"] == 2
+    assert snapshot["p99"] == 20
+    assert snapshot["buckets"] == {"1": 2, "2": 1, "5": 1, "10": 0, "+Inf": 1}
+    assert Histogram((1,)).percentile(50) is None
+
+def test_failed_calls_are_counted():
+    telemetry = LLMTelemetry()
+    with pytest.raises(RuntimeError):
+        with telemetry.track("Agent.method", "hermes3", 10) as call:
+            call.attempts = 3
+            raise RuntimeError("boom")
+    stats = telemetry.get_stats()["call_sites"]["Agent.method"]
+    assert stats["calls"] == 1
+    assert stats["errors"] == 1
+    assert stats["retries"] == 2
+
+@pytest.mark.asyncio
+async def test_calls_are_recorded_per_call_site(tmp_path):
+    server = FakeOllamaServer()
+    cache = LLMResponseCache(str(tmp_path / "cache.db"))
+    chatgpt = ChatGPT(base_url=await server.start(), response_cache=cache)
+    try:
+        await chatgpt.chat_with_ollama("system", "Answer with a single word", call_site="Agent.classify")
+        await chatgpt.chat_with_ollama("system", "Answer with a single word", call_site="Agent.classify")
+        await chatgpt.chat_json("system", "Reply in JSON", call_site="Agent.extract", use_cache=False)
+        await chatgpt.generate_structured("system", "plan it", PLAN_SCHEMA, call_site="Agent.plan")
+    finally:
+        await chatgpt.close()
+        await server.stop()
+
+    call_sites = chatgpt.get_stats()["telemetry"]["call_sites"]
+    classify = call_sites["Agent.classify"]
+    assert classify["calls"] == 2
+    assert classify["cache"] == {"miss": 1, "hit": 1}
+    assert classify["retries"] == 0
+    # The cache hit never reached the server, so only one call reported tokens and queue wait
+    assert classify["histograms"]["prompt_tokens"]["count"] == 1
+    assert classify["histograms"]["completion_tokens"]["sum"] == 1
+    assert classify["histograms"]["queue_wait"]["count"] == 1
+    assert classify["histograms"]["latency"]["count"] == 2
+
+    extract = call_sites["Agent.extract"]
+    assert extract["cache"] == {}
+    assert extract["histograms"]["time_to_first_token"]["count"] == 1
+    assert call_sites["Agent.plan"]["repairs"] == 0
+    json.dumps(chatgpt.get_stats())
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_add_no_request_cost():
+    server = FakeOllamaServer()
+    chatgpt = ChatGPT(base_url=await server.start())
+    try:
+        await asyncio.gather(*(chatgpt.chat_with_ollama("system", "same prompt", call_site="Agent.ask", use_cache=False)
+                               for _ in range(3)))
+    finally:
+        await chatgpt.close()
+        await server.stop()
+
+    ask = chatgpt.get_stats()["telemetry"]["call_sites"]["Agent.ask"]
+    assert ask["calls"] == 3
+    assert ask["cache"] == {"coalesced": 2}
+    assert ask["histograms"]["latency"]["count"] == 3
+    assert ask["histograms"]["queue_wait"]["count"] == 1
+    assert ask["histograms"]["prompt_tokens"]["count"] == 1
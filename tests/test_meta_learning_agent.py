@@ -4,6 +4,7 @@ from app.agents.meta_learning_agent import MetaLearningAgent
 from app.knowledge.knowledge_graph import KnowledgeGraph
 from app.chat_with_ollama import ChatGPT
 from app.learning.continuous_learner import ContinuousLearner
+from app.llm.structured_output import StructuredOutputError
 
 @pytest.fixture
 def meta_learning_agent(mocker: MockerFixture):
@@ -15,7 +16,7 @@ def meta_learning_agent(mocker: MockerFixture):
 @pytest.mark.asyncio
 async def test_analyze_task(meta_learning_agent, mocker):
     task = "Test task"
-    mocker.patch.object(meta_learning_agent.llm, 'chat_with_ollama', return_value='{"analysis": "Task analysis", "strategy": ["Step 1", "Step 2"]}')
+    mocker.patch.object(meta_learning_agent.llm, 'generate_structured', return_value={"analysis": "Task analysis", "strategy": ["Step 1", "Step 2"]})
     
     result = await meta_learning_agent.analyze_task(task)
     assert "analysis" in result
@@ -45,7 +46,7 @@ async def test_adapt_to_new_task(meta_learning_agent, mocker):
     task = "New task"
     previous_tasks = ["Task 1", "Task 2"]
     mocker.patch.object(meta_learning_agent.knowledge_graph, 'get_relevant_knowledge', return_value=["Knowledge 1", "Knowledge 2"])
-    mocker.patch.object(meta_learning_agent.llm, 'chat_with_ollama', return_value="Adapted strategy")
+    mocker.patch.object(meta_learning_agent.llm, 'generate_structured', side_effect=StructuredOutputError("Adapted strategy"))
     
     result = await meta_learning_agent.adapt_to_new_task(task, previous_tasks)
     assert isinstance(result, dict)
@@ -54,7 +55,7 @@ async def test_adapt_to_new_task(meta_learning_agent, mocker):
 @pytest.mark.asyncio
 async def test_generate_novel_approach(meta_learning_agent, mocker):
     task = "Complex task"
-    mocker.patch.object(meta_learning_agent.llm, 'chat_with_ollama', return_value="Novel approach")
+    mocker.patch.object(meta_learning_agent.llm, 'generate_structured', side_effect=StructuredOutputError("Novel approach"))
     
     result = await meta_learning_agent.generate_novel_approach(task)
     assert isinstance(result, dict)
@@ -0,0 +1,42 @@
+import pytest
+from app.llm.routing import ModelRouter
+
+@pytest.fixture
+def router():
+    return ModelRouter.from_config({
+        "default_model": "hermes3",
+        "profiles": {
+            "fast": {"model": "qwen2.5:0.5b", "options": {"num_predict": 8, "temperature": 0}},
+            "planner": {"model": "hermes3", "options": {"temperature": 0.2}}
+        },
+        "routes": {
+            "DynamicAgent.decide_action": "fast",
+            "TaskPlanner.": "planner"
+        },
+        "prompt_rules": [{"pattern": "single word", "profile": "fast"}]
+    })
+
+def test_call_site_route(router):
+    route = router.resolve(["DynamicAgent.decide_action"])
+    assert route.model == "qwen2.5:0.5b"
+    assert route.options == {"num_predict": 8, "temperature": 0}
+
+def test_class_wide_route(router):
+    assert router.resolve(["TaskPlanner.create_plan"]).options == {"temperature": 0.2}
+
+def test_outer_call_site_is_matched(router):
+    route = router.resolve(["Agent.generate_response", "DynamicAgent.decide_action"])
+    assert route.model == "qwen2.5:0.5b"
+
+def test_prompt_rule_route(router):
+    route = router.resolve(["MetaAgent.process_task"], "Respond with a single word describing the agent type.")
+    assert route.model == "qwen2.5:0.5b"
+
+def test_default_route(router):
+    route = router.resolve(["MetaAgent.process_task"], "Explain the plan.")
+    assert route.model == "hermes3"
+    assert route.options == {}
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRouter(routes={"DynamicAgent.decide_action": "missing"})
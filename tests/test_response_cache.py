@@ -0,0 +1,51 @@
+import time
+import pytest
+from app.llm.response_cache import LLMResponseCache
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=3)
+    yield cache
+    cache.close()
+
+def test_key_depends_on_every_input():
+    base = LLMResponseCache.make_key("hermes3", "system", "prompt", {"temperature": 0})
+    assert base == LLMResponseCache.make_key("hermes3", "system", "prompt", {"temperature": 0})
+    assert base != LLMResponseCache.make_key("llama3.1", "system", "prompt", {"temperature": 0})
+    assert base != LLMResponseCache.make_key("hermes3", "other", "prompt", {"temperature": 0})
+    assert base != LLMResponseCache.make_key("hermes3", "system", "other", {"temperature": 0})
+    assert base != LLMResponseCache.make_key("hermes3", "system", "prompt", {"temperature": 1})
+
+def test_hit_and_miss_counters(cache):
+    assert cache.get("missing", call_site="Agent.run") is None
+    cache.put("key", "value")
+    assert cache.get("key", call_site="Agent.run") == "value"
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["call_sites"]["Agent.run"] == {"hits": 1, "misses": 1}
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    cache = LLMResponseCache(path)
+    cache.put("key", "value")
+    cache.close()
+    reopened = LLMResponseCache(path)
+    assert reopened.get("key") == "value"
+    reopened.close()
+
+def test_ttl_expiry(cache):
+    cache.put("key", "value", ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("key") is None
+
+def test_lru_eviction(cache):
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+        time.sleep(0.001)
+    assert cache.get("a") == "a"  # "b" is now the least recently used entry
+    cache.put("d", "d")
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get_stats()["evictions"] == 1
@@ -0,0 +1,87 @@
+import multiprocessing
+import pytest
+from app.memory.memory_system import MemorySystem
+from app.shared_state.store import InMemoryStateStore, SharedDict, SharedLog, SQLiteStateStore, get_state_store
+from app.tasks.task_cache import NLPCache
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = InMemoryStateStore() if request.param == "memory" else SQLiteStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+def test_shared_dict_behaves_like_a_dict(store):
+    data = SharedDict(store, "things")
+    data["a"] = {"value": 1}
+    data["b"] = [1, 2]
+    assert data["a"] == {"value": 1}
+    assert "b" in data and "c" not in data
+    assert data.get("c", "default") == "default"
+    assert sorted(data) == ["a", "b"]
+    assert len(data) == 2
+    del data["a"]
+    with pytest.raises(KeyError):
+        data["a"]
+    data.clear()
+    assert len(data) == 0
+
+def test_update_writes_every_key_at_once(store, mocker):
+    data = SharedDict(store, "things")
+    data["a"] = 0
+    set_many = mocker.spy(store, "set_many")
+    data.update({"a": 1, "b": 2}, c=3)
+    set_many.assert_called_once()
+    assert dict(data.items()) == {"a": 1, "b": 2, "c": 3}
+
+def test_eviction_drops_least_recently_used(store):
+    cache = NLPCache(max_size=2, state_store=store)
+    cache.put("one", 1)
+    cache.put("two", 2)
+    assert cache.get("one") == 1
+    cache.put("three", 3)
+    assert cache.get("two") is None
+    assert cache.get("one") == 1
+    assert len(cache) == 2
+
+def test_log_is_bounded(store):
+    log = SharedLog(store, "replay", maxlen=3)
+    for i in range(5):
+        log.append((i, i * 2))
+    assert len(log) == 3
+    assert sorted(log.sample(3)) == [(2, 4), (3, 6), (4, 8)]
+
+def test_leases(store):
+    assert store.acquire_lease("job", "worker-1", ttl=60)
+    assert store.acquire_lease("job", "worker-1", ttl=60)
+    assert not store.acquire_lease("job", "worker-2", ttl=60)
+    store.release_lease("job", "worker-1")
+    assert store.acquire_lease("job", "worker-2", ttl=0)
+    assert store.acquire_lease("job", "worker-1", ttl=60)
+
+def _remember(path, key):
+    store = SQLiteStateStore(path)
+    MemorySystem(store).memories[key] = f"stored by {key}"
+    store.close()
+
+def test_worker_processes_share_state(tmp_path):
+    path = str(tmp_path / "state.db")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_remember, args=(path, f"worker-{i}")) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    store = SQLiteStateStore(path)
+    memories = MemorySystem(store)
+    assert sorted(memories.memories) == ["worker-0", "worker-1", "worker-2"]
+    assert memories.retrieve("worker-1") == "stored by worker-1"
+    store.close()
+
+def test_state_store_from_environment(monkeypatch, tmp_path):
+    assert get_state_store() is not get_state_store()
+    monkeypatch.setenv("STATE_BACKEND", "sqlite")
+    monkeypatch.setenv("STATE_PATH", str(tmp_path / "env.db"))
+    store = get_state_store()
+    assert isinstance(store, SQLiteStateStore)
+    assert get_state_store() is store
+    store.close()
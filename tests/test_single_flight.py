@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from app.llm.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_call():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*[single_flight.do("key", upstream) for _ in range(5)])
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert single_flight.get_stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def upstream():
+        await release.wait()
+        return "result"
+
+    first = asyncio.ensure_future(single_flight.do("key", upstream))
+    second = asyncio.ensure_future(single_flight.do("key", upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+@pytest.mark.asyncio
+async def test_exceptions_propagate_to_every_waiter():
+    single_flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(single_flight.do("key", upstream), single_flight.do("key", upstream), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from app.utils.startup_profiler import StartupProfiler, import_report, profile_imports
+
+@pytest.mark.asyncio
+async def test_concurrent_steps_are_timed_separately():
+    profiler = StartupProfiler()
+    with profiler.step("sync"):
+        pass
+    await asyncio.gather(
+        profiler.timed("slow", asyncio.sleep(0.05)),
+        profiler.timed("fast", asyncio.sleep(0.01))
+    )
+    assert set(profiler.timings) == {"sync", "slow", "fast"}
+    assert profiler.timings["slow"] > profiler.timings["fast"]
+    assert profiler.total() < profiler.timings["slow"] + profiler.timings["fast"] + 0.05
+    assert "slow=" in profiler.summary()
+    assert profiler.report().splitlines()[1].endswith("slow")
+
+def test_import_profile_of_a_module():
+    rows = profile_imports("json")
+    names = [name for name, _, _ in rows]
+    assert "json" in names
+    assert "json.decoder" in names
+    assert "json" in import_report(rows)
+
+def test_import_profile_runs_from_the_project_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    names = [name for name, _, _ in profile_imports("app.utils.startup_profiler")]
+    assert "app.utils.startup_profiler" in names
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from app.knowledge.vector_index import VectorIndex
+
+def _vectors(count, dim=16, seed=1):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+def test_exact_search_ranks_by_cosine_similarity():
+    index = VectorIndex()
+    index.add("x", [1, 0, 0])
+    index.add("xy", [1, 1, 0])
+    index.add("z", [0, 0, 1], label="Other")
+    assert [node_id for node_id, _ in index.search([2, 0.1, 0], k=2)] == ["x", "xy"]
+    assert index.search([1, 0, 0], k=5, label="Other") == [("z", 0.0)]
+    assert index.search([1, 0, 0], label="Missing") == []
+    with pytest.raises(ValueError):
+        index.add("bad", [1, 0])
+
+def test_update_and_delete_keep_the_matrix_contiguous():
+    index = VectorIndex()
+    for i, vector in enumerate(_vectors(5)):
+        index.add(f"n{i}", vector)
+    index.add("n1", [1] * 16)
+    assert index.search([1] * 16, k=1)[0][0] == "n1"
+    assert index.remove("n0") and not index.remove("n0")
+    assert len(index) == 4 and "n0" not in index
+    assert {node_id for node_id, _ in index.search([1] * 16, k=10)} == {"n1", "n2", "n3", "n4"}
+
+def test_ivf_search_finds_the_nearest_neighbours():
+    vectors = _vectors(3000)
+    index = VectorIndex(train_size=1000, nprobe=8)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector, label="even" if i % 2 == 0 else "odd")
+    assert index._centroids is not None
+
+    query = vectors[42] + 0.01
+    assert index.search(query, k=1)[0][0] == "42"
+    assert all(int(node_id) % 2 == 1 for node_id, _ in index.search(query, k=10, label="odd"))
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = set(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10].astype(str))
+    assert len(exact & {node_id for node_id, _ in index.search(query, k=10)}) >= 7
+
+def test_persistence_round_trip(tmp_path):
+    path = str(tmp_path / "vectors.npz")
+    index = VectorIndex(train_size=200)
+    for i, vector in enumerate(_vectors(300)):
+        index.add(str(i), vector, label="Concept")
+    index.save(path)
+
+    loaded = VectorIndex.load(path)
+    query = _vectors(1, seed=7)[0]
+    assert loaded.search(query, k=5, label="Concept") == index.search(query, k=5, label="Concept")
+    loaded.add("new", query)
+    loaded.remove("0")
+    assert loaded.search(query, k=1)[0][0] == "new"
+    assert len(loaded) == 300
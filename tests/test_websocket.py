@@ -0,0 +1,39 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from starlette.datastructures import State
+import main
+
+def test_background_jobs_keep_their_own_message(mocker):
+    state = State()
+    mocker.patch.object(main.app, "state", state)
+    state.quantum_optimizer = mocker.Mock()
+    state.quantum_optimizer.optimize_task_order = mocker.AsyncMock(side_effect=lambda tasks: tasks)
+    state.collaboration_system = mocker.Mock()
+    state.collaboration_system.collaborate_on_task = mocker.AsyncMock(side_effect=lambda task: f"done: {task['content']}")
+    state.meta_agent = mocker.Mock()
+    state.meta_agent.generate_novel_approach = mocker.AsyncMock(return_value="novel")
+    state.continual_learner = mocker.Mock()
+    state.continual_learner.learn = mocker.AsyncMock()
+    state.knowledge_graph = mocker.Mock()
+    state.knowledge_graph.add_task_result = mocker.AsyncMock()
+    # Queue the jobs without running them, as a busy background worker would
+    state.background = mocker.Mock()
+    state.background.submit = mocker.AsyncMock()
+
+    with TestClient(main.app).websocket_connect("/ws") as websocket:
+        for message in ("first", "second"):
+            websocket.send_text(message)
+            websocket.receive_text()
+
+    async def run_jobs():
+        for call in state.background.submit.await_args_list:
+            await call.args[1]()
+    asyncio.run(run_jobs())
+
+    learned = [call.args for call in state.continual_learner.learn.await_args_list]
+    assert [(task["content"], result["standard_result"]) for task, result in learned] == [
+        ("first", "done: first"), ("second", "done: second")]
+    stored = [call.args for call in state.knowledge_graph.add_task_result.await_args_list]
+    assert [(data, json.loads(result)["standard_result"]) for data, result in stored] == [
+        ("first", "done: first"), ("second", "done: second")]